@@ -1,15 +1,20 @@
 """Project's main setup and configuration."""
-import os
 from dotenv import load_dotenv
-from app.extensions import mail
-from flask import Flask
-from flask_login import LoginManager
+from app.commands import register_commands
+from app.extensions import change_feed, email_queue, identity_cache, mail, \
+    metrics, mongo, password_hasher, session_store, shopping_list_compactor, \
+    smtp_pool
+from app.utils.json_provider import OrjsonProvider, orjson
+from flask import Flask, jsonify
+from flask_login import LoginManager, user_logged_in
 from itsdangerous import URLSafeTimedSerializer
-from models.user import User
-from app.views import emails, index, users, auth, households, household_shopping_list
-from mongoengine import connect
+from models.household import Household
+from models.user import ADMIN_ROLE, DEFERRED_FIELDS, User
+from app.views import emails, index, monitoring, users, auth, households, \
+    household_shopping_list, personal_shopping_list
+from mongoengine import signals
 from mongoengine import errors
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import PyMongoError
 from bson import ObjectId
 
 config_classes = {
@@ -21,6 +26,30 @@ config_classes = {
 load_dotenv()
 
 
+def password_hashing_busy(error):
+    """Answers a request whose password could not be hashed in time.
+
+    Every password hashing worker is busy, eg. during a burst of logins.
+    """
+    return jsonify({'error': 'The server is busy, try again shortly'}), \
+        503, {'Retry-After': '1'}
+
+
+def invalidate_cached_user(sender, document, **kwargs):
+    """Drops a saved or deleted user from the identity cache."""
+    identity_cache.invalidate(document.pk)
+
+
+def start_user_session(sender, user, **kwargs):
+    """Stores the principal of a user who just logged in in their session."""
+    if user.household_role:
+        is_admin = user.household_role == ADMIN_ROLE
+    else:  # the user has not been through `flask migrate-household-roles`
+        is_admin = bool(user.household_id) and bool(Household.objects(
+            id=user.household_id.id, admins=user.id).count())
+    session_store.login(user, is_admin)
+
+
 def create_app(environment=None):
     """The app's application factory performing the config and setup.
     """
@@ -31,31 +60,71 @@ def create_app(environment=None):
     if env not in ['DEV', 'TEST', 'PROD']:
         env = 'DEV'  # this is the default execution environment
 
-    # TODO: account for mongo db not being active or connected properly
-    # does not catch serverselectiontimeout error from mypongo
-    try:
-        # print('Connecting to mongo')
-        connect(host=os.getenv(f'{env}_DATABASE'))
-    except ServerSelectionTimeoutError as error:
-        # print('Exception connecting to mongo db:', error.message)
-        exit(1)
-
     config_class = config_classes[env]
     
     # Initialise flask app and load configuration depending on environment
     app = Flask(__name__)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)  # same JSON, faster encoding
     app.config.from_object(f'config.{config_class}')
 
+    # time every request and count its queries, set up before connecting
+    # so that pymongo reports the commands to the metrics' listener
+    metrics.init_app(app)
+
+    # connect with the environment's pool settings, checking the database
+    # can be reached before serving any request
+    try:
+        mongo.init_app(app)
+    except PyMongoError as error:
+        app.logger.critical('Cannot connect to MongoDB at startup: %s', error)
+        raise SystemExit(1)
+
     login_manager = LoginManager(app)
     login_manager.login_view = '/login'  # view to redirect to, for login
     login_manager.login_message = 'Please login before accessing this resource.'
 
+    # keep sessions, with the logged-in user's principal, on the server
+    session_store.init_app(app)
+    user_logged_in.connect(start_user_session)
+
+    # cache the users loaded for each authenticated request
+    identity_cache.configure(maxsize=app.config.get('IDENTITY_CACHE_MAXSIZE'),
+                             ttl=app.config.get('IDENTITY_CACHE_TTL'))
+    signals.post_save.connect(invalidate_cached_user, sender=User)
+    signals.post_delete.connect(invalidate_cached_user, sender=User)
+
     @login_manager.user_loader
     def load_user(user_id) -> User:
-        return User.objects(id=ObjectId(user_id)).first()
+        document = identity_cache.get(user_id)
+        if document is not None:
+            return User._from_son(document)
+
+        # the personal shopping list is only read by its own endpoints
+        user = User.objects(id=ObjectId(user_id)).exclude(*DEFERRED_FIELDS).first()
+        if user:
+            # to_mongo() fills the excluded fields in with their defaults
+            document = user.to_mongo()
+            for field in DEFERRED_FIELDS:
+                document.pop(field, None)
+            identity_cache.set(user_id, document)
+        return user
     
-    # setup mail configuration
+    # hash passwords in a pool of worker processes, answering with a 503
+    # when it is too busy
+    password_hasher.init_app(app)
+    app.register_error_handler(TimeoutError, password_hashing_busy)
+
+    # setup mail configuration and the queue delivering emails in the background
     mail.init_app(app)
+    smtp_pool.init_app(app)
+    email_queue.init_app(app)
+
+    # the pub/sub bus streaming shopping list changes to household members
+    change_feed.init_app(app)
+
+    # archive old bought items, when compacting in the background is enabled
+    shopping_list_compactor.init_app(app)
 
     # a serializer instance to be shared for secure token generation and validation
     app.config['TOKEN_SERIALIZER'] = URLSafeTimedSerializer(app.config.get('SECRET_KEY'))
@@ -65,6 +134,11 @@ def create_app(environment=None):
     app.register_blueprint(auth.auth_bl)
     app.register_blueprint(households.household_bl)
     app.register_blueprint(household_shopping_list.household_shopping_list_bl)
+    app.register_blueprint(personal_shopping_list.personal_shopping_list_bl)
     app.register_blueprint(emails.email_bl)
+    if app.config.get('METRICS_ENABLED'):
+        app.register_blueprint(monitoring.monitoring_bl)
+
+    register_commands(app)
 
     return app
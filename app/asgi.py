@@ -0,0 +1,312 @@
+"""Defines the app's asynchronous (ASGI) entry point.
+
+The read-heavy endpoints polled by the clients are served by coroutines
+over an async MongoDB client (Motor), so a single worker can wait on many
+queries at once. Every other request, and any request the async handlers
+cannot fully answer, eg. an unauthenticated one, is passed on to the Flask
+app so that both entry points respond in the same way.
+"""
+from app import create_app
+from app.utils.conditional_requests import household_etag
+from app.utils.database import mongo_client_settings
+from app.utils.middleware import HOUSEHOLD_PROJECTION
+from app.utils.serialization import SHOPPING_LIST_ITEM_FIELDS, \
+    projection, serialize_household_profile, serialize_user
+from app.utils.shopping_list_queries import PAGE_SORT, shopping_list_page, \
+    shopping_list_page_query
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from asyncio import to_thread
+from datetime import UTC
+from flask import Flask, session
+from flask_login import current_user
+from io import BytesIO
+from models.household import Household
+from models.shopping_list_item import ShoppingListItem
+from models.user import ADMIN_ROLE, DEFERRED_FIELDS, User
+from mongoengine.connection import get_db
+from motor.motor_asyncio import AsyncIOMotorClient
+from time import perf_counter
+from urllib.parse import parse_qsl
+from werkzeug.http import http_date, parse_date, parse_etags
+
+
+class AsyncReadApp(object):
+    """ASGI app serving the read-heavy endpoints with async queries.
+
+    Users are authenticated by the Flask app's own Flask-Login setup, and
+    the responses are encoded with the Flask app's JSON provider, including
+    the household resources' ETags. Their latency is recorded by the Flask
+    app's metrics, under the endpoints of the Flask views they stand for.
+    """
+
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        self.client = None
+        # the database MongoEngine connected to, from the `MONGODB_*` config
+        self.database_name = get_db().name
+        self.routes = {
+            '/api/users/me': self.get_user,
+            '/api/households/profile': self.get_household_profile,
+            '/api/households/shopping_list/items': self.get_shopping_list,
+        }
+        urls = flask_app.url_map.bind('')
+        self.endpoints = {path: urls.match(path, 'GET')[0] for path in self.routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        handler = None
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            handler = self.routes.get(scope['path'].rstrip('/'))
+
+        response = None
+        if handler:
+            started_at = perf_counter()
+            request = Request(scope)
+            user = await to_thread(self.authenticate, scope)
+            if user:
+                response = await handler(request, user)
+            if response is not None:
+                self.observe(scope, response.status, perf_counter() - started_at)
+
+        if response is None:
+            return await self.wsgi_app(scope, receive, send)
+
+        await response.send(send, head=scope['method'] == 'HEAD')
+
+    def observe(self, scope, status: int, latency: float):
+        """Records the latency of a request answered by an async handler.
+
+        The MongoDB commands are not tallied: Motor runs them in threads of
+        its own, which the metrics cannot tell apart by request.
+        """
+        self.flask_app.extensions['metrics'].request_latency.observe(
+            latency, endpoint=self.endpoints[scope['path'].rstrip('/')],
+            method=scope['method'], status=status)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.database.command('ping')
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.client is not None:
+                    self.client.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @property
+    def database(self):
+        """The app's database, through a client bound to the running loop."""
+        if self.client is None:
+            config = self.flask_app.config
+            mongo = self.flask_app.extensions['mongo']
+            self.client = AsyncIOMotorClient(config.get('MONGODB_HOST'),
+                                             event_listeners=[mongo.pool_stats],
+                                             **mongo_client_settings(config))
+        return self.client[self.database_name]
+
+    def authenticate(self, scope):
+        """Resolves the logged-in user of a request, as the Flask app does.
+
+        The request's session is opened and its user loaded by Flask-Login,
+        with its session protection, and `load_user`. Flask-Login changes
+        the session of a request logging in from the remember cookie or
+        failing the session protection: such a request is left to the Flask
+        app, which saves the session. The expiry of an authenticated
+        request's session is extended, as the Flask app's response would.
+
+        Blocks on the session backend and, for an uncached user, MongoDB.
+
+        Returns:
+            The user's raw document, or None if the request is not
+            authenticated by its session alone.
+        """
+        wsgi = WsgiToAsgiInstance(self.flask_app)
+        wsgi.scope = scope
+        with self.flask_app.request_context(wsgi.build_environ(scope, BytesIO())):
+            if '_user_id' not in session:
+                return None
+
+            user = current_user._get_current_object()
+            if session.modified or not user.is_authenticated:
+                return None
+
+            self.flask_app.extensions['session_store'].touch()
+
+            document = user.to_mongo().to_dict()
+            for field in DEFERRED_FIELDS:
+                document.pop(field, None)
+            return document
+
+    async def load_household(self, user: dict):
+        """The async counterpart of `load_current_household`.
+
+        Returns:
+            The projection-limited household, with an `is_admin` key, or None
+            if the user is not a member of it.
+        """
+        if not user.get('household_id'):
+            return None
+
+        households = self.database[Household._get_collection_name()]
+        projection = {field: 1 for field in HOUSEHOLD_PROJECTION}
+        role = user.get('household_role')
+        if role:
+            household = await households.find_one({'_id': user['household_id']},
+                                                  projection)
+            if household:
+                household['is_admin'] = role == ADMIN_ROLE
+            return household
+
+        projection['admins'] = {'$elemMatch': {'$eq': user['_id']}}
+        household = await households.find_one(
+            {'_id': user['household_id'], 'members': user['_id']}, projection)
+        if household:
+            household['is_admin'] = bool(household.pop('admins', None))
+        return household
+
+    async def get_user(self, request, user: dict):
+        """The async counterpart of `GET /api/users/me`."""
+        return self.json_response(serialize_user(user))
+
+    async def get_household_profile(self, request, user: dict):
+        """The async counterpart of `GET /api/households/profile`."""
+        household = await self.load_household(user)
+        if not household:
+            return None
+
+        not_modified = self.not_modified(request, household, 'profile')
+        if not_modified:
+            return not_modified
+
+        roles = await self.database[Household._get_collection_name()].find_one(
+            {'_id': household['_id']}, {'admins': 1, 'members': 1})
+        user_ids = set(roles.get('admins', [])) | set(roles.get('members', []))
+        cursor = self.database[User._get_collection_name()].find(
+            {'_id': {'$in': list(user_ids)}}, {'username': 1})
+        usernames = {document['_id']: document['username']
+                     async for document in cursor}
+
+        return self.conditional_response(
+            request, household, 'profile',
+            serialize_household_profile(household, roles, usernames))
+
+    async def get_shopping_list(self, request, user: dict):
+        """The async counterpart of `GET /api/households/shopping_list/items`."""
+        household = await self.load_household(user)
+        if not household:
+            return None
+
+        not_modified = self.not_modified(request, household, 'shopping_list')
+        if not_modified:
+            return not_modified
+
+        config = self.flask_app.config
+        try:
+            query, limit = shopping_list_page_query(
+                household['_id'], request.args,
+                config.get('SHOPPING_LIST_PAGE_SIZE'),
+                config.get('SHOPPING_LIST_MAX_PAGE_SIZE'))
+        except ValueError as error:
+            return self.json_response({'error': str(error)}, 400)
+
+        cursor = self.database[ShoppingListItem._get_collection_name()] \
+            .find(query, projection(SHOPPING_LIST_ITEM_FIELDS)).sort(PAGE_SORT).limit(limit + 1)
+        items = await cursor.to_list(length=limit + 1)
+
+        return self.conditional_response(request, household, 'shopping_list',
+                                         shopping_list_page(items, limit))
+
+    def json_response(self, data, status: int = 200, headers: dict = None):
+        with self.flask_app.app_context():
+            flask_response = self.flask_app.json.response(data)
+
+        headers = dict(headers or {}, **{'Content-Type': flask_response.mimetype})
+        return Response(status, flask_response.get_data(), headers)
+
+    def not_modified(self, request, household: dict, scope: str):
+        """Answers an unchanged household resource, see
+        `conditional_household_response`.
+
+        Returns:
+            A `304` response, or None if the client's copy is outdated.
+        """
+        etag, last_modified = self.validators(request, household, scope)
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match:
+            is_current = parse_etags(if_none_match).contains(etag)
+        else:
+            since = parse_date(request.headers.get('if-modified-since'))
+            is_current = bool(last_modified and since
+                              and last_modified.replace(microsecond=0) <= since)
+
+        if not is_current:
+            return None
+        return Response(304, b'', self.cache_headers(etag, last_modified))
+
+    def conditional_response(self, request, household: dict, scope: str,
+                             data: dict):
+        etag, last_modified = self.validators(request, household, scope)
+        return self.json_response(data,
+                                  headers=self.cache_headers(etag, last_modified))
+
+    @staticmethod
+    def validators(request, household: dict, scope: str):
+        etag = household_etag(household, scope, request.query_string)
+        last_modified = household.get('updated_at')
+        if last_modified and not last_modified.tzinfo:
+            last_modified = last_modified.replace(tzinfo=UTC)
+        return etag, last_modified
+
+    @staticmethod
+    def cache_headers(etag: str, last_modified) -> dict:
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if last_modified:
+            headers['Last-Modified'] = http_date(last_modified)
+        return headers
+
+
+class Request(object):
+    """The parts of an ASGI HTTP request the async handlers read."""
+
+    def __init__(self, scope):
+        self.query_string = scope.get('query_string', b'').decode()
+        self.args = {}
+        for name, value in parse_qsl(self.query_string):
+            self.args.setdefault(name, value)  # the first value, as in Flask
+        self.headers = {name.decode().lower(): value.decode()
+                        for name, value in scope['headers']}
+        self.cookies = {}
+        for pair in self.headers.get('cookie', '').split(';'):
+            name, _, value = pair.strip().partition('=')
+            if name:
+                self.cookies.setdefault(name, value.strip('"'))
+
+
+class Response(object):
+    """An ASGI HTTP response."""
+
+    def __init__(self, status: int, body: bytes, headers: dict):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    async def send(self, send, head: bool = False):
+        headers = [(name.lower().encode(), str(value).encode())
+                   for name, value in self.headers.items()]
+        if self.status != 304:
+            headers.append((b'content-length', str(len(self.body)).encode()))
+        await send({'type': 'http.response.start', 'status': self.status,
+                    'headers': headers})
+        await send({'type': 'http.response.body',
+                    'body': b'' if head or self.status == 304 else self.body})
+
+
+def create_asgi_app(environment=None) -> AsyncReadApp:
+    """The ASGI counterpart of the application factory."""
+    return AsyncReadApp(create_app(environment))
@@ -0,0 +1,193 @@
+"""Defines the app's maintenance commands for the `flask` command line."""
+from app.utils.query_audit import collection_scans
+from app.utils.shopping_list_summary import rebuild_summary
+from bson import ObjectId
+from datetime import datetime, UTC
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models.collations import CASE_INSENSITIVE
+from models.household import Household
+from models.shopping_list_history import ArchivedShoppingListItem
+from models.shopping_list_item import ShoppingListItem
+from models.user import ADMIN_ROLE, MEMBER_ROLE, User
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR = 11000
+
+# every model whose collection has declared indexes
+INDEXED_MODELS = (User, Household, ShoppingListItem, ArchivedShoppingListItem)
+
+
+def hot_queries() -> list:
+    """Provides the app's most frequent lookups, as (name, queryset) pairs.
+
+    The values queried for do not matter, only the shape of the queries.
+    """
+    some_id = ObjectId()
+    return [
+        ('auth.login: user by username',
+         User.objects(username='AbacusWarrior').collation(CASE_INSENSITIVE)),
+        ('emails.confirm_email: user by email',
+         User.objects(email='inui@seigakutc.co.za')),
+        ('households.create_household: household by name',
+         Household.objects(name='Seigaku').collation(CASE_INSENSITIVE)),
+        ('households: members of a household',
+         User.objects(household_id=some_id)),
+        ('households.join_household: households of a member',
+         Household.objects(members=some_id)),
+        ('middleware: household by id',
+         Household.objects(id=some_id)),
+        ('middleware: household membership, users without a role',
+         Household.objects(id=some_id, members=some_id)),
+        ('households: admins of a household',
+         User.objects(household_id=some_id, household_role=ADMIN_ROLE)),
+        ('shopping list: page of items',
+         ShoppingListItem.objects(household=some_id).order_by('added_date', 'item_id')),
+        ('shopping list: unbought items',
+         ShoppingListItem.objects(household=some_id, is_bought=False)
+         .order_by('added_date')),
+        ('compaction: bought items due for archival',
+         ShoppingListItem.objects(is_bought=True, bought_date__lt=datetime.now(UTC))
+         .order_by('bought_date')),
+        ('shopping list history: page of items',
+         ArchivedShoppingListItem.objects(household=some_id)
+         .order_by('-bought_date', '-item_id')),
+    ]
+
+
+@click.command('migrate-shopping-lists')
+def migrate_shopping_lists():
+    """Moves embedded household shopping list items into their own collection.
+
+    Each item keeps its `item_id` and gains a `household` reference. The
+    embedded list is only removed from a household once all of its items
+    are stored, so an interrupted migration can safely be run again.
+    """
+    ShoppingListItem.ensure_indexes()
+    households = Household._get_collection()
+    items = ShoppingListItem._get_collection()
+
+    household_count = item_count = 0
+    for household in households.find({'shopping_list.0': {'$exists': True}},
+                                     {'shopping_list': 1}):
+        documents = [dict(item, household=household['_id'])
+                     for item in household['shopping_list']]
+        try:
+            items.insert_many(documents, ordered=False)
+        except BulkWriteError as error:
+            # items copied by an earlier, interrupted run already exist
+            if any(write_error['code'] != DUPLICATE_KEY_ERROR
+                   for write_error in error.details['writeErrors']):
+                raise
+
+        households.update_one({'_id': household['_id']},
+                              {'$unset': {'shopping_list': ''}})
+        household_count += 1
+        item_count += len(documents)
+
+    click.echo(f'Moved {item_count} shopping list item/s'
+               + f' from {household_count} household/s')
+
+
+@click.command('migrate-household-roles')
+def migrate_household_roles():
+    """Sets the `household_role` of users from their household's lists.
+
+    Only the users whose `household_id` still names the household are
+    updated, and an admin is never demoted, so it is safe to run more
+    than once.
+    """
+    users = User._get_collection()
+    admin_count = member_count = 0
+    for household in Household._get_collection().find(
+            {}, {'members': 1, 'admins': 1}):
+        admins = household.get('admins', [])
+        members = [user_id for user_id in household.get('members', [])
+                   if user_id not in admins]
+
+        admin_count += users.update_many(
+            {'_id': {'$in': admins}, 'household_id': household['_id']},
+            {'$set': {'household_role': ADMIN_ROLE}}).modified_count
+        member_count += users.update_many(
+            {'_id': {'$in': members}, 'household_id': household['_id'],
+             'household_role': {'$exists': False}},
+            {'$set': {'household_role': MEMBER_ROLE}}).modified_count
+
+    click.echo(f'Set the role of {admin_count} admin/s and {member_count} member/s')
+
+
+@click.command('rebuild-shopping-list-summaries')
+@click.option('--household', 'household_id', default=None,
+              help='Only rebuild the summary of the household with this id.')
+def rebuild_shopping_list_summaries(household_id):
+    """Recomputes the households' shopping list summaries from their items.
+
+    Run it when the counters are suspected to have drifted, eg. after items
+    were changed outside of the app, or after `migrate-shopping-lists`.
+    """
+    query = {'_id': ObjectId(household_id)} if household_id else {}
+    count = 0
+    for household in Household._get_collection().find(query, {'_id': 1}):
+        rebuild_summary(household['_id'])
+        count += 1
+
+    click.echo(f'Rebuilt the shopping list summary of {count} household/s')
+
+
+@click.command('compact-shopping-lists')
+@with_appcontext
+def compact_shopping_lists():
+    """Moves the items bought before the retention period into the history.
+
+    Meant to be scheduled when the app does not compact the lists in the
+    background, see `SHOPPING_LIST_COMPACTION_INTERVAL`.
+    """
+    archived = current_app.extensions['shopping_list_compactor'].compact()
+    click.echo(f'Archived {archived["household"]} household and'
+               + f' {archived["personal"]} personal shopping list item/s')
+
+
+@click.command('build-indexes')
+def build_indexes():
+    """Builds the indexes declared by the models.
+
+    Indexes are built in the background and already existing indexes are
+    left untouched, so this is safe to run against a live database.
+    """
+    for model in INDEXED_MODELS:
+        model.ensure_indexes()
+        names = sorted(model._get_collection().index_information())
+        click.echo(f'{model._get_collection_name()}: {", ".join(names)}')
+
+
+@click.command('audit-indexes')
+def audit_indexes():
+    """Reports the hot lookups whose query plan scans a whole collection.
+
+    Exits with a non-zero status if any lookup is not served by an index.
+    Run `pytest --audit-indexes` to audit every query of a test run instead.
+    """
+    failures = 0
+    for name, queryset in hot_queries():
+        scans = collection_scans(queryset.explain())
+        if scans:
+            failures += 1
+            namespaces = ', '.join(sorted({scan.get('namespace', '?')
+                                           for scan in scans}))
+            click.echo(f'COLLSCAN  {name} ({namespaces})')
+        else:
+            click.echo(f'ok        {name}')
+
+    if failures:
+        raise click.ClickException(f'{failures} lookup/s scan a whole collection')
+
+
+def register_commands(app):
+    """Adds the maintenance commands to the app's command line."""
+    app.cli.add_command(migrate_shopping_lists)
+    app.cli.add_command(migrate_household_roles)
+    app.cli.add_command(rebuild_shopping_list_summaries)
+    app.cli.add_command(compact_shopping_lists)
+    app.cli.add_command(build_indexes)
+    app.cli.add_command(audit_indexes)
@@ -1,5 +1,23 @@
 """Contains all the flask app's extensions to avoid circular imports."""
+from app.utils.change_feed import ChangeFeed
+from app.utils.database import MongoConnection
+from app.utils.email_queue import EmailQueue
+from app.utils.identity_cache import IdentityCache
+from app.utils.metrics import Metrics
+from app.utils.password_hashing import PasswordHasher
+from app.utils.session_store import SessionStore
+from app.utils.shopping_list_compaction import ShoppingListCompactor
+from app.utils.smtp_pool import SMTPConnectionPool
 from flask_mail import Mail
 
 
+metrics = Metrics()
+mongo = MongoConnection()
 mail = Mail()
+smtp_pool = SMTPConnectionPool()
+email_queue = EmailQueue()
+identity_cache = IdentityCache()
+change_feed = ChangeFeed()
+password_hasher = PasswordHasher()
+session_store = SessionStore()
+shopping_list_compactor = ShoppingListCompactor()
@@ -0,0 +1,251 @@
+"""Defines the publish/subscribe bus behind the shopping list change feed."""
+from app.utils.serialization import serialize_shopping_list_item
+from collections import defaultdict
+from pymongo.errors import PyMongoError
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import sleep
+
+
+class SubscriberLimitReached(Exception):
+    """Raised when a process already has its maximum of subscribers."""
+
+
+class Subscription(object):
+    """The events of one household, queued for a single listener.
+
+    A listener that falls behind by more than the queue's size is marked
+    as overflowed and stops receiving events. It is expected to reconnect
+    and re-read the shopping list rather than silently miss changes.
+    """
+
+    def __init__(self, bus, household_id: str, user_id: str, queue_size: int):
+        self.bus = bus
+        self.household_id = household_id
+        self.user_id = user_id
+        self.overflowed = False
+        self.closed = False
+        self._queue = Queue(maxsize=queue_size)
+
+    def put(self, event: dict):
+        """Queues an event for the listener."""
+        try:
+            self._queue.put_nowait(event)
+        except Full:
+            self.overflowed = True
+            self.close()
+
+    def get(self, timeout: float = None):
+        """Waits for the next event.
+
+        Returns:
+            The event, or None if none arrived within `timeout` seconds or
+            the subscription was closed.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def close(self):
+        """Stops the listener from receiving any more events."""
+        self.closed = True
+        self.bus.unsubscribe(self)
+        try:
+            self._queue.put_nowait(None)  # wakes up a waiting listener
+        except Full:
+            pass
+
+
+class InMemoryChangeFeedBus(object):
+    """Delivers change events to the subscribers of the same process.
+
+    The views publish an event after each shopping list change. This is
+    enough for a single process and is what the tests run against.
+
+    Each subscriber holds a thread of the process for as long as it
+    listens, so at most `max_subscribers` may listen at once, if set.
+    """
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions = defaultdict(set)
+        self._lock = Lock()
+
+    def start(self, app):
+        """Starts any background work the bus needs."""
+
+    def publish(self, household_id, event: dict):
+        """Sends an event to every subscriber of a household."""
+        self._dispatch(household_id, event)
+
+    def subscribe(self, household_id, user_id=None) -> Subscription:
+        """Starts listening to the events of a household.
+
+        Raises:
+            SubscriberLimitReached: If the process has `max_subscribers`.
+        """
+        subscription = Subscription(self, str(household_id), str(user_id),
+                                    self.queue_size)
+        with self._lock:
+            if self.max_subscribers and self._count() >= self.max_subscribers:
+                raise SubscriberLimitReached()
+            self._subscriptions[subscription.household_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stops a subscription from receiving events."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.household_id)
+            if subscriptions is None:
+                return
+
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.household_id]
+
+    def close_user(self, household_id, user_id):
+        """Ends the subscriptions of a user to a household's events."""
+        with self._lock:
+            subscriptions = [subscription for subscription
+                             in self._subscriptions.get(str(household_id), ())
+                             if subscription.user_id == str(user_id)]
+
+        for subscription in subscriptions:
+            subscription.close()
+
+    def subscriber_count(self, household_id=None) -> int:
+        """Counts the subscribers of a household, or of every household."""
+        with self._lock:
+            if household_id is not None:
+                return len(self._subscriptions.get(str(household_id), ()))
+            return self._count()
+
+    def _count(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def _dispatch(self, household_id, event: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(household_id), ()))
+
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class MongoChangeStreamBus(InMemoryChangeFeedBus):
+    """Delivers change events read from a MongoDB change stream.
+
+    Every process watches the `shopping_list_item` collection, so changes
+    made by any process reach the subscribers of all of them. The views'
+    own events are ignored since the change stream already reports them.
+
+    Requires a replica set. Removed items are only reported when the
+    collection records pre-images (`changeStreamPreAndPostImages`), as a
+    delete event does not otherwise say which household the item was in.
+    """
+
+    retry_delay = 5  # seconds to wait before watching again after an error
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = None):
+        super().__init__(queue_size, max_subscribers)
+        self._thread = None
+
+    def start(self, app):
+        """Starts watching the change stream in a background thread."""
+        if self._thread is not None:
+            return
+
+        self._thread = Thread(target=self._watch, daemon=True,
+                              name='shopping-list-change-stream')
+        self._thread.start()
+
+    def publish(self, household_id, event: dict):
+        """Ignored, the change stream reports the change instead."""
+
+    def _watch(self):
+        # imported here so that the in-memory bus does not depend on models
+        from models.shopping_list_item import ShoppingListItem
+
+        collection = ShoppingListItem._get_collection()
+        while True:
+            try:
+                with collection.watch(
+                        full_document='updateLookup',
+                        full_document_before_change='whenAvailable') as stream:
+                    for change in stream:
+                        event = self._to_event(change)
+                        if event:
+                            self._dispatch(*event)
+            except PyMongoError:
+                sleep(self.retry_delay)
+
+    @staticmethod
+    def _to_event(change: dict):
+        operation = change['operationType']
+        if operation == 'delete':
+            item = change.get('fullDocumentBeforeChange')
+            if not item:
+                return None
+            return item['household'], {'type': 'item_removed',
+                                       'item': {'item_id': item['_id']}}
+
+        item = change.get('fullDocument')
+        if not item or operation not in ('insert', 'update', 'replace'):
+            return None
+
+        if operation == 'insert':
+            event_type = 'item_added'
+        elif item.get('is_bought'):
+            event_type = 'item_bought'
+        else:
+            event_type = 'item_unbought'
+
+        return item['household'], {'type': event_type,
+                                   'item': serialize_shopping_list_item(item)}
+
+
+class ChangeFeed(object):
+    """Flask extension giving the app its configured change feed bus.
+
+    The `CHANGE_FEED_BACKEND` config value selects the bus, `memory` or
+    `mongo_change_stream`, and `CHANGE_FEED_MAX_SUBSCRIBERS` caps the
+    subscribers of each process.
+    """
+    backends = {
+        'memory': InMemoryChangeFeedBus,
+        'mongo_change_stream': MongoChangeStreamBus,
+    }
+
+    def __init__(self, app=None):
+        self.bus = InMemoryChangeFeedBus()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CHANGE_FEED_BACKEND') or 'memory'
+        if backend not in self.backends:
+            raise ValueError(f'Unknown change feed backend: {backend}')
+
+        self.bus = self.backends[backend](
+            queue_size=app.config.get('CHANGE_FEED_QUEUE_SIZE', 100),
+            max_subscribers=app.config.get('CHANGE_FEED_MAX_SUBSCRIBERS'))
+        self.bus.start(app)
+        app.extensions['change_feed'] = self
+
+    def publish(self, household_id, event: dict):
+        """Sends an event to the subscribers of a household."""
+        self.bus.publish(household_id, event)
+
+    def subscribe(self, household_id, user_id=None) -> Subscription:
+        """Starts listening to the events of a household.
+
+        Raises:
+            SubscriberLimitReached: If the process has its maximum of
+                subscribers.
+        """
+        return self.bus.subscribe(household_id, user_id)
+
+    def close_user(self, household_id, user_id):
+        """Ends the subscriptions of a user to a household's events."""
+        self.bus.close_user(household_id, user_id)
@@ -0,0 +1,85 @@
+"""Defines conditional GET support for household resources."""
+from datetime import datetime, UTC
+from flask import g, make_response, request
+from functools import wraps
+from hashlib import sha1
+from models.household import Household
+
+
+def bump_household_version(household_id, changes: dict = None):
+    """Records that a household, its members or its shopping list changed.
+
+    Should be called after the change is written. A poll made in between
+    then only sees the new data under the old version, which the next poll
+    corrects, instead of the old data being cached under the new version.
+
+    Arg:
+        changes: a raw update of other household fields, eg. the shopping
+            list summary's, written along with the version.
+    """
+    update = {'$inc': {'version': 1}, '$set': {'updated_at': datetime.now(UTC)}}
+    for operator, fields in (changes or {}).items():
+        update.setdefault(operator, {}).update(fields)
+    Household._get_collection().update_one({'_id': household_id}, update)
+
+
+def household_etag(household: dict, scope: str, query_string: str = None) -> str:
+    """Generates the strong ETag of a household resource.
+
+    Arg:
+        household: the household as resolved by the household middleware.
+        scope: the name of the resource, as several resources share the
+            household's version.
+
+    The query string is part of the ETag since it selects what a response
+    contains, eg. the page of a shopping list. It defaults to the current
+    request's.
+    """
+    if query_string is None:
+        query_string = request.query_string.decode()
+
+    key = ':'.join([str(household['_id']), str(household.get('version', 0)),
+                    scope, query_string])
+    return sha1(key.encode()).hexdigest()
+
+
+def conditional_household_response(scope: str):
+    """Middleware answering unchanged household resources with a `304`.
+
+    Must be applied after `household_member_required`, whose single query
+    already provides the household's version. An unchanged resource is thus
+    detected without loading any list or member documents.
+
+    Arg:
+        scope: the name of the resource the view returns.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def decorated_function(*args, **kwargs):
+            household = g.household
+            etag = household_etag(household, scope)
+            last_modified = household.get('updated_at')
+            if last_modified and not last_modified.tzinfo:
+                last_modified = last_modified.replace(tzinfo=UTC)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(
+                    last_modified and request.if_modified_since
+                    and last_modified.replace(microsecond=0)
+                    <= request.if_modified_since)
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view_func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True  # always revalidate
+            return response
+        return decorated_function
+    return decorator
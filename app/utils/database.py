@@ -0,0 +1,144 @@
+"""Defines the app's MongoDB connection and its pool monitoring."""
+from collections import defaultdict
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_connection
+from pymongo import monitoring
+from threading import Lock
+
+# the app config keys of the MongoClient options, see config.py
+CLIENT_SETTINGS = {
+    'MONGODB_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGODB_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGODB_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGODB_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGODB_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGODB_READ_PREFERENCE': 'readPreference',
+    'MONGODB_COMPRESSORS': 'compressors',
+}
+
+
+def mongo_client_settings(config) -> dict:
+    """Provides the MongoClient options set in an app's config.
+
+    Options left as None fall back to the driver's defaults, or to those
+    of the connection string.
+    """
+    return {option: config[key] for key, option in CLIENT_SETTINGS.items()
+            if config.get(key) is not None}
+
+
+class ConnectionPoolStats(monitoring.ConnectionPoolListener):
+    """Counts the connection pool events of every MongoDB server."""
+
+    counters = ('created', 'closed', 'checked_out', 'checked_in',
+                'check_out_failed', 'pool_cleared')
+
+    def __init__(self):
+        self._lock = Lock()
+        self._servers = defaultdict(lambda: dict.fromkeys(self.counters, 0))
+
+    def stats(self) -> dict:
+        """Provides the counters per server, with the connections in use."""
+        with self._lock:
+            return {server: dict(counts,
+                                 in_use=counts['checked_out'] - counts['checked_in'],
+                                 open=counts['created'] - counts['closed'])
+                    for server, counts in self._servers.items()}
+
+    def reset(self):
+        with self._lock:
+            self._servers.clear()
+
+    def _count(self, event, counter: str):
+        host, port = event.address
+        with self._lock:
+            self._servers[f'{host}:{port}'][counter] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(event, 'pool_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(event, 'created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(event, 'closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count(event, 'check_out_failed')
+
+    def connection_checked_out(self, event):
+        self._count(event, 'checked_out')
+
+    def connection_checked_in(self, event):
+        self._count(event, 'checked_in')
+
+
+class MongoConnection(object):
+    """Flask extension connecting MongoEngine with the configured pool.
+
+    The connection is checked with a `ping` straight away when
+    `MONGODB_PING_ON_STARTUP` is set, since the driver otherwise only
+    connects on the first query. An unreachable database then fails the
+    app's startup instead of its first request.
+
+    A `mongomock://` host connects to an in-memory mongomock database
+    instead, when mongomock is installed.
+    """
+
+    def __init__(self, app=None):
+        self.pool_stats = ConnectionPoolStats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        host = app.config.get('MONGODB_HOST')
+        settings = mongo_client_settings(app.config)
+        if host and host.startswith('mongomock://'):
+            # an in-memory database, eg. to run the benchmarks without mongod
+            import mongomock
+            host = host.replace('mongomock://', 'mongodb://', 1)
+            settings['mongo_client_class'] = mongomock.MongoClient
+
+        # the previous app's connection may use other settings
+        disconnect()
+        connect(host=host, event_listeners=[self.pool_stats], **settings)
+
+        if app.config.get('MONGODB_PING_ON_STARTUP'):
+            self.ping()
+
+        app.extensions['mongo'] = self
+
+    def ping(self):
+        """Checks that the database can be reached.
+
+        Raises:
+            PyMongoError: eg. a `ServerSelectionTimeoutError` once the
+                `MONGODB_SERVER_SELECTION_TIMEOUT_MS` is up.
+        """
+        get_connection().admin.command('ping')
+
+    def stats(self) -> dict:
+        """Provides the pool's settings and per-server counters."""
+        options = get_connection().options.pool_options
+        return {
+            'pool': {'max_pool_size': options.max_pool_size,
+                     'min_pool_size': options.min_pool_size,
+                     'wait_queue_timeout': options.wait_queue_timeout},
+            'servers': self.pool_stats.stats(),
+        }
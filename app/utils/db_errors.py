@@ -0,0 +1,24 @@
+"""Defines helpers for interpreting the errors raised by the database."""
+from mongoengine.errors import NotUniqueError
+import re
+
+
+def duplicated_fields(error: NotUniqueError) -> set:
+    """Determines which unique fields a write was rejected for.
+
+    Arg:
+        error: the error raised when a write broke a unique index.
+
+    Returns:
+        The names of the fields whose value is already taken.
+    """
+    # mongoengine raises NotUniqueError while handling pymongo's error,
+    # whose details hold the offending key
+    cause = error.__cause__ or error.__context__
+    details = getattr(cause, 'details', None) or {}
+    if details.get('keyValue'):
+        return set(details['keyValue'])
+
+    # older servers only describe the key in the error message
+    match = re.search(r'dup key: \{ ?(\w+)', str(error))
+    return {match.group(1)} if match else set()
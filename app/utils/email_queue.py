@@ -0,0 +1,275 @@
+"""Defines the background delivery queue for the app's emails."""
+from flask_mail import Message
+from threading import Condition, Lock, Thread
+from time import time
+import json
+import sqlite3
+
+# the statuses of an email in the outbox
+PENDING = 'pending'
+SENDING = 'sending'
+DEAD = 'dead'
+
+
+class EmailQueue(object):
+    """Flask extension delivering emails from a queue in background threads.
+
+    Emails are stored in a SQLite outbox, in memory by default, so no
+    outside service is needed. A bounded pool of worker threads sends them
+    in batches, each over a single connection of the app's SMTP connection
+    pool, or through Flask-Mail if it has none. A failed email is retried
+    with an exponential backoff. Once it runs out of attempts it stays in
+    the outbox as a dead letter, which can be inspected and retried.
+
+    The outbox may be a file shared by several processes, eg. gunicorn
+    workers: an email is claimed by a single `UPDATE ... RETURNING`, so a
+    single worker sends it. A claim expires after `claim_timeout` seconds,
+    after which the email of a worker that died while sending it is sent
+    again.
+
+    Config:
+        EMAIL_QUEUE_DATABASE: the SQLite database of the outbox, `:memory:`
+            by default. Set to None, eg. in production when the variable is
+            missing, the app fails to start rather than lose emails.
+        EMAIL_QUEUE_WORKERS: the amount of worker threads. With 0, emails
+            are sent as soon as they are queued, in the calling thread, and
+            retried without any backoff. Meant for tests.
+        EMAIL_QUEUE_MAX_ATTEMPTS: the attempts made before giving up.
+        EMAIL_QUEUE_BACKOFF: the seconds waited after the first failure,
+            doubled after each further one.
+        EMAIL_QUEUE_BATCH_SIZE: the most emails a worker claims at once.
+    """
+    poll_interval = 1  # seconds an idle worker waits before checking again
+    claim_timeout = 300  # seconds an email stays claimed by its worker
+
+    def __init__(self, app=None):
+        self.app = None
+        self._connection = None
+        self._db_lock = Lock()
+        self._condition = Condition()
+        self._threads = []
+        self._stopping = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self._connection is not None:
+            self.shutdown()
+
+        self.app = app
+        self.workers = int(app.config.get('EMAIL_QUEUE_WORKERS', 2))
+        self.max_attempts = int(app.config.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+        self.backoff = float(app.config.get('EMAIL_QUEUE_BACKOFF', 2))
+        self.batch_size = int(app.config.get('EMAIL_QUEUE_BATCH_SIZE', 20))
+
+        database = app.config.get('EMAIL_QUEUE_DATABASE', ':memory:')
+        if not database:
+            raise RuntimeError('EMAIL_QUEUE_DATABASE must be set to the file'
+                               + ' of the outbox')
+
+        self._stopping = False
+        self._connection = sqlite3.connect(
+            database, check_same_thread=False, isolation_level=None)
+        with self._db_lock:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' subject TEXT, sender TEXT, recipients TEXT, body TEXT,'
+                ' status TEXT NOT NULL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' next_attempt_at REAL NOT NULL,'
+                ' last_error TEXT,'
+                ' created_at REAL NOT NULL)')
+
+        app.extensions['email_queue'] = self
+
+    def enqueue(self, message: Message) -> int:
+        """Queues an email for delivery.
+
+        Returns:
+            The id of the email in the outbox.
+        """
+        now = time()
+        with self._db_lock:
+            cursor = self._connection.execute(
+                'INSERT INTO outbox (subject, sender, recipients, body, status,'
+                ' next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (message.subject, message.sender,
+                 json.dumps(list(message.recipients)), message.body, PENDING,
+                 now, now))
+        email_id = cursor.lastrowid
+
+        if not self.workers:
+            self._deliver_now(email_id)
+            return email_id
+
+        self._start_workers()
+        with self._condition:
+            self._condition.notify()
+        return email_id
+
+    def dead_letters(self) -> list:
+        """Provides the emails that could not be delivered."""
+        with self._db_lock:
+            rows = self._connection.execute(
+                'SELECT id, subject, recipients, attempts, last_error, created_at'
+                ' FROM outbox WHERE status = ? ORDER BY id', (DEAD,)).fetchall()
+
+        return [{'id': row[0], 'subject': row[1], 'recipients': json.loads(row[2]),
+                 'attempts': row[3], 'last_error': row[4], 'created_at': row[5]}
+                for row in rows]
+
+    def retry_dead_letter(self, email_id: int) -> bool:
+        """Queues a dead letter for delivery again, with a fresh attempt count.
+
+        Returns:
+            True if the dead letter exists, otherwise False.
+        """
+        with self._db_lock:
+            cursor = self._connection.execute(
+                'UPDATE outbox SET status = ?, attempts = 0,'
+                ' next_attempt_at = ? WHERE id = ? AND status = ?',
+                (PENDING, time(), email_id, DEAD))
+
+        if cursor.rowcount and not self.workers:
+            self._deliver_now(email_id)
+        elif cursor.rowcount:
+            self._start_workers()
+            with self._condition:
+                self._condition.notify()
+
+        return bool(cursor.rowcount)
+
+    def stats(self) -> dict:
+        """Counts the emails of the outbox by status."""
+        with self._db_lock:
+            rows = self._connection.execute(
+                'SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+
+        counts = {PENDING: 0, SENDING: 0, DEAD: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def shutdown(self, timeout: float = None):
+        """Stops the workers, leaving any unsent emails in the outbox."""
+        self._stopping = True
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _start_workers(self):
+        with self._condition:
+            self._threads = [thread for thread in self._threads
+                             if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._work, daemon=True,
+                                name=f'email-queue-{len(self._threads)}')
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while not self._stopping:
+            rows = self._claim_batch(self.batch_size)
+            if not rows:
+                with self._condition:
+                    self._condition.wait(self.poll_interval)
+                continue
+
+            self._deliver(rows)
+
+    def _deliver_now(self, email_id: int):
+        """Sends an email in the calling thread, using up all its attempts
+        without waiting in between if need be."""
+        row = self._claim(email_id)
+        while row is not None:
+            self._deliver([row])
+            row = self._claim(email_id)
+
+    def _claim(self, email_id: int = None):
+        """Marks the next due email, or a specific pending email, as being
+        sent and returns it, see `_claim_batch`."""
+        rows = self._claim_batch(1, email_id)
+        return rows[0] if rows else None
+
+    def _claim_batch(self, size: int, email_id: int = None) -> list:
+        """Marks the next due emails, or a specific pending email, as being
+        sent and returns them, in the order they were queued.
+
+        An email being sent is due again once its claim expires, its
+        `next_attempt_at` being pushed back by `claim_timeout`.
+        """
+        now = time()
+        if email_id is None:
+            # the oldest due emails, or ones whose worker died sending them
+            condition = ('id IN (SELECT id FROM outbox'
+                         ' WHERE status IN (?, ?) AND next_attempt_at <= ?'
+                         ' ORDER BY next_attempt_at LIMIT ?)')
+            parameters = (PENDING, SENDING, now, size)
+        else:
+            condition = 'id = ? AND status = ?'
+            parameters = (email_id, PENDING)
+
+        with self._db_lock:
+            rows = self._connection.execute(
+                'UPDATE outbox SET status = ?, next_attempt_at = ?'
+                f' WHERE {condition}'
+                ' RETURNING id, subject, sender, recipients, body, attempts',
+                (SENDING, now + self.claim_timeout) + parameters).fetchall()
+        return sorted(rows)
+
+    def _deliver(self, rows: list):
+        """Sends claimed emails, then forgets the sent ones and schedules the
+        others for another attempt."""
+        with self.app.app_context():
+            messages = [Message(subject, sender=sender,
+                                recipients=json.loads(recipients), body=body)
+                        for _, subject, sender, recipients, body, _ in rows]
+            try:
+                failures = self._send(messages)
+            except Exception as exc:  # eg. the SMTP server is unreachable
+                failures = [(message, exc) for message in messages]
+
+        errors = {id(message): exc for message, exc in failures}
+        sent = []
+        for (email_id, *_, attempts), message in zip(rows, messages):
+            if id(message) in errors:
+                self._failed(email_id, attempts + 1, errors[id(message)])
+            else:
+                sent.append(email_id)
+
+        if sent:
+            with self._db_lock:
+                self._connection.execute(
+                    f'DELETE FROM outbox WHERE id IN ({", ".join("?" * len(sent))})',
+                    sent)
+
+    def _send(self, messages: list) -> list:
+        """Sends emails, over a single warm SMTP connection when the app has
+        a pool.
+
+        Returns:
+            The (message, error) pairs of the emails that could not be sent.
+        """
+        pool = self.app.extensions.get('smtp_pool')
+        if pool is not None:
+            return pool.send_many(messages)
+
+        failures = []
+        for message in messages:
+            try:
+                self.app.extensions['mail'].send(message)
+            except Exception as exc:
+                failures.append((message, exc))
+        return failures
+
+    def _failed(self, email_id: int, attempts: int, exc: Exception):
+        """Schedules the next attempt of an email, or gives up on it."""
+        status = DEAD if attempts >= self.max_attempts else PENDING
+        next_attempt_at = time() + self.backoff * 2 ** (attempts - 1)
+        with self._db_lock:
+            self._connection.execute(
+                'UPDATE outbox SET status = ?, attempts = ?,'
+                ' next_attempt_at = ?, last_error = ? WHERE id = ?',
+                (status, attempts, next_attempt_at, repr(exc), email_id))
@@ -1,5 +1,5 @@
 """Handles all the app's mailing functionality."""
-from app.extensions import mail
+from app.extensions import email_queue
 from flask import current_app, url_for
 from flask_mail import Message
 
@@ -19,6 +19,12 @@ def send_confirmation_email(user_email: str):
 
     Examples of links can include, confirmation link for a user acknowledging
     their registration, a password reset link, etc.
+
+    The email is only queued here. It is sent by the email queue's
+    background workers, so the request does not wait on the mail server.
+
+    Returns:
+        1 if the email was queued, otherwise 0.
     """
     try:
         token = generate_url_token(user_email)
@@ -27,7 +33,7 @@ def send_confirmation_email(user_email: str):
         link = url_for('email_bl.confirm_email', token=token, _external=True)
         msg.body = f'Please confirm your email by clicking on the following link: {link}'
 
-        mail.send(msg)
+        email_queue.enqueue(msg)
     except Exception as exc:
         print(exc)
         return 0
@@ -0,0 +1,97 @@
+"""Defines an in-process cache for the users loaded by Flask-Login."""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class IdentityCache(object):
+    """A bounded, time-limited LRU cache of raw user documents keyed by id.
+
+    Only the raw (BSON-like) document is cached, never the `User` instance
+    itself. Every hit builds a fresh `User` from the cached data, so a view
+    that mutates `current_user` without saving it cannot leak the change
+    into other requests.
+
+    Attributes:
+        maxsize: the maximum amount of users kept in the cache.
+        ttl: the amount of seconds a cached user stays valid.
+        hits: the amount of lookups served from the cache.
+        misses: the amount of lookups that had to go to the database.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def configure(self, maxsize: int = None, ttl: float = None):
+        """Updates the cache's limits and drops any cached users."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = int(maxsize)
+            if ttl is not None:
+                self.ttl = float(ttl)
+            self._entries.clear()
+
+    def get(self, user_id: str):
+        """Retrieves the cached document of a user.
+
+        Returns:
+            The raw user document, or None if it is not cached or has expired.
+        """
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, document = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def set(self, user_id: str, document):
+        """Caches the raw document of a user, evicting the oldest if full."""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        key = str(user_id)
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, document)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Removes a user from the cache, if they are cached."""
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        """Removes every user from the cache and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Provides the cache's counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
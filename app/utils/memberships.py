@@ -0,0 +1,89 @@
+"""Defines the changes to a user's membership of a household.
+
+A membership is recorded twice: in the household's `members` and `admins`
+lists and in the user's `household_id` and `household_role`. The user's
+side is the one authorization relies on, so it is written with a single
+conditional update, which decides the outcome when requests race. The
+user is then dropped from the identity cache and their sessions get the
+new principal, as the atomic updates bypass the `User` save signals.
+"""
+from app.extensions import change_feed, identity_cache, session_store
+from models.household import Household
+from models.user import ADMIN_ROLE, MEMBER_ROLE, User
+
+
+def add_member(user_id, household_id, role: str = MEMBER_ROLE):
+    """Makes a user a member, or an admin, of a household."""
+    User.objects(id=user_id).update_one(set__household_id=household_id,
+                                        set__household_role=role)
+    changes = {'add_to_set__members': user_id}
+    if role == ADMIN_ROLE:
+        changes['add_to_set__admins'] = user_id
+    Household.objects(id=household_id).update_one(**changes)
+
+    _membership_changed(user_id, household_id=str(household_id),
+                        is_household_admin=role == ADMIN_ROLE)
+
+
+def remove_member(user_id, household_id) -> bool:
+    """Removes a user, who is not an admin, from a household.
+
+    Returns:
+        True if the user was removed, False if they are not a member of the
+        household or are one of its admins.
+    """
+    removed = _update_non_admin(user_id, household_id, unset__household_id=True,
+                                unset__household_role=True)
+    if not removed:
+        return False
+
+    Household.objects(id=household_id).update_one(pull__members=user_id,
+                                                  pull__admins=user_id)
+    _membership_changed(user_id, household_id=None, is_household_admin=False)
+    change_feed.close_user(household_id, user_id)
+    return True
+
+
+def promote_member(user_id, household_id) -> bool:
+    """Makes a member of a household one of its admins.
+
+    Returns:
+        True if the user was promoted, False if they are not a member of the
+        household or already are one of its admins.
+    """
+    promoted = _update_non_admin(user_id, household_id,
+                                 set__household_role=ADMIN_ROLE)
+    if not promoted:
+        return False
+
+    Household.objects(id=household_id).update_one(add_to_set__admins=user_id)
+    _membership_changed(user_id, is_household_admin=True)
+    return True
+
+
+def is_member(user_id, household_id) -> bool:
+    """Determines whether a user is a member of a household."""
+    return bool(User.objects(id=user_id, household_id=household_id).count())
+
+
+def _update_non_admin(user_id, household_id, **changes) -> bool:
+    """Updates a member of a household, unless they are one of its admins.
+
+    A user that has not been through `flask migrate-household-roles` has no
+    role yet, their household's `admins` tell whether they are an admin.
+    The update then only matches a user still without a role, so it loses
+    against a concurrent promotion.
+    """
+    if User.objects(id=user_id, household_id=household_id,
+                    household_role=MEMBER_ROLE).update_one(**changes):
+        return True
+
+    if Household.objects(id=household_id, admins=user_id).count():
+        return False
+    return bool(User.objects(id=user_id, household_id=household_id,
+                             household_role=None).update_one(**changes))
+
+
+def _membership_changed(user_id, **claims):
+    identity_cache.invalidate(user_id)
+    session_store.update_principal(user_id, **claims)
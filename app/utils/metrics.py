@@ -0,0 +1,216 @@
+"""Defines the app's request latency and database query metrics."""
+from bisect import bisect_left
+from flask import current_app, g, request
+from pymongo import monitoring
+from threading import Lock, local
+from time import perf_counter
+
+# upper bounds, in seconds, of the latency histograms' buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# upper bounds of the queries per request histogram's buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+class Histogram(object):
+    """A cumulative Prometheus-style histogram, one series per label set."""
+
+    def __init__(self, name: str, description: str, buckets: tuple):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts, sum, count]
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(
+                key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self) -> dict:
+        """Provides the (bucket counts, sum, count) of every label set."""
+        with self._lock:
+            return {key: (list(counts), total, count)
+                    for key, (counts, total, count) in self._series.items()}
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self.series().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(key + (('le', str(bound)),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+
+class Counter(object):
+    """A Prometheus-style counter, one value per label set."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{format_labels(key)} {value}'
+                     for key, value in values)
+        return lines
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class QueryMonitor(monitoring.CommandListener):
+    """Tallies the MongoDB commands run by the current thread's request.
+
+    Pymongo notifies the listener in the thread that ran the command, which
+    is the thread handling the request.
+    """
+
+    def __init__(self):
+        self._tally = local()
+
+    def start(self):
+        """Starts tallying the current thread's commands afresh."""
+        self._tally.count = 0
+        self._tally.duration = 0.0
+
+    def stop(self):
+        """Stops tallying the current thread's commands.
+
+        Returns:
+            The amount of commands run and their total seconds.
+        """
+        count = getattr(self._tally, 'count', 0)
+        duration = getattr(self._tally, 'duration', 0.0)
+        self._tally.count = None
+        return count or 0, duration
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        if getattr(self._tally, 'count', None) is None:
+            return  # not within a request
+        self._tally.count += 1
+        self._tally.duration += event.duration_micros / 1e6
+
+
+class Metrics(object):
+    """Flask extension recording the latency and queries of every request.
+
+    Each request's latency is observed per endpoint, along with the amount
+    and time of the MongoDB commands it ran. A request running more than
+    `METRICS_N_PLUS_ONE_THRESHOLD` commands is flagged as a likely N+1
+    query pattern and logged. With `METRICS_QUERY_HEADERS` the response
+    carries `X-DB-Queries` and `Server-Timing` headers, so tests and
+    browsers can see the queries of a single request.
+
+    Must be set up before the app connects to MongoDB, since pymongo only
+    reports to the command listeners registered when a client is created.
+    """
+
+    def __init__(self, app=None):
+        self.query_monitor = QueryMonitor()
+        self._listening = False
+        self.request_latency = Histogram(
+            'http_request_duration_seconds',
+            'Latency of the HTTP requests by endpoint.', LATENCY_BUCKETS)
+        self.db_queries = Histogram(
+            'http_request_db_queries',
+            'MongoDB commands run by each HTTP request.', QUERY_COUNT_BUCKETS)
+        self.db_latency = Histogram(
+            'http_request_db_duration_seconds',
+            'Time spent in MongoDB commands by each HTTP request.',
+            LATENCY_BUCKETS)
+        self.n_plus_one = Counter(
+            'http_request_n_plus_one_total',
+            'Requests running more MongoDB commands than the N+1 threshold.')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.threshold = int(app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+        self.query_headers = bool(app.config.get('METRICS_QUERY_HEADERS'))
+
+        if not self._listening:
+            monitoring.register(self.query_monitor)
+            self._listening = True
+
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        app.extensions['metrics'] = self
+
+    def render(self, extra_lines: list = ()) -> str:
+        """Provides the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in (self.request_latency, self.db_queries,
+                       self.db_latency, self.n_plus_one):
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return '\n'.join(lines) + '\n'
+
+    def _start_request(self):
+        g.metrics_started_at = perf_counter()
+        self.query_monitor.start()
+
+    def _end_request(self, response):
+        if 'metrics_started_at' not in g:
+            return response
+
+        latency = perf_counter() - g.metrics_started_at
+        query_count, query_time = self.query_monitor.stop()
+        endpoint = request.endpoint or 'unmatched'
+
+        self.request_latency.observe(latency, endpoint=endpoint,
+                                     method=request.method,
+                                     status=response.status_code)
+        self.db_queries.observe(query_count, endpoint=endpoint)
+        self.db_latency.observe(query_time, endpoint=endpoint)
+
+        if query_count > self.threshold:
+            self.n_plus_one.inc(endpoint=endpoint)
+            current_app.logger.warning(
+                'Possible N+1 queries: %s ran %d MongoDB commands',
+                endpoint, query_count)
+
+        if self.query_headers:
+            response.headers['X-DB-Queries'] = str(query_count)
+            response.headers['Server-Timing'] = \
+                f'db;dur={query_time * 1000:.1f};desc="{query_count} queries", ' \
+                f'app;dur={latency * 1000:.1f}'
+        return response
@@ -1,8 +1,57 @@
 """Defines middleware for views associate to households."""
-from flask import jsonify
+from app.utils.session_store import current_principal
+from flask import g, jsonify
 from flask_login import current_user
 from functools import wraps
 from models.household import Household
+from models.user import ADMIN_ROLE, MEMBER_ROLE
+
+# The household fields the decorated views are allowed to rely on.
+# `admins` is limited by an $elemMatch so that only the current user's
+# entry, if any, is sent back.
+HOUSEHOLD_PROJECTION = ('name', 'version', 'created_at', 'updated_at')
+
+
+def load_current_household():
+    """Resolves the current user's household and their role in it.
+
+    The user's role is read from their own `household_role`, so a single
+    point lookup on the household's `_id` is left, whatever its size.
+    Users that have not been through `flask migrate-household-roles` have
+    no role yet: a query on the household's `_id` and `members` fields
+    then verifies that the user is a member and determines whether they are
+    one of its admins.
+
+    The projection-limited household is stored as `g.household` (a raw
+    dictionary) and the admin status as `g.is_household_admin`.
+
+    Returns:
+        The household, or None if the user is not a member of it.
+    """
+    if 'household' in g:
+        return g.household
+
+    household_id = current_user.household_id.id
+    projection = {field: 1 for field in HOUSEHOLD_PROJECTION}
+    role = current_user.household_role
+
+    if role:
+        household = Household._get_collection().find_one({'_id': household_id},
+                                                          projection)
+        is_admin = role == ADMIN_ROLE
+    else:
+        projection['admins'] = {'$elemMatch': {'$eq': current_user.id}}
+        household = Household._get_collection().find_one(
+            {'_id': household_id, 'members': current_user.id}, projection)
+        is_admin = bool(household and household.pop('admins', None))
+
+    if not household:
+        return None
+
+    g.household = household
+    g.is_household_admin = is_admin
+    return household
+
 
 def household_member_required(view_func):
     """Middleware to protect a household route."""
@@ -13,16 +62,20 @@ def household_member_required(view_func):
         - Ensure that a user belongs to an existing household.
         - Ensure that the user is part of the household's members.
         """
-        # Check if the user is part of a household
-        if not current_user.household_id:
+        # Check if the user is part of a household, per their session first
+        principal = current_principal()
+        if principal and not principal['household_id'] \
+                or not current_user.household_id:
             return jsonify({'error': 'User is not part of a household'}), 400
 
         # Check if the user's household_id is valid and user is in the household
-        household = Household.objects(id=current_user.household_id.id).first()
-        if not household:
-            return jsonify({'error': 'User\'s Household does not exist'}), 400
+        if not load_current_household():
+            # only the failing path pays for telling both errors apart
+            household = Household.objects(id=current_user.household_id.id) \
+                .only('name').first()
+            if not household:
+                return jsonify({'error': 'User\'s Household does not exist'}), 400
 
-        if current_user not in household.members:
             return jsonify({'error': 'User is not a member of the'
                             + f' {household.name} Household.'}), 400
 
@@ -44,12 +97,15 @@ def household_admin_required(view_func):
         if not current_user:
             return jsonify({'error': 'User is not logged in'}), 400
 
-        # Ensure that the user is a household admin
-        household = current_user.household_id
-
-        if current_user not in household.admins:
+        # Ensure that the user is a household admin, rejecting the users
+        # whose session or role tells they are not one without a query
+        principal = current_principal()
+        if principal and not principal['is_household_admin'] \
+                or current_user.household_role == MEMBER_ROLE \
+                or not current_user.household_id or not load_current_household() \
+                or not g.is_household_admin:
             return jsonify({'error': 'Only household admins are allowed to'
-                            + 'change their household profile'})
+                            + ' change their household profile'}), 403
 
         return view_func(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -0,0 +1,53 @@
+"""Defines helpers for paginating lists with opaque cursors."""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+import json
+
+
+def encode_cursor(added_date: datetime, item_id: str) -> str:
+    """Generates the cursor pointing just after an item.
+
+    Arg:
+        added_date: the date the last item of a page was added.
+        item_id: the id of the last item of a page, which breaks ties
+            between items added at the same time.
+
+    The cursor is opaque to clients; they are only expected to send it back
+    to fetch the next page.
+    """
+    data = json.dumps([added_date.isoformat(), str(item_id)])
+    return urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Retrieves the position encoded in a cursor.
+
+    Returns:
+        The (added_date, item_id) pair, or None if the cursor is invalid.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        added_date, item_id = json.loads(urlsafe_b64decode(cursor + padding))
+        return datetime.fromisoformat(added_date), str(item_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_page_size(value, default: int, maximum: int):
+    """Validates a requested page size.
+
+    Returns:
+        The page size, capped at `maximum`, or None if it is invalid.
+    """
+    if value is None:
+        return default
+
+    try:
+        page_size = int(value)
+    except ValueError:
+        return None
+
+    if page_size < 1:
+        return None
+
+    return min(page_size, maximum)
@@ -0,0 +1,101 @@
+"""Defines the service hashing and checking the app's passwords."""
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from werkzeug.security import check_password_hash, generate_password_hash
+import multiprocessing
+import os
+
+# workers are not forked from the server process, whose threads, locks and
+# open connections they would inherit
+START_METHOD = 'forkserver' \
+    if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class PasswordHasher(object):
+    """Flask extension hashing and checking passwords in worker processes.
+
+    Password hashes are deliberately slow to compute. Running them in a
+    process pool keeps them from holding the GIL of the process serving
+    requests, so a burst of logins cannot starve every other request.
+
+    Config:
+        PASSWORD_HASH_METHOD: the full werkzeug hashing method, with its
+            work factors, eg. `scrypt:32768:8:1` or `pbkdf2:sha256:600000`.
+            Stored hashes made with any other method are outdated.
+        PASSWORD_HASH_SALT_LENGTH: the length of the generated salts.
+        PASSWORD_HASH_WORKERS: the size of the process pool. With 0, hashes
+            are computed in the calling thread.
+        PASSWORD_HASH_TIMEOUT: the seconds to wait for a hash to be computed,
+            before raising a `TimeoutError`.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.workers = 0
+        self.timeout = None
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = int(app.config.get('PASSWORD_HASH_SALT_LENGTH', 16))
+        self.workers = int(app.config.get('PASSWORD_HASH_WORKERS', 0))
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT')
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password: str) -> str:
+        """Hashes a password with the configured method."""
+        return self._run(generate_password_hash, password,
+                         self.method, self.salt_length)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Determines if a password matches a stored hash."""
+        if not password_hash or not password:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Determines if a stored hash was made with outdated work factors."""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        """Stops the worker processes, if any were started."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, function, *args):
+        """Runs a hashing function, in the pool if there is one.
+
+        Raises:
+            TimeoutError: if the pool is too busy to run it in time. The
+                hashing is then cancelled, unless a worker already started
+                it, so that a burst does not leave a backlog behind.
+        """
+        if not self.workers:
+            return function(*args)
+
+        future = self._get_executor().submit(function, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # the pool is started on first use, in the process that uses it, as
+        # worker processes do not survive a fork of the server process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(START_METHOD))
+                self._pid = os.getpid()
+            return self._executor
@@ -0,0 +1,88 @@
+"""Defines tools to find the queries that are not served by an index."""
+from pymongo import monitoring
+
+# commands MongoDB can explain without running them
+EXPLAINABLE_COMMANDS = ('find', 'aggregate', 'count', 'distinct',
+                        'findAndModify', 'update', 'delete')
+
+# command fields that are about the session rather than the query,
+# and which the explain command rejects
+SESSION_FIELDS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction',
+                  'readConcern', 'writeConcern')
+
+
+def collection_scans(explain_output: dict) -> list:
+    """Finds the collection scans of a query plan.
+
+    Arg:
+        explain_output: the output of an explain command, or any part of it.
+
+    Returns:
+        The `COLLSCAN` stages found anywhere in the output.
+    """
+    scans = []
+    if isinstance(explain_output, dict):
+        if explain_output.get('stage') == 'COLLSCAN':
+            scans.append(explain_output)
+        values = explain_output.values()
+    elif isinstance(explain_output, list):
+        values = explain_output
+    else:
+        return scans
+
+    for value in values:
+        scans.extend(collection_scans(value))
+    return scans
+
+
+def explain_command(database, command: dict) -> dict:
+    """Runs the explain command, without executing the explained query."""
+    return database.command('explain', command, verbosity='queryPlanner')
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Records the distinct explainable commands sent to MongoDB.
+
+    Register it with `pymongo.monitoring.register()` before any client is
+    created, then pass `recorder.commands` to `audit_commands()`.
+    """
+
+    def __init__(self):
+        self.commands = []
+        self._seen = set()
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+
+        command = {key: value for key, value in event.command.items()
+                   if key not in SESSION_FIELDS and not key.startswith('$')}
+        key = (event.database_name, repr(command))
+        if key not in self._seen:
+            self._seen.add(key)
+            self.commands.append((event.database_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def audit_commands(client, commands: list) -> list:
+    """Explains recorded commands to find those scanning a whole collection.
+
+    Arg:
+        client: a `MongoClient` connected to the server the commands ran on.
+        commands: (database name, command) pairs, eg. from a `QueryRecorder`.
+
+    Returns:
+        The (database name, command, COLLSCAN stages) of every command
+        whose plan scans a collection.
+    """
+    findings = []
+    for database_name, command in commands:
+        scans = collection_scans(explain_command(client[database_name], command))
+        if scans:
+            findings.append((database_name, command, scans))
+    return findings
@@ -0,0 +1,114 @@
+"""Defines how documents are turned into API response data.
+
+Each endpoint declares the fields it reads, so that its query projects
+them with `only()` or a raw projection instead of loading whole documents.
+The serializers work on the raw (`as_pymongo()`) documents, whose ObjectIds,
+UUIDs and dates the app's JSON provider encodes.
+"""
+
+# the fields of `GET /users/me`
+USER_FIELDS = ('username', 'household_id', 'created_at')
+# the fields of the items of `GET /households/shopping_list/items`
+SHOPPING_LIST_ITEM_FIELDS = ('item_name', 'added_date', 'added_by_user',
+                             'is_bought', 'bought_date', 'bought_by_user')
+# the fields of the items of `GET /households/shopping_list/history`
+ARCHIVED_ITEM_FIELDS = ('item_name', 'added_date', 'added_by_user',
+                        'bought_date', 'bought_by_user', 'archived_at')
+
+
+def projection(fields: tuple) -> dict:
+    """Provides the raw MongoDB projection of some fields."""
+    return {field: 1 for field in fields}
+
+
+def serialize_user(user: dict) -> dict:
+    """Provides the public fields of a raw user document."""
+    household_id = user.get('household_id')
+    return {
+        'username': user['username'],
+        'household_id': str(household_id) if household_id else None,
+        'created_at': user.get('created_at'),
+    }
+
+
+def serialize_household_profile(household: dict, roles: dict,
+                                usernames: dict) -> dict:
+    """Provides the profile of a household.
+
+    Arg:
+        household: the raw household, with at least its name and created_at.
+        roles: the raw household's `admins` and `members` ids.
+        usernames: the username of each of those users, by id.
+    """
+    return {
+        'household name': household['name'],
+        'admins': [usernames[user_id] for user_id in roles.get('admins', [])
+                   if user_id in usernames],
+        'members': [usernames[user_id] for user_id in roles.get('members', [])
+                    if user_id in usernames],
+        'created_at': household.get('created_at'),
+    }
+
+
+def serialize_shopping_list_item(item: dict) -> dict:
+    """Provides the public fields of a raw shopping list item document.
+
+    Arg:
+        item: the item as stored in the database, eg. from `as_pymongo()`.
+            Its user references are expected to be plain ObjectIds.
+    """
+    item_info = {
+        "item_id": item['_id'],  # the item's primary key
+        "item_name": item['item_name'],
+        "added_date": item.get('added_date'),
+        "added_by_user": str(item.get('added_by_user')),
+        "is_bought": item.get('is_bought', False)
+    }
+
+    # provide extra info if the item is marked as bought
+    if item_info['is_bought']:
+        item_info.update({
+            "bought_by_user": str(item.get('bought_by_user')),
+            "bought_date": item.get('bought_date')
+        })
+
+    return item_info
+
+
+def serialize_personal_shopping_list_item(item: dict) -> dict:
+    """Provides the public fields of a raw personal shopping list item."""
+    item_info = {
+        'item_id': item.get('item_id'),
+        'item_name': item['item_name'],
+        'added_date': item.get('added_date'),
+        'is_bought': item.get('is_bought', False),
+    }
+    if item_info['is_bought']:
+        item_info['bought_date'] = item.get('bought_date')
+    return item_info
+
+
+def serialize_archived_item(item: dict) -> dict:
+    """Provides the public fields of a raw archived shopping list item."""
+    return {
+        'item_id': item['_id'],
+        'item_name': item['item_name'],
+        'added_date': item.get('added_date'),
+        'added_by_user': str(item.get('added_by_user')),
+        'bought_date': item.get('bought_date'),
+        'bought_by_user': str(item.get('bought_by_user')),
+        'archived_at': item.get('archived_at'),
+    }
+
+
+def serialize_shopping_list_summary(summary: dict) -> dict:
+    """Provides the public fields of a raw shopping list summary."""
+    return {
+        'open_count': summary.get('open_count', 0),
+        'bought_count': summary.get('bought_count', 0),
+        'last_added_at': summary.get('last_added_at'),
+        'updated_at': summary.get('updated_at'),
+        # users whose items all left the list keep a zero count until rebuilt
+        'contributions': {user_id: count for user_id, count
+                          in summary.get('contributions', {}).items() if count},
+    }
@@ -0,0 +1,386 @@
+"""Defines server-side sessions holding the logged-in user's principal."""
+from collections import OrderedDict, defaultdict
+from datetime import datetime, UTC
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer, want_bytes
+from secrets import token_urlsafe
+from threading import Lock
+from time import monotonic
+from werkzeug.datastructures import CallbackDict
+
+
+class InMemorySessionBackend(object):
+    """Stores sessions in the process, evicting the least recently used.
+
+    Only suits a single process, eg. development and tests, since every
+    process has its own sessions.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()  # sid -> (expires at, user id, data)
+        self._sids_of_user = defaultdict(set)  # user id -> sids
+        self._lock = Lock()
+
+    def load(self, sid: str):
+        """Provides the serialized data of a session, or None if it expired."""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                self._forget(sid)
+                return None
+            self._sessions.move_to_end(sid)
+            return entry[2]
+
+    def save(self, sid: str, data: str, user_id, ttl: int):
+        with self._lock:
+            self._forget(sid)
+            self._sessions[sid] = (monotonic() + ttl, user_id, data)
+            if user_id:
+                self._sids_of_user[user_id].add(sid)
+            while len(self._sessions) > self.maxsize:
+                self._forget(next(iter(self._sessions)))
+
+    def touch(self, sid: str, user_id, ttl: int):
+        """Extends a session's expiry to `ttl` seconds from now."""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None and entry[0] > monotonic():
+                self._sessions[sid] = (monotonic() + ttl, entry[1], entry[2])
+
+    def replace(self, sid: str, data: str):
+        """Updates a session's data, keeping its expiry."""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], entry[1], data)
+
+    def delete(self, sid: str, user_id=None):
+        with self._lock:
+            self._forget(sid)
+
+    def sessions_of(self, user_id) -> list:
+        """Provides the ids of a user's sessions."""
+        with self._lock:
+            now = monotonic()
+            sids = list(self._sids_of_user.get(user_id, ()))
+            for sid in sids:
+                if self._sessions[sid][0] <= now:
+                    self._forget(sid)
+            return [sid for sid in sids if sid in self._sessions]
+
+    def _forget(self, sid: str):
+        """Drops a session and its entry in its user's index, with the lock."""
+        entry = self._sessions.pop(sid, None)
+        if entry is None or not entry[1]:
+            return
+
+        sids = self._sids_of_user[entry[1]]
+        sids.discard(sid)
+        if not sids:
+            del self._sids_of_user[entry[1]]
+
+
+class RedisSessionBackend(object):
+    """Stores sessions in Redis, shared by every process of the app.
+
+    Only the `get`, `set` (with `ex`, `keepttl` and `xx`), `delete`, `sadd`,
+    `srem`, `smembers`, `expire` and `ttl` commands are used, so any client
+    offering them will do.
+    Each user's session ids are kept in a set, to revoke them all at once,
+    which lives as long as the longest-lived of them.
+    """
+
+    def __init__(self, client, prefix: str = 'session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, sid: str):
+        data = self.client.get(self.prefix + sid)
+        return data.decode() if isinstance(data, bytes) else data
+
+    def save(self, sid: str, data: str, user_id, ttl: int):
+        self.client.set(self.prefix + sid, data, ex=ttl)
+        if user_id:
+            key = self._user_key(user_id)
+            self.client.sadd(key, sid)
+            self._extend(key, ttl)
+
+    def touch(self, sid: str, user_id, ttl: int):
+        """Extends a session's expiry to `ttl` seconds from now."""
+        if self.client.expire(self.prefix + sid, ttl) and user_id:
+            self._extend(self._user_key(user_id), ttl)
+
+    def replace(self, sid: str, data: str):
+        """Updates a session's data, keeping its expiry."""
+        self.client.set(self.prefix + sid, data, keepttl=True, xx=True)
+
+    def delete(self, sid: str, user_id=None):
+        self.client.delete(self.prefix + sid)
+        if user_id:
+            self.client.srem(self._user_key(user_id), sid)
+
+    def sessions_of(self, user_id) -> list:
+        sids = [sid.decode() if isinstance(sid, bytes) else sid
+                for sid in self.client.smembers(self._user_key(user_id))]
+        # forget the ids of the sessions that expired on their own
+        expired = [sid for sid in sids if self.client.get(self.prefix + sid) is None]
+        if expired:
+            self.client.srem(self._user_key(user_id), *expired)
+        return [sid for sid in sids if sid not in expired]
+
+    def _user_key(self, user_id) -> str:
+        return f'{self.prefix}user:{user_id}'
+
+    def _extend(self, key: str, ttl: int):
+        # never shortens the expiry, set by a longer-lived session
+        if self.client.ttl(key) < ttl:
+            self.client.expire(key, ttl)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """A session whose data stays on the server, the cookie only naming it."""
+
+    def __init__(self, initial=None, sid: str = None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or token_urlsafe(32)
+        self.modified = False
+        self.replaced_sid = None  # the id to forget after a regeneration
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface keeping the sessions in a backend.
+
+    The cookie only holds the session's signed id. Permanent sessions live
+    for `PERMANENT_SESSION_LIFETIME`, as their cookie does. The others
+    expire once unused for `SESSION_TTL`: an unchanged session is not saved
+    again, but its expiry is extended, at most once per `refresh_interval`
+    seconds in each process.
+    """
+    serializer = TaggedJSONSerializer()
+    salt = 'server-side-session'
+    refreshed_maxsize = 10000  # sessions whose last extension is remembered
+
+    def __init__(self, backend, ttl: int, refresh_interval: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._refreshed = OrderedDict()  # sid -> when its expiry was extended
+        self._lock = Lock()
+
+    def open_session(self, app, request):
+        sid = self.read_cookie(app, request.cookies.get(self.get_cookie_name(app)))
+        if sid:
+            data = self.backend.load(sid)
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.replaced_sid:
+            self.backend.delete(session.replaced_sid, session.get('_user_id'))
+
+        if not session:
+            if session.modified:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            if not session.permanent:
+                self._refresh(session)
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds()) \
+            if session.permanent else self.ttl
+        self._mark_refreshed(session.sid)
+        self.backend.save(session.sid, self.serializer.dumps(dict(session)),
+                          session.get('_user_id'), ttl)
+
+        response.set_cookie(
+            name, self._signer(app).sign(want_bytes(session.sid)).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+    def read_cookie(self, app, cookie: str):
+        """Provides the session id of a session cookie, if it is genuine."""
+        if not cookie or not app.secret_key:
+            return None
+        try:
+            return self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return None
+
+    def load(self, sid: str):
+        """Provides the data of a stored session, or None."""
+        data = self.backend.load(sid)
+        return self.serializer.loads(data) if data is not None else None
+
+    def _refresh(self, session: ServerSideSession):
+        """Extends the expiry of a session, unless it was recently extended."""
+        with self._lock:
+            refreshed_at = self._refreshed.get(session.sid)
+            if refreshed_at is not None \
+                    and monotonic() - refreshed_at < self.refresh_interval:
+                return
+        self._mark_refreshed(session.sid)
+        self.backend.touch(session.sid, session.get('_user_id'), self.ttl)
+
+    def _mark_refreshed(self, sid: str):
+        with self._lock:
+            self._refreshed[sid] = monotonic()
+            self._refreshed.move_to_end(sid)
+            while len(self._refreshed) > self.refreshed_maxsize:
+                self._refreshed.popitem(last=False)
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+
+class SessionStore(object):
+    """Flask extension replacing cookie sessions with server-side sessions.
+
+    `SESSION_BACKEND` selects `memory`, `redis` (with `SESSION_REDIS_URL`)
+    or `cookie`, Flask's own signed cookies, which cannot be revoked.
+
+    A server-side session holds the logged-in user's principal, see
+    `principal_of`. "Remember me" logins get a permanent session rather
+    than a Flask-Login remember cookie, so that revoking a user's sessions,
+    eg. after a password change, actually logs them out everywhere.
+    """
+
+    def __init__(self, app=None):
+        self.interface = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('SESSION_BACKEND') or 'cookie'
+        if backend == 'memory':
+            store = InMemorySessionBackend(int(app.config.get('SESSION_MAXSIZE', 10000)))
+        elif backend == 'redis':
+            import redis  # only needed with the redis backend
+            store = RedisSessionBackend(
+                redis.Redis.from_url(app.config.get('SESSION_REDIS_URL')))
+        elif backend == 'cookie':
+            store = None
+        else:
+            raise ValueError(f'Unknown session backend: {backend}')
+
+        self.interface = None
+        if store is not None:
+            self.interface = ServerSideSessionInterface(
+                store, int(app.config.get('SESSION_TTL', 86400)),
+                int(app.config.get('SESSION_REFRESH_INTERVAL', 300)))
+            app.session_interface = self.interface
+        app.extensions['session_store'] = self
+
+    def login(self, user, is_household_admin: bool):
+        """Starts the session of a user who just logged in.
+
+        The session gets a new id, so that one set before logging in cannot
+        be reused, and the user's principal.
+        """
+        if self.interface is None:
+            return
+
+        if session.pop('_remember', None) == 'set':
+            session.permanent = True
+        session.replaced_sid, session.sid = session.sid, token_urlsafe(32)
+        session['principal'] = principal_of(user, is_household_admin)
+        session['authenticated_at'] = datetime.now(UTC)
+
+    def logout(self):
+        """Ends the current session, after Flask-Login logged the user out.
+
+        Flask-Login's request to clear its remember cookie, if any, is kept.
+        """
+        if self.interface is None:
+            return
+
+        remember = session.get('_remember')
+        session.clear()
+        if remember:
+            session['_remember'] = remember
+
+    def touch(self):
+        """Extends the expiry of the current session, unless it is permanent.
+
+        For the requests whose session Flask does not save, eg. the ones
+        answered by the ASGI app, which would otherwise expire while in use.
+        """
+        if self.interface is None or not session or session.permanent:
+            return
+
+        self.interface._refresh(session)
+
+    def revoke_user(self, user_id, keep_current: bool = False):
+        """Ends every session of a user, eg. after a password change.
+
+        Arg:
+            keep_current: whether the current request's session stays.
+        """
+        if self.interface is None:
+            return
+
+        current = getattr(session, 'sid', None) if keep_current else None
+        for sid in self.interface.backend.sessions_of(str(user_id)):
+            if sid != current:
+                self.interface.backend.delete(sid, str(user_id))
+
+    def update_principal(self, user_id, **claims):
+        """Updates the principal of every session of a user.
+
+        Called after a change to the user's household or role, so that the
+        sessions do not keep outdated claims.
+        """
+        if self.interface is None:
+            return
+
+        backend = self.interface.backend
+        for sid in backend.sessions_of(str(user_id)):
+            data = self.interface.load(sid)
+            if not data or 'principal' not in data:
+                continue
+            if getattr(session, 'sid', None) == sid:
+                session['principal'] = dict(session['principal'], **claims)
+                continue
+            data['principal'].update(claims)
+            backend.replace(sid, self.interface.serializer.dumps(data))
+
+
+def principal_of(user, is_household_admin: bool) -> dict:
+    """Provides the claims of a user kept in their sessions.
+
+    They are enough for most authorization decisions, without loading the
+    user or their household.
+    """
+    return {
+        'user_id': str(user.id),
+        'username': user.username,
+        'household_id': str(user.household_id.id) if user.household_id else None,
+        'is_household_admin': bool(is_household_admin),
+    }
+
+
+def current_principal():
+    """Provides the logged-in user's principal, or None without one."""
+    return session.get('principal')
@@ -0,0 +1,285 @@
+"""Defines batches of shopping list changes applied in a single bulk write."""
+from app.utils.serialization import serialize_shopping_list_item
+from app.utils.shopping_list_summary import SummaryChange
+from datetime import datetime, UTC
+from models.shopping_list_item import ShoppingListItem
+from mongoengine.errors import ValidationError
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from uuid import UUID
+
+OPERATIONS = ('add', 'mark_bought', 'unmark_bought', 'remove')
+
+
+class ShoppingListBatch(object):
+    """Plans and writes a batch of changes to a household's shopping list.
+
+    The operations are checked against the `ShoppingListItem` schema and the
+    current state of the items they target, read with a single query. The
+    valid ones become a single ordered bulk write, whose writes are
+    conditional, eg. only an unbought item is marked as bought. An
+    operation whose write did not apply, because another request changed
+    the item in the meantime, is reported as a conflict.
+
+    A bulk write only counts the documents it changed, per kind of write.
+    When fewer were changed than planned, `recount` is set: the summary of
+    the shopping list must then be rebuilt rather than updated. The items
+    are then read again to report which operations did not apply as
+    conflicts: an update unless the batch provably wrote it, and a removal
+    if none of the batch's removals deleted anything or its item is still
+    there. Otherwise its item is gone, whichever request removed it.
+
+    Attributes:
+        results: the outcome of each operation, in the batch's order.
+        events: the change feed events of the applied operations.
+        recount: whether the batch's writes are not all known.
+    """
+
+    def __init__(self, household_id, user_id, operations: list):
+        self.household_id = household_id
+        self.user_id = user_id
+        self.operations = operations
+        self.results = []
+        self.events = []
+        self.recount = False
+        self._now = datetime.now(UTC)
+        self._requests = []  # the bulk write's requests
+        self._written = []  # the result of each of the bulk write's requests
+        self._changes = {}  # result index -> (operation, the item before it)
+
+    def apply(self) -> int:
+        """Writes the batch's valid operations.
+
+        Returns:
+            The amount of operations applied.
+        """
+        self._plan()
+        if not self._requests:
+            return 0
+
+        try:
+            result = ShoppingListItem._get_collection().bulk_write(
+                self._requests, ordered=True)
+            self._check_counts(len(self._requests), result.inserted_count,
+                               result.modified_count, result.deleted_count)
+        except BulkWriteError as error:
+            # an ordered bulk write stops at its first failed write, if any,
+            # else only the write concern failed and every write was made
+            details = error.details
+            written = len(self._requests)
+            if details.get('writeErrors'):
+                failed = details['writeErrors'][0]
+                written = failed['index']
+                self._reject_unwritten(written, failed.get('errmsg'))
+            self._check_counts(written, details['nInserted'],
+                               details['nModified'], details['nRemoved'])
+
+        self.events = [event for index, event in self.events
+                       if self.results[index]['status'] == 'ok']
+        return sum(result['status'] == 'ok' for result in self.results)
+
+    def summary_update(self) -> dict:
+        """Provides the shopping list summary's update of the applied operations."""
+        change = SummaryChange()
+        for result in self.results:
+            if result['status'] != 'ok':
+                continue
+
+            kind, document = self._changes[result['index']]
+            if kind == 'add':
+                change.added(document)
+            elif kind == 'remove':
+                change.removed(document)
+            elif kind == 'mark_bought':
+                change.bought()
+            else:
+                change.unbought()
+        return change.update()
+
+    def _plan(self):
+        now = self._now
+        items = self._current_items()
+
+        for index, operation in enumerate(self.operations):
+            error = self._validate(operation)
+            if error:
+                self.results.append({'index': index, 'status': 'error',
+                                     'error': error})
+                continue
+
+            kind = operation['op']
+            if kind == 'add':
+                item = ShoppingListItem(household=self.household_id,
+                                        item_name=operation['item_name'],
+                                        added_by_user=self.user_id,
+                                        added_date=now)
+                try:
+                    item.validate()
+                except ValidationError as error:
+                    self.results.append({'index': index, 'status': 'error',
+                                         'error': '; '.join(
+                                             f'{field}: {message}' for field, message
+                                             in error.to_dict().items())})
+                    continue
+
+                document = item.to_mongo().to_dict()
+                item_id = document['_id']
+                self._requests.append(InsertOne(document))
+                items[item_id] = document
+                self._changes[index] = (kind, document)
+                self._accept(index, kind, item_id, 'item_added', document)
+                continue
+
+            item_id = str(UUID(operation['item_id']))
+            document = items.get(item_id)
+            if document is None:
+                self.results.append({'index': index, 'status': 'error',
+                                     'item_id': item_id,
+                                     'error': 'The item is not on the shopping list'})
+                continue
+
+            selector = {'_id': item_id, 'household': self.household_id}
+            if kind == 'remove':
+                self._requests.append(DeleteOne(selector))
+                items[item_id] = None
+                self._changes[index] = (kind, document)
+                self._accept(index, kind, item_id, 'item_removed',
+                             {'_id': item_id})
+                continue
+
+            is_bought = kind == 'mark_bought'
+            if document.get('is_bought', False) == is_bought:
+                state = 'already bought' if is_bought else 'not bought'
+                self.results.append({'index': index, 'status': 'error',
+                                     'item_id': item_id,
+                                     'error': f'The item is {state}'})
+                continue
+
+            if is_bought:
+                changes = {'is_bought': True, 'bought_date': now,
+                           'bought_by_user': self.user_id}
+                update = {'$set': changes}
+            else:
+                changes = {'is_bought': False, 'bought_date': None,
+                           'bought_by_user': None}
+                update = {'$set': {'is_bought': False},
+                          '$unset': {'bought_date': '', 'bought_by_user': ''}}
+
+            self._requests.append(UpdateOne(
+                dict(selector, is_bought=not is_bought), update))
+            self._changes[index] = (kind, document)
+            document = items[item_id] = dict(document, **changes)
+            self._accept(index, kind, item_id,
+                         'item_bought' if is_bought else 'item_unbought',
+                         document)
+
+    def _validate(self, operation) -> str:
+        """Provides the reason an operation is malformed, if it is."""
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            return f'`op` must be one of: {", ".join(OPERATIONS)}'
+
+        if operation['op'] == 'add':
+            if not operation.get('item_name'):
+                return 'The `item_name` is required'
+            return None
+
+        try:
+            ShoppingListItem.item_id.validate(operation.get('item_id'))
+        except (ValidationError, TypeError):
+            return 'The `item_id` must be an item id'
+        return None
+
+    def _current_items(self) -> dict:
+        """Reads the items targeted by the batch, keyed by id."""
+        item_ids = set()
+        for operation in self.operations:
+            if isinstance(operation, dict) and operation.get('op') != 'add' \
+                    and self._validate(operation) is None:
+                item_ids.add(str(UUID(operation['item_id'])))
+
+        if not item_ids:
+            return {}
+
+        cursor = ShoppingListItem._get_collection().find(
+            {'_id': {'$in': list(item_ids)}, 'household': self.household_id})
+        return {document['_id']: document for document in cursor}
+
+    def _accept(self, index: int, kind: str, item_id: str, event_type: str,
+                document: dict):
+        self.results.append({'index': index, 'status': 'ok', 'op': kind,
+                             'item_id': item_id})
+        self._written.append(self.results[-1])
+        event_item = {'item_id': item_id} if kind == 'remove' \
+            else serialize_shopping_list_item(document)
+        self.events.append((len(self.results) - 1,
+                            {'type': event_type, 'item': event_item}))
+
+    def _reject_unwritten(self, failed: int, error: str):
+        """Marks the operations from the failed write on as not applied."""
+        self._written[failed].update(status='error', error=error)
+        for result in self._written[failed + 1:]:
+            result.update(status='error',
+                          error='An earlier operation of the batch failed')
+
+    def _check_counts(self, written: int, inserted: int, modified: int,
+                      deleted: int):
+        """Marks the written operations not proven applied as conflicts.
+
+        Arg:
+            written: the amount of requests the bulk write ran.
+            inserted, modified, deleted: the documents they changed.
+        """
+        results = self._written[:written]
+        removes = [result for result in results if result['op'] == 'remove']
+        updates = [result for result in results
+                   if result['op'] in ('mark_bought', 'unmark_bought')]
+        if deleted == len(removes) and modified == len(updates):
+            return
+
+        self.recount = True
+        items = self._items_after_write(removes + updates)
+        if deleted == 0:
+            self._conflict(removes)
+        else:
+            # another request removed some of the items too, but which ones
+            # is unknown: those gone were removed as asked either way
+            self._conflict([result for result in removes
+                            if result['item_id'] in items])
+        if modified < len(updates):
+            self._conflict([result for result in updates
+                            if not self._proven_update(result, updates, items)])
+
+    def _items_after_write(self, results: list) -> dict:
+        """Reads the items the written operations targeted, keyed by id."""
+        cursor = ShoppingListItem._get_collection().find(
+            {'_id': {'$in': list({result['item_id'] for result in results})},
+             'household': self.household_id},
+            {'is_bought': 1, 'bought_by_user': 1, 'bought_date': 1})
+        return {document['_id']: document for document in cursor}
+
+    def _proven_update(self, result: dict, updates: list, items: dict) -> bool:
+        """Whether an update was, for sure, written by this batch.
+
+        Only marking an item as bought leaves a trace of the batch, the
+        batch's time, and only the last update of an item can be checked.
+        The user marking the item from another request in the same
+        millisecond leaves the same trace, which `recount` makes up for.
+        """
+        item_id = result['item_id']
+        if result['op'] != 'mark_bought' or any(
+                later['item_id'] == item_id
+                for later in updates[updates.index(result) + 1:]):
+            return False
+
+        actual = items.get(item_id)
+        # MongoDB keeps dates to the millisecond, and returns them naive
+        bought_date = self._now.replace(
+            microsecond=self._now.microsecond // 1000 * 1000, tzinfo=None)
+        return actual is not None and actual.get('is_bought', False) \
+            and actual.get('bought_by_user') == self.user_id \
+            and actual.get('bought_date') == bought_date
+
+    def _conflict(self, results: list):
+        for result in results:
+            result.update(status='conflict',
+                          error='The item was changed by another request')
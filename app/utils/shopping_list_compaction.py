@@ -0,0 +1,240 @@
+"""Defines the archival of bought shopping list items."""
+from app.utils.conditional_requests import bump_household_version
+from app.utils.shopping_list_summary import SummaryChange, rebuild_summary
+from collections import defaultdict
+from datetime import datetime, timedelta, UTC
+from models.shopping_list_history import ArchivedShoppingListItem
+from models.shopping_list_item import ShoppingListItem
+from models.user import User
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from threading import Event, Thread
+from uuid import UUID, uuid5
+
+DUPLICATE_KEY_ERROR = 11000
+# the namespace of the ids derived for personal items without an `item_id`
+PERSONAL_ITEM_NAMESPACE = UUID('2355b28c-0cfa-47df-94a5-39498ec36473')
+# the fields an archived item keeps
+ARCHIVED_FIELDS = ('item_name', 'added_date', 'bought_date', 'added_by_user',
+                   'bought_by_user')
+
+
+class ShoppingListCompactor(object):
+    """Flask extension moving old bought items into the shopping list history.
+
+    Items bought more than `SHOPPING_LIST_RETENTION_DAYS` ago, from both the
+    households' shopping lists and the users' personal ones, are moved into
+    the `shopping_list_history` collection. Archived items expire after
+    `SHOPPING_LIST_HISTORY_TTL_DAYS`, or are kept for good without it.
+
+    With a `SHOPPING_LIST_COMPACTION_INTERVAL`, a background thread compacts
+    the lists every so many seconds. Otherwise, eg. to run it from a single
+    scheduled job, use `flask compact-shopping-lists`. A compaction can
+    safely run alongside another one, or be interrupted.
+    """
+
+    def __init__(self, app=None):
+        self._thread = None
+        self._stopping = Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self._thread is not None:
+            self.shutdown()
+
+        self.retention = timedelta(
+            days=float(app.config.get('SHOPPING_LIST_RETENTION_DAYS', 30)))
+        ttl_days = app.config.get('SHOPPING_LIST_HISTORY_TTL_DAYS')
+        self.history_ttl = timedelta(days=float(ttl_days)) if ttl_days else None
+        self.batch_size = int(app.config.get('SHOPPING_LIST_COMPACTION_BATCH_SIZE', 500))
+        self.interval = float(app.config.get('SHOPPING_LIST_COMPACTION_INTERVAL') or 0)
+        self.logger = app.logger
+
+        self._stopping.clear()
+        if self.interval:
+            self._thread = Thread(target=self._run, daemon=True,
+                                  name='shopping-list-compactor')
+            self._thread.start()
+
+        app.extensions['shopping_list_compactor'] = self
+
+    def compact(self, now: datetime = None) -> dict:
+        """Archives the items bought before the retention period.
+
+        Returns:
+            The amount of household and personal items archived.
+        """
+        now = now or datetime.now(UTC)
+        cutoff = now - self.retention
+        archived = {'household': 0, 'personal': 0}
+
+        while not self._stopping.is_set():
+            count = self._compact_household_items(cutoff, now)
+            archived['household'] += count
+            if count < self.batch_size:
+                break
+
+        while not self._stopping.is_set():
+            count, users = self._compact_personal_items(cutoff, now)
+            archived['personal'] += count
+            if users < self.batch_size:
+                break
+
+        return archived
+
+    def shutdown(self, timeout: float = None):
+        """Stops the background compaction, between two batches."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                archived = self.compact()
+                if any(archived.values()):
+                    self.logger.info('Archived %d household and %d personal'
+                                     ' shopping list item/s', archived['household'],
+                                     archived['personal'])
+            except Exception:
+                self.logger.exception('The shopping list compaction failed')
+
+    def _compact_household_items(self, cutoff: datetime, now: datetime) -> int:
+        """Archives a batch of the households' old bought items.
+
+        The items are archived before they are deleted, so that none is
+        lost if the compaction is interrupted. Those left in the list, eg.
+        unbought in the meantime, are then taken out of the history.
+
+        Returns:
+            The amount of items read, archived or not.
+        """
+        items = ShoppingListItem._get_collection()
+        batch = list(items.find({'is_bought': True, 'bought_date': {'$lt': cutoff}})
+                     .sort('bought_date', 1).limit(self.batch_size))
+        if not batch:
+            return 0
+
+        self._archive([dict(self._archived(item, now), _id=item['_id'],
+                            household=item['household']) for item in batch])
+
+        by_household = defaultdict(list)
+        for item in batch:
+            by_household[item['household']].append(item)
+
+        for household_id, household_items in by_household.items():
+            item_ids = [item['_id'] for item in household_items]
+            # the condition leaves the items unbought in the meantime
+            deleted = items.delete_many({
+                '_id': {'$in': item_ids},
+                'is_bought': True, 'bought_date': {'$lt': cutoff},
+            }).deleted_count
+
+            if deleted < len(household_items):
+                left = [item['_id'] for item in
+                        items.find({'_id': {'$in': item_ids}}, {'_id': 1})]
+                self._unarchive(left)
+
+            if deleted == len(household_items):
+                change = SummaryChange()
+                for item in household_items:
+                    change.removed(item)
+                bump_household_version(household_id, change.update())
+            elif deleted:
+                # which items were left is unknown, recount them instead
+                rebuild_summary(household_id)
+        return len(batch)
+
+    def _compact_personal_items(self, cutoff: datetime, now: datetime):
+        """Archives the old bought items of a batch of personal lists.
+
+        As for the households' items, the items are archived first, then
+        those left in the list are taken out of the history.
+
+        Returns:
+            The amount of items archived and of users read.
+        """
+        users = User._get_collection()
+        due = {'is_bought': True, 'bought_date': {'$lt': cutoff}}
+        batch = list(users.find({'personal_shopping_list': {'$elemMatch': due}},
+                                {'personal_shopping_list': 1})
+                     .limit(self.batch_size))
+
+        naive_cutoff = cutoff.replace(tzinfo=None)  # pymongo's dates are naive
+        count = 0
+        for user in batch:
+            due_items = [item for item in user.get('personal_shopping_list', [])
+                         if item.get('is_bought') and item.get('bought_date')
+                         and item['bought_date'] < naive_cutoff]
+            archived = [dict(self._archived(item, now), user=user['_id'],
+                             _id=personal_item_id(user['_id'], item))
+                        for item in due_items]
+            self._archive(archived)
+            user = users.find_one_and_update(
+                {'_id': user['_id']}, {'$pull': {'personal_shopping_list': due}},
+                {'personal_shopping_list': 1},
+                return_document=ReturnDocument.AFTER) or {}
+
+            left = {personal_item_key(item)
+                    for item in user.get('personal_shopping_list', [])}
+            unarchived = [document['_id'] for item, document
+                          in zip(due_items, archived)
+                          if personal_item_key(item) in left]
+            self._unarchive(unarchived)
+            count += len(archived) - len(unarchived)
+        return count, len(batch)
+
+    def _archived(self, item: dict, now: datetime) -> dict:
+        document = {field: item[field] for field in ARCHIVED_FIELDS
+                    if item.get(field) is not None}
+        document['archived_at'] = now
+        if self.history_ttl:
+            document['expires_at'] = now + self.history_ttl
+        return document
+
+    @staticmethod
+    def _archive(documents: list):
+        """Appends items to the history, skipping those already archived by
+        an earlier, interrupted, compaction."""
+        if not documents:
+            return
+
+        try:
+            ArchivedShoppingListItem._get_collection().insert_many(
+                documents, ordered=False)
+        except BulkWriteError as error:
+            if any(write_error['code'] != DUPLICATE_KEY_ERROR
+                   for write_error in error.details['writeErrors']):
+                raise
+
+    @staticmethod
+    def _unarchive(archived_ids: list):
+        """Takes items out of the history, which were archived but not
+        removed from their list."""
+        if archived_ids:
+            ArchivedShoppingListItem._get_collection().delete_many(
+                {'_id': {'$in': archived_ids}})
+
+
+def personal_item_key(item: dict):
+    """Tells a personal shopping list item apart from the others of its list,
+    whether bought or not, unlike `personal_item_id`."""
+    return item.get('item_id') or (item.get('item_name'), item.get('added_date'))
+
+
+def personal_item_id(user_id, item: dict) -> str:
+    """Provides the archived id of a personal shopping list item.
+
+    Items added before they had an `item_id` get one derived from the item
+    itself, so that archiving them again, after an interrupted compaction,
+    finds the copy already archived.
+    """
+    if item.get('item_id'):
+        return str(item['item_id'])
+
+    key = '|'.join(str(value) for value in (
+        user_id, item.get('item_name'), item.get('added_date'),
+        item.get('bought_date')))
+    return str(uuid5(PERSONAL_ITEM_NAMESPACE, key))
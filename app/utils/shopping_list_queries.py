@@ -0,0 +1,124 @@
+"""Defines the database queries behind the shopping list endpoints.
+
+The queries are raw MongoDB filters so that the synchronous views and the
+asynchronous entry point share them.
+"""
+from app.utils.pagination import decode_cursor, encode_cursor, get_page_size
+from app.utils.serialization import serialize_archived_item, \
+    serialize_shopping_list_item
+from app.utils.valid_data import parse_boolean, parse_datetime
+from bson import ObjectId
+
+# the order of a shopping list's pages, served by the
+# (household, added_date, item_id) index
+PAGE_SORT = [('added_date', 1), ('_id', 1)]
+
+
+def shopping_list_page_query(household_id, args, default_limit: int,
+                             max_limit: int):
+    """Translates the shopping list endpoint's query parameters into a query.
+
+    Arg:
+        household_id: the id of the household whose list is read.
+        args: the request's query parameters, see `get_household_shopping_list`.
+        default_limit, max_limit: the page sizes allowed by the app's config.
+
+    Returns:
+        The (filter, limit) of the page's query. The query should fetch one
+        more item than the limit, see `shopping_list_page`.
+
+    Raises:
+        ValueError: with a message for the client if a parameter is invalid.
+    """
+    limit = get_page_size(args.get('limit'), default_limit, max_limit)
+    if not limit:
+        raise ValueError('`limit` must be a positive number')
+
+    query = {'household': household_id}
+
+    if 'is_bought' in args:
+        is_bought = parse_boolean(args['is_bought'])
+        if is_bought is None:
+            raise ValueError('`is_bought` must be true or false')
+        query['is_bought'] = is_bought
+
+    if 'added_by' in args:
+        if not ObjectId.is_valid(args['added_by']):
+            raise ValueError('`added_by` must be a user id')
+        query['added_by_user'] = ObjectId(args['added_by'])
+
+    for param, operator in (('added_after', '$gte'), ('added_before', '$lt')):
+        if param in args:
+            date = parse_datetime(args[param])
+            if not date:
+                raise ValueError(f'`{param}` must be an ISO 8601 date')
+            query.setdefault('added_date', {})[operator] = date
+
+    if 'cursor' in args:
+        position = decode_cursor(args['cursor'])
+        if not position:
+            raise ValueError('The `cursor` is invalid')
+        added_date, item_id = position
+        query['$or'] = [{'added_date': {'$gt': added_date}},
+                        {'added_date': added_date, '_id': {'$gt': item_id}}]
+
+    return query, limit
+
+
+def shopping_list_page(items: list, limit: int) -> dict:
+    """Provides the response data of a page of the shopping list.
+
+    Arg:
+        items: the raw items fetched by the page's query, up to `limit + 1`
+            of them. The extra item tells whether there is a next page.
+        limit: the page size.
+    """
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]['added_date'], items[-1]['_id'])
+
+    return {'items': [serialize_shopping_list_item(item) for item in items],
+            'next_cursor': next_cursor}
+
+
+def history_page_query(household_id, args, default_limit: int, max_limit: int):
+    """Translates the shopping list history endpoint's query parameters.
+
+    Arg:
+        household_id: the id of the household whose history is read.
+        args: the request's `limit` and `cursor` query parameters.
+        default_limit, max_limit: the page sizes allowed by the app's config.
+
+    Returns:
+        The (filter, limit) of the page's query, which should fetch one more
+        item than the limit, see `history_page`.
+
+    Raises:
+        ValueError: with a message for the client if a parameter is invalid.
+    """
+    limit = get_page_size(args.get('limit'), default_limit, max_limit)
+    if not limit:
+        raise ValueError('`limit` must be a positive number')
+
+    query = {'household': household_id}
+    if 'cursor' in args:
+        position = decode_cursor(args['cursor'])
+        if not position:
+            raise ValueError('The `cursor` is invalid')
+        bought_date, item_id = position
+        query['$or'] = [{'bought_date': {'$lt': bought_date}},
+                        {'bought_date': bought_date, '_id': {'$lt': item_id}}]
+
+    return query, limit
+
+
+def history_page(items: list, limit: int) -> dict:
+    """Provides the response data of a page of the shopping list history."""
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]['bought_date'], items[-1]['_id'])
+
+    return {'items': [serialize_archived_item(item) for item in items],
+            'next_cursor': next_cursor}
@@ -0,0 +1,121 @@
+"""Defines the upkeep of the households' shopping list summaries."""
+from collections import Counter
+from datetime import datetime, UTC
+from models.household import Household
+from models.shopping_list_item import ShoppingListItem
+
+SUMMARY = 'shopping_list_summary'
+
+
+class SummaryChange(object):
+    """Accumulates the changes of a household's shopping list summary.
+
+    The changes are applied as a raw update, see `update()`, passed on to
+    `bump_household_version` so that they are written by the same atomic
+    update as the household's version.
+    """
+
+    def __init__(self):
+        self.open_count = 0
+        self.bought_count = 0
+        self.contributions = Counter()
+        self.last_added_at = None
+
+    def added(self, item: dict):
+        self.open_count += 1
+        if item.get('added_by_user'):
+            self.contributions[str(item['added_by_user'])] += 1
+        added_date = item.get('added_date')
+        if added_date and (not self.last_added_at or added_date > self.last_added_at):
+            self.last_added_at = added_date
+
+    def bought(self):
+        self.open_count -= 1
+        self.bought_count += 1
+
+    def unbought(self):
+        self.open_count += 1
+        self.bought_count -= 1
+
+    def removed(self, item: dict):
+        """Records the removal of an item, as it was when it was removed."""
+        if item.get('is_bought', False):
+            self.bought_count -= 1
+        else:
+            self.open_count -= 1
+        if item.get('added_by_user'):
+            self.contributions[str(item['added_by_user'])] -= 1
+
+    def update(self) -> dict:
+        """Provides the raw update applying the changes to a household."""
+        increments = {f'{SUMMARY}.open_count': self.open_count,
+                      f'{SUMMARY}.bought_count': self.bought_count}
+        increments.update((f'{SUMMARY}.contributions.{user_id}', count)
+                          for user_id, count in self.contributions.items() if count)
+        update = {'$inc': {field: amount for field, amount in increments.items()
+                           if amount},
+                  '$set': {f'{SUMMARY}.updated_at': datetime.now(UTC)}}
+        if self.last_added_at:
+            update['$max'] = {f'{SUMMARY}.last_added_at': self.last_added_at}
+        return {operator: fields for operator, fields in update.items() if fields}
+
+
+def summary_change(**changes) -> dict:
+    """Provides the raw update of a single change of a shopping list.
+
+    Eg. `summary_change(added=item)` or `summary_change(bought=True)`.
+    """
+    change = SummaryChange()
+    if 'added' in changes:
+        change.added(changes['added'])
+    if changes.get('bought'):
+        change.bought()
+    if changes.get('unbought'):
+        change.unbought()
+    if 'removed' in changes:
+        change.removed(changes['removed'])
+    return change.update()
+
+
+def compute_summary(household_id) -> dict:
+    """Computes the shopping list summary of a household from its items."""
+    groups = ShoppingListItem._get_collection().aggregate([
+        {'$match': {'household': household_id}},
+        {'$group': {
+            '_id': {'user': '$added_by_user',
+                    'is_bought': {'$ifNull': ['$is_bought', False]}},
+            'count': {'$sum': 1},
+            'last_added_at': {'$max': '$added_date'},
+            'last_bought_at': {'$max': '$bought_date'},
+        }},
+    ])
+
+    summary = {'open_count': 0, 'bought_count': 0, 'last_added_at': None,
+               'updated_at': None, 'contributions': {}}
+    for group in groups:
+        user_id, is_bought = group['_id'].get('user'), group['_id']['is_bought']
+        summary['bought_count' if is_bought else 'open_count'] += group['count']
+        if user_id:
+            contributions = summary['contributions']
+            contributions[str(user_id)] = contributions.get(str(user_id), 0) \
+                + group['count']
+        for field, date in (('last_added_at', group['last_added_at']),
+                            ('updated_at', group['last_added_at']),
+                            ('updated_at', group['last_bought_at'])):
+            if date and (not summary[field] or date > summary[field]):
+                summary[field] = date
+    return summary
+
+
+def rebuild_summary(household_id) -> dict:
+    """Replaces the shopping list summary of a household with a fresh one.
+
+    A change to the list made while the summary is computed can be lost,
+    a later rebuild then corrects it.
+    """
+    summary = compute_summary(household_id)
+    Household._get_collection().update_one(
+        {'_id': household_id},
+        {'$set': {SUMMARY: summary, 'updated_at': datetime.now(UTC)},
+         '$inc': {'version': 1}})
+    return summary
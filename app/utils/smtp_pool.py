@@ -0,0 +1,150 @@
+"""Defines a pool of persistent SMTP connections for Flask-Mail."""
+from contextlib import contextmanager
+from flask_mail import Connection, Message
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+import smtplib
+
+# errors after which a connection is dropped instead of returned to the pool
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                     smtplib.SMTPHeloError, OSError)
+
+
+class SMTPConnectionPool(object):
+    """Flask extension keeping authenticated SMTP sessions open between sends.
+
+    Flask-Mail's `mail.send()` connects, negotiates TLS and logs in for every
+    email. The pool keeps up to `MAIL_POOL_SIZE` of those connections open
+    instead, and lends them out one sender at a time. A connection idle for
+    longer than `MAIL_POOL_MAX_IDLE` seconds is closed rather than reused,
+    and a connection the server dropped is replaced once before giving up.
+
+    With `MAIL_SUPPRESS_SEND` no connection is opened at all, as with
+    Flask-Mail itself.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._idle = []  # (connection, time it was returned) pairs
+        self._lock = Lock()
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.close_all()
+        self.app = app
+        self.size = int(app.config.get('MAIL_POOL_SIZE', 2))
+        self.max_idle = float(app.config.get('MAIL_POOL_MAX_IDLE', 60))
+        self._slots = BoundedSemaphore(self.size)
+        app.extensions['smtp_pool'] = self
+
+    @contextmanager
+    def connection(self):
+        """Lends out a connection to the mail server.
+
+        Blocks while all of the pool's connections are in use. The connection
+        is returned to the pool afterwards, unless it failed.
+        """
+        with self._slots:
+            connection = self._take_idle() or self._open()
+            try:
+                yield connection
+            except CONNECTION_ERRORS:
+                self._close(connection)
+                raise
+            except Exception:
+                # the session may be mid-transaction, start afresh
+                self._reset(connection)
+                raise
+            else:
+                with self._lock:
+                    self._idle.append((connection, monotonic()))
+
+    def send(self, message: Message):
+        """Sends an email over a pooled connection.
+
+        Must be called within an app context, like `mail.send()`.
+        """
+        with self.connection() as connection:
+            self._send(connection, message)
+
+    def send_many(self, messages: list) -> list:
+        """Sends a burst of emails over a single pooled connection.
+
+        Returns:
+            The (message, error) pairs of the emails that could not be sent.
+        """
+        failures = []
+        with self.connection() as connection:
+            for message in messages:
+                try:
+                    self._send(connection, message)
+                except Exception as exc:
+                    failures.append((message, exc))
+        return failures
+
+    def close_all(self):
+        """Closes every idle connection of the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _send(self, connection: Connection, message: Message):
+        try:
+            connection.send(message)
+        except smtplib.SMTPServerDisconnected:
+            # the server closed the connection while it sat in the pool
+            connection.host = connection.configure_host()
+            connection.send(message)
+
+    def _open(self) -> Connection:
+        connection = Connection(self.app.extensions['mail'])
+        return connection.__enter__()
+
+    def _take_idle(self):
+        """Provides the most recently used idle connection still alive."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+
+            if connection.host is None:  # sending is suppressed
+                return connection
+
+            if monotonic() - returned_at > self.max_idle:
+                self._close(connection)
+                continue
+
+            try:
+                if connection.host.noop()[0] == 250:
+                    return connection
+            except CONNECTION_ERRORS:
+                pass
+            self._close(connection)
+
+    def _reset(self, connection: Connection):
+        if connection.host is None:
+            return
+
+        try:
+            connection.host.rset()
+        except CONNECTION_ERRORS:
+            self._close(connection)
+            return
+
+        with self._lock:
+            self._idle.append((connection, monotonic()))
+
+    @staticmethod
+    def _close(connection: Connection):
+        if connection.host is None:
+            return
+
+        try:
+            connection.host.quit()
+        except CONNECTION_ERRORS + (smtplib.SMTPException,):
+            connection.host.close()
@@ -1,4 +1,5 @@
 """Defines functions that handle the validation of data."""
+from datetime import datetime
 
 
 def is_valid_password(password):
@@ -16,3 +17,33 @@ def is_valid_password(password):
         return None
 
     return 1
+
+
+def parse_boolean(value):
+    """Converts a query string value to a boolean.
+
+    Returns:
+        None, if invalid
+        True or False, otherwise
+    """
+    if not isinstance(value, str):
+        return None
+
+    return {'true': True, '1': True,
+            'false': False, '0': False}.get(value.lower())
+
+
+def parse_datetime(value):
+    """Converts an ISO 8601 query string value to a datetime.
+
+    Returns:
+        None, if invalid
+        the datetime, otherwise
+    """
+    if not value or not isinstance(value, str):
+        return None
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
@@ -1,8 +1,9 @@
 # Views for authentication
 from flask import Blueprint, jsonify, redirect, request, url_for
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
-from models.user import User
+from app.extensions import password_hasher, session_store
+from models.user import DEFERRED_FIELDS, User
+from models.collations import CASE_INSENSITIVE
 from urllib.parse import urlsplit
 
 
@@ -38,9 +39,20 @@ def login():
     if not password:
         return jsonify({'error': 'Password is required'}), 400
 
-    user: User = User.objects(username=username).first()
+    user: User = User.objects(username=username).collation(CASE_INSENSITIVE) \
+        .exclude(*DEFERRED_FIELDS).first()
+
+    # a TimeoutError of a busy password hasher is answered with a 503
+    if user and password_hasher.verify(user.password_hash, password):
+        # replace a hash made with outdated work factors, now that the
+        # plain password is known
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+                user.save()
+            except TimeoutError:
+                pass  # the next login replaces it
 
-    if user and check_password_hash(user.password_hash, password):
         login_user(user, remember=bool(remember_me))
 
         # moves to the original page if user was redirected to login
@@ -62,4 +74,5 @@ def login():
 def logout():
     """Sign-out a user."""
     logout_user()
+    session_store.logout()
     return jsonify({'message': 'Logged out successfully'}), 200
@@ -1,10 +1,27 @@
 """Views for a household's shopping list."""
 from bson import ObjectId
-from flask import Blueprint, jsonify, request
+from datetime import datetime, UTC
+from flask import Blueprint, Response, current_app, g, jsonify, request, \
+    stream_with_context
 from flask_login import current_user, login_required
-from models.household import Household, ShoppingListItem
+from models.household import Household
+from models.shopping_list_history import ArchivedShoppingListItem
+from models.shopping_list_item import ShoppingListItem
 from models.user import User
+from time import monotonic
+from app.extensions import change_feed
+from app.utils.change_feed import SubscriberLimitReached
+from app.utils.conditional_requests import bump_household_version, \
+    conditional_household_response
+from app.utils.memberships import is_member
 from app.utils.middleware import household_member_required
+from app.utils.serialization import ARCHIVED_ITEM_FIELDS, \
+    SHOPPING_LIST_ITEM_FIELDS, serialize_shopping_list_item, \
+    serialize_shopping_list_summary
+from app.utils.shopping_list_batch import ShoppingListBatch
+from app.utils.shopping_list_queries import history_page, \
+    history_page_query, shopping_list_page, shopping_list_page_query
+from app.utils.shopping_list_summary import rebuild_summary, summary_change
 
 household_shopping_list_bl = Blueprint(
     'household shopping list', __name__, url_prefix='/api')
@@ -25,9 +42,10 @@ def add_shopping_list_item():
     but a user might want to add three items of the same name to buy separately.
     Eg. For buy a box of tennis balls once a week for four weeks as buying it
     in one go will not work for a household's budget.
-    """
-    household: Household = current_user.household_id
 
+    The item is a single insert into the `shopping_list_item` collection,
+    so concurrent additions by household members cannot overwrite each other.
+    """
     try:
         # TODO: catch exception when given type of not application/json
         data: dict = request.get_json()
@@ -42,48 +60,324 @@ def add_shopping_list_item():
             return jsonify({"error": "The `item_name` is required"}), 400
 
         item = ShoppingListItem(
+            household=g.household['_id'],
             item_name=item_name,
-            added_by_user=current_user
+            added_by_user=current_user.id
         )
-
-        household.shopping_list.append(item)
-        household.save()
+        item.save(force_insert=True)
+        bump_household_version(g.household['_id'],
+                               summary_change(added=item.to_mongo()))
+        change_feed.publish(g.household['_id'], {
+            'type': 'item_added',
+            'item': serialize_shopping_list_item(item.to_mongo())
+        })
 
         return jsonify({"message": "Item added to shopping list successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@household_shopping_list_bl.post('/households/shopping_list/items/batch',
+                                 strict_slashes=False)
+@login_required
+@household_member_required
+def batch_shopping_list_items():
+    """Applies many changes to the user's household shopping list at once.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    Expects an `operations` list, each operation being one of:
+        {"op": "add", "item_name": ...}
+        {"op": "mark_bought", "item_id": ...}
+        {"op": "unmark_bought", "item_id": ...}
+        {"op": "remove", "item_id": ...}
+
+    The valid operations are applied in order with a single bulk write, and
+    the household's version is bumped once. Responds with the result of
+    each operation, so one invalid operation does not reject the others,
+    nor does a write failing part way through the batch.
+    """
+    try:
+        # TODO: catch exception when given type of not application/json
+        data: dict = request.get_json()
+
+        if not data:
+            return jsonify({"error": "No operations provided"}), 400
+
+        operations = data.get('operations')
+        if not operations or not isinstance(operations, list):
+            return jsonify({"error": "The `operations` list is required"}), 400
+
+        max_operations = current_app.config.get('SHOPPING_LIST_BATCH_MAX_OPERATIONS')
+        if len(operations) > max_operations:
+            return jsonify({"error": f"A batch is limited to {max_operations}"
+                            + " operations"}), 400
+
+        batch = ShoppingListBatch(g.household['_id'], current_user.id, operations)
+        applied = batch.apply()
+
+        if batch.recount:
+            rebuild_summary(g.household['_id'])
+        elif applied:
+            bump_household_version(g.household['_id'], batch.summary_update())
+        if applied:
+            for event in batch.events:
+                change_feed.publish(g.household['_id'], event)
+
+        return jsonify({
+            'applied': applied,
+            'failed': len(operations) - applied,
+            'results': batch.results
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @household_shopping_list_bl.get('/households/shopping_list/items', strict_slashes=False)
 @login_required
 @household_member_required
+@conditional_household_response('shopping_list')
 def get_household_shopping_list():
-    """GET the shopping list of a user's household.
-    
+    """GET the shopping list of a user's household, one page at a time.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    Query parameters (all optional):
+        limit: the amount of items per page, capped by the app's config.
+        cursor: the `next_cursor` returned with the previous page.
+        is_bought: only return items that are (`true`) or are not (`false`)
+            bought.
+        added_by: only return items added by the user with this id.
+        added_after, added_before: ISO 8601 dates limiting when the returned
+            items were added.
+
+    Items are ordered by the date they were added, then by their id. All the
+    filters are part of the database query, so only a single page of items
+    is ever read.
+
+    Items are read as raw documents so that the `added_by_user` and
+    `bought_by_user` references stay plain ObjectIds. No `User` is loaded,
+    whatever the length of the list.
+
+    Responds with `304 Not Modified` when the client's ETag is still current.
+    """
+    try:
+        query, limit = shopping_list_page_query(
+            g.household['_id'], request.args,
+            current_app.config.get('SHOPPING_LIST_PAGE_SIZE'),
+            current_app.config.get('SHOPPING_LIST_MAX_PAGE_SIZE'))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    # one extra item tells whether there is a next page
+    items = list(ShoppingListItem.objects(__raw__=query)
+                 .only(*SHOPPING_LIST_ITEM_FIELDS)
+                 .order_by('added_date', 'item_id').limit(limit + 1).as_pymongo())
+
+    return jsonify(shopping_list_page(items, limit))
+
+
+@household_shopping_list_bl.get('/households/shopping_list/history', strict_slashes=False)
+@login_required
+@household_member_required
+@conditional_household_response('shopping_list_history')
+def get_shopping_list_history():
+    """GET the archived items of the user's household shopping list.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    Query parameters (all optional):
+        limit: the amount of items per page, capped by the app's config.
+        cursor: the `next_cursor` returned with the previous page.
+
+    Bought items are archived some time after being bought, see
+    `ShoppingListCompactor`. The history is ordered by the date the items
+    were bought, the most recent first.
+
+    Responds with `304 Not Modified` when the client's ETag is still current.
+    """
+    try:
+        query, limit = history_page_query(
+            g.household['_id'], request.args,
+            current_app.config.get('SHOPPING_LIST_HISTORY_PAGE_SIZE'),
+            current_app.config.get('SHOPPING_LIST_HISTORY_MAX_PAGE_SIZE'))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    items = list(ArchivedShoppingListItem.objects(__raw__=query)
+                 .only(*ARCHIVED_ITEM_FIELDS)
+                 .order_by('-bought_date', '-item_id').limit(limit + 1).as_pymongo())
+
+    return jsonify(history_page(items, limit))
+
+
+@household_shopping_list_bl.get('/households/shopping_list/summary', strict_slashes=False)
+@login_required
+@household_member_required
+@conditional_household_response('shopping_list_summary')
+def get_shopping_list_summary():
+    """GET the summary of the user's household shopping list.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    The counters are kept up to date by every change to the list, so only
+    the household is read, whatever the length of the list.
+
+    Responds with `304 Not Modified` when the client's ETag is still current.
+    """
+    household = Household.objects(id=g.household['_id']) \
+        .only('shopping_list_summary').as_pymongo().first()
+
+    return jsonify(serialize_shopping_list_summary(
+        household.get('shopping_list_summary') or {}))
+
+
+@household_shopping_list_bl.patch('/households/shopping_list/items/<item_id>/bought',
+                                  strict_slashes=False)
+@login_required
+@household_member_required
+def mark_shopping_list_item_bought(item_id: str):
+    """Marks an item of the user's household shopping list as bought.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    The item is updated with a single conditional `$set` (returning the
+    updated item for the change feed), which only
+    matches an item that is still unbought. When two members mark the same
+    item at the same time, only the first is recorded as its buyer.
+    """
+    try:
+        item = ShoppingListItem.objects(
+            item_id=item_id, household=g.household['_id'], is_bought=False
+        ).modify(new=True,
+                 set__is_bought=True,
+                 set__bought_date=datetime.now(UTC),
+                 set__bought_by_user=current_user.id)
+
+        if not item:
+            if ShoppingListItem.objects(item_id=item_id,
+                                        household=g.household['_id']).count():
+                return jsonify({'error': 'The item is already bought'}), 400
+            return jsonify({'error': 'The item is not on the shopping list'}), 404
+
+        bump_household_version(g.household['_id'], summary_change(bought=True))
+        change_feed.publish(g.household['_id'], {
+            'type': 'item_bought',
+            'item': serialize_shopping_list_item(item.to_mongo())
+        })
+        return jsonify({'message': 'Item marked as bought'}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@household_shopping_list_bl.delete('/households/shopping_list/items/<item_id>',
+                                   strict_slashes=False)
+@login_required
+@household_member_required
+def remove_shopping_list_item(item_id: str):
+    """Removes an item from the user's household shopping list.
+
     Middleware:
         - Ensures that the request was made by a logged-in user.
         - Ensures that the request was made by a user that belongs to
         a household.
+
+    The item is deleted with a single `findAndModify`, returning it as it
+    was when deleted for the shopping list summary.
     """
-    household: Household = current_user.household_id
-
-    shopping_list = []
-    for item in household.shopping_list:
-        item_info = {
-            "item_id": item.item_id,
-            "item_name": item.item_name,
-            "added_date": item.added_date,
-            "added_by_user": str(item.added_by_user.id),
-            "is_bought": item.is_bought
-        }
-
-        # provide extra info if the item is marked as bought        
-        if item.is_bought:
-            item_info.update({
-                "bought_by_user": str(item.bought_by_user.id),
-                "bought_date": item.bought_date
-            })
-
-        shopping_list.append(item_info)
-
-    return jsonify(shopping_list)
+    try:
+        removed = ShoppingListItem.objects(
+            item_id=item_id, household=g.household['_id']).modify(remove=True)
+
+        if not removed:
+            return jsonify({'error': 'The item is not on the shopping list'}), 404
+
+        bump_household_version(g.household['_id'],
+                               summary_change(removed=removed.to_mongo()))
+        change_feed.publish(g.household['_id'], {
+            'type': 'item_removed',
+            'item': {'item_id': item_id}
+        })
+        return jsonify({'message': 'Item removed from shopping list'}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@household_shopping_list_bl.get('/households/shopping_list/events', strict_slashes=False)
+@login_required
+@household_member_required
+def stream_shopping_list_events():
+    """Streams the changes of the user's household shopping list.
+
+    Middleware:
+        - Ensures that the request was made by a logged-in user.
+        - Ensures that the request was made by a user that belongs to
+        a household.
+
+    The response is a Server-Sent Events stream of `item_added`,
+    `item_bought`, `item_unbought` and `item_removed` events, whose data is
+    the JSON encoded item. A comment is sent as a keep-alive whenever no
+    change happened for a while.
+
+    The stream ends if the client falls too far behind. The client should
+    then reconnect and re-read the shopping list. It also ends once the
+    user leaves the household: at once if they are removed by a request
+    of the same process, or else within a heartbeat of their removal.
+
+    Each stream holds a worker thread for as long as it lasts, so the app
+    must run with gevent or threaded workers (eg. gunicorn's `gevent` or
+    `gthread` worker class) sized for the listeners. The listeners of a
+    process are capped by `CHANGE_FEED_MAX_SUBSCRIBERS`: past it, a 503 is
+    returned.
+    """
+    household_id = g.household['_id']
+    user_id = current_user.id
+    try:
+        subscription = change_feed.subscribe(household_id, user_id)
+    except SubscriberLimitReached:
+        return jsonify({'error': 'Too many listeners, try again later'}), \
+            503, {'Retry-After': '30'}
+    heartbeat = current_app.config.get('CHANGE_FEED_HEARTBEAT')
+
+    def generate_events():
+        try:
+            yield 'retry: 3000\n\n'
+            checked_at = monotonic()
+            while not subscription.closed:
+                if monotonic() - checked_at >= heartbeat:
+                    # removed by another process, which cannot close the
+                    # subscription
+                    if not is_member(user_id, household_id):
+                        break
+                    checked_at = monotonic()
+
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    if not subscription.closed:
+                        yield ': keep-alive\n\n'
+                    continue
+
+                data = current_app.json.dumps(event['item'])
+                yield f'event: {event["type"]}\ndata: {data}\n\n'
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate_events()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
@@ -1,13 +1,19 @@
 """Views for households."""
+from app.extensions import password_hasher
 from app.utils.valid_data import is_valid_password
 from bson import ObjectId
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, g, jsonify, request
 from flask_login import current_user, login_required
 from models.household import Household
-from models.user import User
+from models.user import ADMIN_ROLE, User
+from mongoengine.errors import NotUniqueError
+from app.utils.conditional_requests import bump_household_version, \
+    conditional_household_response
 from app.utils.middleware import household_member_required, \
     household_admin_required
-from werkzeug.security import generate_password_hash
+from app.utils.memberships import add_member, is_member, promote_member, \
+    remove_member
+from app.utils.serialization import serialize_household_profile
 
 household_bl = Blueprint('households', __name__, url_prefix='/api')
 
@@ -31,24 +37,26 @@ def create_household():
         if not name:
             return jsonify({"error": "Name is required"}), 400
 
-        # Ensure house name is unique
-        user_by_username = Household.objects(name=name).first()
-        if user_by_username:
-            return jsonify({'error': 'The name is already taken'}), 400
-
         if not is_valid_password(password):
             return jsonify({'error': 'Password must be at least 8 characters long'
                             + ' and meet complexity requirements'}), 400
 
-        password_hash = generate_password_hash(password)
+        password_hash = password_hasher.hash(password)
 
         household = Household(name=name, password_hash=password_hash,
                               members=[current_user], admins=[current_user])
-        household.save()
-        current_user.household_id = household.id
-        current_user.save()
+
+        # the unique index on name rejects a taken household name
+        try:
+            household.save()
+        except NotUniqueError:
+            return jsonify({'error': 'The name is already taken'}), 400
+
+        add_member(current_user.id, household.id, ADMIN_ROLE)
 
         return jsonify({"message": "Household created successfully"}), 201
+    except TimeoutError:
+        raise  # the password hasher is busy, answered with a 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -56,19 +64,26 @@ def create_household():
 @household_bl.get('/households/profile', strict_slashes=False)
 @login_required
 @household_member_required
+@conditional_household_response('profile')
 def household_profile():
-    """GET the household's profile details."""
-    current_household: Household = current_user.household_id
+    """GET the household's profile details.
 
-    admin_usernames = [user.username for user in current_household.admins]
-    member_usernames = [user.username for user in current_household.members]
+    The admins' and members' usernames are read with a single `$in` query,
+    whatever the size of the household.
 
-    return jsonify({
-        'household name': current_household.name,
-        'admins': admin_usernames,
-        'members': member_usernames,
-        'created_at': current_household.created_at
-    })
+    Responds with `304 Not Modified` when the client's ETag is still current.
+    """
+    current_household: dict = g.household
+    roles: dict = Household.objects(id=current_household['_id']) \
+        .only('admins', 'members').as_pymongo().first()
+
+    # a single query for every username, admins being members too
+    user_ids = set(roles.get('admins', [])) | set(roles.get('members', []))
+    usernames = {user['_id']: user['username'] for user in
+                 User.objects(id__in=list(user_ids)).only('username').as_pymongo()}
+
+    return jsonify(serialize_household_profile(current_household, roles,
+                                               usernames))
 
 
 @household_bl.patch('/households/profile/name', strict_slashes=False)
@@ -96,15 +111,13 @@ def change_household_name():
         if not name:
             return jsonify({"error": "Name is required"}), 400
 
-        # Check if household name already exists
-        household_by_name = Household.objects(name=name).first()
-
-        if household_by_name:
+        # the unique index on name rejects a taken household name
+        try:
+            Household.objects(id=g.household['_id']).update_one(set__name=name)
+        except NotUniqueError:
             return jsonify({'error': 'The household name is already taken'}), 400
 
-        household = current_user.household_id
-        household.name = name
-        household.save()
+        bump_household_version(g.household['_id'])
 
         return jsonify({"message": "Household name is updated"}), 201
     except Exception as e:
@@ -136,8 +149,9 @@ def join_household():
         if not password:
             return jsonify({"error": "Password is required"}), 400
 
-        # Check if household exists
-        household: Household = Household.objects(id=ObjectId(household_id)).first()
+        # Check if household exists, without loading its members
+        household: Household = Household.objects(id=ObjectId(household_id)) \
+            .only('name', 'password_hash').first()
 
         if not household:
             return jsonify({'error': 'The household you entered does not exist'}), 400
@@ -145,15 +159,15 @@ def join_household():
         if not household.check_password(password):
             return jsonify({'message': 'Incorrect password.'}), 401
 
-        if current_user in household.members:
+        if current_user.household_id and current_user.household_id.id == household.id:
             return jsonify({'error': 'User is already part of this household'}), 400
 
-        household.members.append(current_user)
-        current_user.household_id = household
-        household.save()
-        current_user.save()
+        add_member(current_user.id, household.id)
+        bump_household_version(household.id)
 
         return jsonify({'message': f'Household "{household.name}" joined successfully'}), 200
+    except TimeoutError:
+        raise  # the password hasher is busy, answered with a 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -179,20 +193,17 @@ def remove_household_member(user_id: str):
     The household's and the user's affiliation with each other will be removed.
     """
     try:
-        user: User = User.objects(id=ObjectId(user_id)).first()
-        household: Household = current_user.household_id
+        user_id = ObjectId(user_id)
+        household_id = g.household['_id']
 
-        if user not in household.members:
-            return jsonify({'error': 'This user is not a member of the household'}), 400
+        if not remove_member(user_id, household_id):
+            # only the failing path reads the user, to tell the errors apart
+            if not is_member(user_id, household_id):
+                return jsonify({'error': 'This user is not a member of the household'}), 400
 
-        if user in household.admins:
             return jsonify({'error': 'Unable to remove a household admin'}), 401
-    
-        household.members.remove(user)
-        user.household_id = None
 
-        household.save()
-        user.save()
+        bump_household_version(household_id)
 
         return jsonify({'message': 'User removed successfully'}), 204
     except Exception as e:
@@ -220,17 +231,16 @@ def add_household_admin(user_id: str):
     Thus, the user will be added to the household's admin members.
     """
     try:
-        user: User = User.objects(id=ObjectId(user_id)).first()
-        household: Household = current_user.household_id
+        user_id = ObjectId(user_id)
+        household_id = g.household['_id']
 
-        if user not in household.members:
-            return jsonify({'error': 'This user is not a member of the household'}), 400
+        if not promote_member(user_id, household_id):
+            if not is_member(user_id, household_id):
+                return jsonify({'error': 'This user is not a member of the household'}), 400
 
-        if user in household.admins:
             return jsonify({'error': 'This user is already an admin'}), 401
 
-        household.admins.append(user)
-        household.save()
+        bump_household_version(household_id)
 
         return jsonify({'message': 'User promoted to admin successfully'}), 200
     except Exception as e:
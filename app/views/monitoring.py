@@ -0,0 +1,67 @@
+"""Views exposing the app's runtime metrics.
+
+Only registered with `METRICS_ENABLED`, see config.py.
+"""
+from app.extensions import identity_cache
+from flask import Blueprint, current_app, jsonify, request, Response
+from hmac import compare_digest
+
+monitoring_bl = Blueprint('monitoring', __name__, url_prefix='/api')
+
+
+@monitoring_bl.before_request
+def scraper_required():
+    """Middleware letting only the metrics' scraper read them.
+
+    The scraper either sends the `METRICS_TOKEN` as a bearer token, or
+    connects from one of the `METRICS_ALLOWED_IPS`.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if token and compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return None
+
+    if request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', ()):
+        return None
+
+    return jsonify({'error': 'Only the metrics scraper can read the metrics'}), 403
+
+
+@monitoring_bl.get('/metrics', strict_slashes=False)
+def prometheus_metrics():
+    """GET the process' metrics in the Prometheus text format.
+
+    Covers the latency and MongoDB commands of the requests by endpoint, the
+    connection pool's usage and the identity cache's hits and misses.
+    """
+    pool_lines = ['# HELP mongodb_pool_connections Open and checked out'
+                  + ' MongoDB connections.',
+                  '# TYPE mongodb_pool_connections gauge']
+    servers = current_app.extensions['mongo'].pool_stats.stats()
+    for server, counts in sorted(servers.items()):
+        for state in ('open', 'in_use'):
+            pool_lines.append(f'mongodb_pool_connections{{server="{server}",'
+                              + f'state="{state}"}} {counts[state]}')
+
+    cache = identity_cache.stats()
+    cache_lines = []
+    for counter, description in (('hits', 'Users loaded from the identity cache.'),
+                                 ('misses', 'Users the identity cache did not'
+                                            + ' hold, loaded from MongoDB.')):
+        cache_lines += [f'# HELP identity_cache_{counter}_total {description}',
+                        f'# TYPE identity_cache_{counter}_total counter',
+                        f'identity_cache_{counter}_total {cache[counter]}']
+
+    text = current_app.extensions['metrics'].render(pool_lines + cache_lines)
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
+@monitoring_bl.get('/metrics/mongo-pool', strict_slashes=False)
+def mongo_pool_stats():
+    """GET the MongoDB connection pool's settings and usage of this process.
+
+    Each server's counters tell how many connections were created, checked
+    out and failed to be checked out, eg. because the pool was exhausted for
+    longer than `MONGODB_WAIT_QUEUE_TIMEOUT_MS`.
+    """
+    return jsonify(current_app.extensions['mongo'].stats()), 200
@@ -0,0 +1,154 @@
+"""Views for a user's personal shopping list."""
+from datetime import datetime, UTC
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from models.user import ShoppingListItem, User
+from mongoengine.errors import ValidationError
+from app.utils.serialization import serialize_personal_shopping_list_item
+from app.utils.valid_data import parse_boolean
+
+personal_shopping_list_bl = Blueprint(
+    'personal shopping list', __name__, url_prefix='/api')
+
+# the `User` field holding the list
+ITEMS = 'personal_shopping_list'
+
+
+@personal_shopping_list_bl.get('/users/me/shopping_list/items', strict_slashes=False)
+@login_required
+def get_personal_shopping_list():
+    """GET the logged-in user's personal shopping list.
+
+    Query parameters (optional):
+        is_bought: only return items that are (`true`) or are not (`false`)
+            bought.
+
+    The list is left out when loading the logged-in user, so only this
+    endpoint reads it, on its own.
+    """
+    is_bought = None
+    if 'is_bought' in request.args:
+        is_bought = parse_boolean(request.args['is_bought'])
+        if is_bought is None:
+            return jsonify({'error': '`is_bought` must be true or false'}), 400
+
+    user = User.objects(id=current_user.id).only(ITEMS).as_pymongo().first()
+    items = [item for item in (user or {}).get(ITEMS, [])
+             if is_bought is None or item.get('is_bought', False) == is_bought]
+
+    return jsonify({'items': [serialize_personal_shopping_list_item(item)
+                              for item in items]})
+
+
+@personal_shopping_list_bl.post('/users/me/shopping_list/items', strict_slashes=False)
+@login_required
+def add_personal_shopping_list_item():
+    """Adds an item to the logged-in user's personal shopping list.
+
+    The item is appended with a single `$push`, conditional on the list
+    being shorter than `PERSONAL_SHOPPING_LIST_MAX_ITEMS`.
+    """
+    try:
+        # TODO: catch exception when given type of not application/json
+        data: dict = request.get_json()
+
+        if not data:
+            return jsonify({"error": "No item data provided"}), 400
+
+        if not data.get('item_name'):
+            return jsonify({"error": "The `item_name` is required"}), 400
+
+        item = ShoppingListItem(item_name=data['item_name'])
+        try:
+            item.validate()
+        except ValidationError as error:
+            return jsonify({'error': '; '.join(
+                f'{field}: {message}' for field, message
+                in error.to_dict().items())}), 400
+
+        max_items = current_app.config.get('PERSONAL_SHOPPING_LIST_MAX_ITEMS')
+        pushed = User.objects(__raw__={
+            '_id': current_user.id, f'{ITEMS}.{max_items - 1}': {'$exists': False}
+        }).update_one(push__personal_shopping_list=item)
+
+        if not pushed:
+            return jsonify({'error': 'A personal shopping list is limited to'
+                            + f' {max_items} items'}), 400
+
+        return jsonify({
+            'message': 'Item added to shopping list successfully',
+            'item': serialize_personal_shopping_list_item(item.to_mongo())
+        }), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@personal_shopping_list_bl.patch('/users/me/shopping_list/items/<item_id>',
+                                 strict_slashes=False)
+@login_required
+def update_personal_shopping_list_item(item_id: str):
+    """Updates an item of the logged-in user's personal shopping list.
+
+    Expects an `item_name`, an `is_bought` boolean, or both. The item is
+    updated in place with a single positional `$set`, the rest of the list
+    is neither read nor rewritten.
+    """
+    try:
+        # TODO: catch exception when given type of not application/json
+        data: dict = request.get_json()
+
+        if not data:
+            return jsonify({"error": "No item data provided"}), 400
+
+        changes = {}
+        if 'item_name' in data:
+            try:
+                ShoppingListItem.item_name.validate(data['item_name'])
+            except ValidationError as error:
+                return jsonify({'error': f'item_name: {error.message}'}), 400
+            if not data['item_name']:
+                return jsonify({'error': 'The `item_name` is required'}), 400
+            changes['item_name'] = data['item_name']
+
+        if 'is_bought' in data:
+            if not isinstance(data['is_bought'], bool):
+                return jsonify({'error': '`is_bought` must be true or false'}), 400
+            changes['is_bought'] = data['is_bought']
+            changes['bought_date'] = datetime.now(UTC) if data['is_bought'] else None
+
+        if not changes:
+            return jsonify({'error': 'Only the `item_name` and `is_bought` can'
+                            + ' be changed'}), 400
+
+        updated = User.objects(__raw__={
+            '_id': current_user.id, f'{ITEMS}.item_id': item_id
+        }).update_one(__raw__={'$set': {f'{ITEMS}.$.{field}': value
+                                        for field, value in changes.items()}})
+
+        if not updated:
+            return jsonify({'error': 'The item is not on the shopping list'}), 404
+
+        return jsonify({'message': 'Item updated'}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@personal_shopping_list_bl.delete('/users/me/shopping_list/items/<item_id>',
+                                  strict_slashes=False)
+@login_required
+def remove_personal_shopping_list_item(item_id: str):
+    """Removes an item from the logged-in user's personal shopping list.
+
+    The item is removed with a single `$pull`.
+    """
+    try:
+        removed = User.objects(__raw__={
+            '_id': current_user.id, f'{ITEMS}.item_id': item_id
+        }).update_one(__raw__={'$pull': {ITEMS: {'item_id': item_id}}})
+
+        if not removed:
+            return jsonify({'error': 'The item is not on the shopping list'}), 404
+
+        return jsonify({'message': 'Item removed from shopping list'}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,10 +1,16 @@
 # Views for users
 from flask import Blueprint, jsonify, request, url_for
 from flask_login import current_user, login_required, login_user
-from werkzeug.security import generate_password_hash
+from models.collations import CASE_INSENSITIVE
 from models.user import User
+from mongoengine.errors import NotUniqueError
+from mongoengine.queryset.visitor import Q
+from app.utils.db_errors import duplicated_fields
+from app.extensions import password_hasher, session_store
 from app.utils.valid_data import is_valid_password
 from app.utils.email_services import send_confirmation_email
+from app.utils.conditional_requests import bump_household_version
+from app.utils.serialization import USER_FIELDS, serialize_user
 
 
 user_bl = Blueprint('users', __name__, url_prefix='/api')
@@ -30,32 +36,40 @@ def create_user():
         if not email:
             return jsonify({"error": "Email is required"}), 400
 
-
-        # Check if username and email already exist
-        user_by_username = User.objects(username=username).first()
-        user_by_email = User.objects(email=email).first()
-
-        if user_by_username:
+        # taken values are reported first, found by a single query rather
+        # than after the costly password hashing
+        taken = User.objects(Q(email=email) | Q(username=username)) \
+            .collation(CASE_INSENSITIVE).only('email', 'username').first()
+        if taken:
+            if taken.email.casefold() == email.casefold():
+                return jsonify({'error': 'The email is already taken'}), 400
             return jsonify({'error': 'The username is already taken'}), 400
 
-        if user_by_email:
-            return jsonify({'error': 'The email is already taken'}), 400
-
         if not is_valid_password(password):
             return jsonify({'error': 'Password must be at least 8 characters long'
                             + ' and meet complexity requirements'}), 400
 
-        password_hash = generate_password_hash(password)
+        password_hash = password_hasher.hash(password)
 
         # TODO: implement verification of a new user via email
         # TODO: implement utility functions to catch exceptions and handle them by
         # sending an error return value
         user = User(username=username, email=email, password_hash=password_hash)
-        user.save()
+
+        # the unique indexes on username and email reject values taken
+        # since they were checked, by a concurrent sign up
+        try:
+            user.save()
+        except NotUniqueError as error:
+            if 'email' in duplicated_fields(error):
+                return jsonify({'error': 'The email is already taken'}), 400
+            return jsonify({'error': 'The username is already taken'}), 400
 
         send_confirmation_email(user.email)
         login_user(user, remember=True)
         return jsonify({"message": "User registered successfully"}), 201
+    except TimeoutError:
+        raise  # the password hasher is busy, answered with a 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -68,15 +82,7 @@ def get_specific_user():
     Just the user's username, household_id and created_at fields are
     returned.
     """
-    household_id = None
-    if current_user.household_id:
-        household_id = str(current_user.household_id.id)
-
-    return jsonify({
-        'username': current_user.username,
-        'household_id': household_id,
-        'created_at': current_user.created_at,
-    }), 200
+    return jsonify(serialize_user(current_user.to_mongo(fields=USER_FIELDS))), 200
 
 
 @user_bl.patch('/users/me/username', strict_slashes=False)
@@ -105,14 +111,19 @@ def update_user():
         if not username:
             return jsonify({"error": "Username is required"}), 400
 
-        # Check if username and email already exist
-        user_by_username = User.objects(username=username).first()
-
-        if user_by_username:
+        # the unique index on username rejects a taken username
+        current_user.username = username
+        try:
+            current_user.save()
+        except NotUniqueError:
             return jsonify({'error': 'The username is already taken'}), 400
 
-        current_user.username = username
-        current_user.save()
+        # the user's sessions hold their username, see `principal_of`
+        session_store.update_principal(current_user.id, username=username)
+
+        # the household profile lists its members' usernames
+        if current_user.household_id:
+            bump_household_version(current_user.household_id.id)
 
         return jsonify({"message": "User updated"}), 201
     except Exception as e:
@@ -157,11 +168,15 @@ def change_password():
             return jsonify({'error': 'New password and confirm password'
                             + ' do not match.'}), 400
 
-        password_hash = generate_password_hash(new_password)
+        password_hash = password_hasher.hash(new_password)
 
         current_user.password_hash = password_hash
         current_user.save()
+        # log out every other session of the user
+        session_store.revoke_user(current_user.id, keep_current=True)
 
         return jsonify({"message": "User updated"}), 201
+    except TimeoutError:
+        raise  # the password hasher is busy, answered with a 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
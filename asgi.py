@@ -0,0 +1,7 @@
+# Application's asynchronous entry point, eg. `uvicorn asgi:app`
+from app.asgi import create_asgi_app
+from os import environ
+
+
+ENV = environ.get('ENV')
+app = create_asgi_app(ENV)
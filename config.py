@@ -15,6 +15,86 @@ class Config(object):
     TESTING = False
     REMEMBER_COOKIE_DURATION = timedelta(days=30)
 
+    # Server-side sessions: `memory` (a single process), `redis` or `cookie`.
+    # "Remember me" logins get a permanent session instead of a remember
+    # cookie, so that logging out or changing password revokes them.
+    SESSION_BACKEND = environ.get('SESSION_BACKEND', 'memory')
+    SESSION_REDIS_URL = environ.get('SESSION_REDIS_URL')
+    SESSION_MAXSIZE = 10000  # sessions kept by the `memory` backend
+    SESSION_TTL = 86400  # seconds a session that is not permanent lasts unused
+    # seconds between extensions of an unchanged session's expiry
+    SESSION_REFRESH_INTERVAL = 300
+    PERMANENT_SESSION_LIFETIME = REMEMBER_COOKIE_DURATION
+    SESSION_REFRESH_EACH_REQUEST = False  # no session write on every request
+
+    # MongoDB connection, each process (eg. gunicorn worker) has its own
+    # pool of up to MONGODB_MAX_POOL_SIZE connections per server.
+    # Options left as None use the driver's defaults.
+    MONGODB_HOST = environ.get('DEV_DATABASE')
+    MONGODB_MAX_POOL_SIZE = int(environ.get('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(environ.get('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_MAX_IDLE_TIME_MS = None
+    # how long a request waits for a free connection before failing
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(environ.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(
+        environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGODB_CONNECT_TIMEOUT_MS = None
+    MONGODB_READ_PREFERENCE = environ.get('MONGODB_READ_PREFERENCE', 'primary')
+    MONGODB_COMPRESSORS = environ.get('MONGODB_COMPRESSORS')  # eg. 'zstd,zlib'
+    MONGODB_PING_ON_STARTUP = True  # fail at startup if MongoDB is unreachable
+
+    # Request metrics, served at /api/metrics when METRICS_ENABLED is set, to
+    # a scraper sending `Authorization: Bearer <METRICS_TOKEN>` or connecting
+    # from one of METRICS_ALLOWED_IPS (the proxy's address, behind one).
+    # Requests running more MongoDB commands than the threshold are flagged
+    # as likely N+1 queries, the headers tell each response's query count.
+    METRICS_ENABLED = environ.get('METRICS_ENABLED', '').lower() in ('1', 'true')
+    METRICS_TOKEN = environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = tuple(filter(None, environ.get(
+        'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+    METRICS_N_PLUS_ONE_THRESHOLD = int(environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+    METRICS_QUERY_HEADERS = False
+
+    # Password hashing, the method is stored with each hash and a hash made
+    # with another method is replaced on the user's next login
+    PASSWORD_HASH_METHOD = environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+    # Cache of the users loaded by Flask-Login on every request.
+    # Each process has its own: a change to a user only drops them from the
+    # cache of the process making it, the other processes may serve the old
+    # user for up to IDENTITY_CACHE_TTL seconds.
+    IDENTITY_CACHE_MAXSIZE = int(environ.get('IDENTITY_CACHE_MAXSIZE', 1024))
+    IDENTITY_CACHE_TTL = int(environ.get('IDENTITY_CACHE_TTL', 60))  # seconds
+
+    # Pagination of a household's shopping list
+    SHOPPING_LIST_PAGE_SIZE = 50
+    SHOPPING_LIST_MAX_PAGE_SIZE = 200
+    SHOPPING_LIST_BATCH_MAX_OPERATIONS = 100  # per batch request
+    PERSONAL_SHOPPING_LIST_MAX_ITEMS = 500  # embedded in the user's document
+
+    # Archival of bought items into the shopping list history
+    SHOPPING_LIST_RETENTION_DAYS = int(environ.get('SHOPPING_LIST_RETENTION_DAYS', 30))
+    # days archived items are kept, empty to keep them for good
+    SHOPPING_LIST_HISTORY_TTL_DAYS = environ.get('SHOPPING_LIST_HISTORY_TTL_DAYS', 365)
+    # seconds between background compactions, 0 to only compact with
+    # `flask compact-shopping-lists`
+    SHOPPING_LIST_COMPACTION_INTERVAL = 0
+    SHOPPING_LIST_COMPACTION_BATCH_SIZE = 500
+    SHOPPING_LIST_HISTORY_PAGE_SIZE = 50
+    SHOPPING_LIST_HISTORY_MAX_PAGE_SIZE = 200
+
+    # Server-Sent Events feed of shopping list changes.
+    # `memory` only reaches members connected to the same process,
+    # `mongo_change_stream` reaches all of them but requires a replica set.
+    CHANGE_FEED_BACKEND = environ.get('CHANGE_FEED_BACKEND', 'memory')
+    CHANGE_FEED_QUEUE_SIZE = 100  # events a slow listener may fall behind
+    CHANGE_FEED_HEARTBEAT = 15  # seconds between keep-alive comments
+    # listeners per process, each holding a thread: 0 for no limit
+    CHANGE_FEED_MAX_SUBSCRIBERS = int(environ.get('CHANGE_FEED_MAX_SUBSCRIBERS', 100))
+
     # Email configuration for development and testing
     MAIL_SERVER = environ.get('DEV-MAIL_SERVER')
     MAIL_PORT = environ.get('DEV-MAIL_PORT')
@@ -25,6 +105,19 @@ class Config(object):
     MAIL_DEFAULT_SENDER = 'dummy@grocery_squad.com'
     MAIL_DEBUG = 1
 
+    # Persistent SMTP connections shared by the email senders
+    MAIL_POOL_SIZE = 2
+    MAIL_POOL_MAX_IDLE = 60  # seconds before an unused connection is closed
+
+    # Background delivery of emails. An in-memory outbox loses its emails
+    # when the process stops, and is not shared by the processes of a server.
+    # A file may be shared, each email is only claimed by a single worker.
+    EMAIL_QUEUE_DATABASE = environ.get('EMAIL_QUEUE_DATABASE', ':memory:')
+    EMAIL_QUEUE_WORKERS = 2
+    EMAIL_QUEUE_MAX_ATTEMPTS = 5
+    EMAIL_QUEUE_BACKOFF = 2  # seconds, doubled after each failed attempt
+    EMAIL_QUEUE_BATCH_SIZE = 20  # emails a worker sends over one SMTP connection
+
     # Token security for development and testing
     TOKEN_EMAIL_SALT = environ.get('DEV_TOKEN_EMAIL_SALT')
     TOKEN_EMAIL_AGE = environ.get('DEV_TOKEN_EMAIL_AGE')
@@ -41,6 +134,18 @@ class ProductionConfig(Config):
     MAIL_PASSWORD = environ.get('PROD-MAIL_PASSWORD')
     MAIL_DEBUG = 0
 
+    PASSWORD_HASH_WORKERS = int(environ.get('PASSWORD_HASH_WORKERS', 4))
+    EMAIL_QUEUE_DATABASE = environ.get('EMAIL_QUEUE_DATABASE')  # a file, required
+
+    MONGODB_HOST = environ.get('PROD_DATABASE')
+    SESSION_BACKEND = environ.get('SESSION_BACKEND', 'redis')  # shared by workers
+    MONGODB_MAX_POOL_SIZE = int(environ.get('MONGODB_MAX_POOL_SIZE', 20))
+    MONGODB_MIN_POOL_SIZE = int(environ.get('MONGODB_MIN_POOL_SIZE', 2))
+    MONGODB_MAX_IDLE_TIME_MS = 300000  # 5 minutes
+    MONGODB_COMPRESSORS = environ.get('MONGODB_COMPRESSORS', 'zlib')
+    SHOPPING_LIST_COMPACTION_INTERVAL = int(
+        environ.get('SHOPPING_LIST_COMPACTION_INTERVAL', 3600))
+
     TOKEN_EMAIL_SALT = environ.get('PROD_TOKEN_EMAIL_SALT')
     TOKEN_EMAIL_AGE = environ.get('PROD_TOKEN_EMAIL_AGE')
 
@@ -48,6 +153,8 @@ class ProductionConfig(Config):
 class DevelopmentConfig(Config):
     """The flask configuration for a development environment."""
     DEBUG = environ.get('DEBUG')
+    METRICS_ENABLED = True
+    METRICS_QUERY_HEADERS = True
 
 
 class TestingConfig(Config):
@@ -56,6 +163,14 @@ class TestingConfig(Config):
     DEBUG = True
     WTF_CSRF_ENABLED = False  # Disable CSRF for testing
     PRESERVE_CONTEXT_ON_EXCEPTION = False  # Prevents exceptions from propagating
+    EMAIL_QUEUE_WORKERS = 0  # send emails inline so tests can check them
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # cheap hashes for fast tests
+    PASSWORD_HASH_WORKERS = 0
+    MONGODB_HOST = environ.get('TEST_DATABASE')
+    MONGODB_MAX_POOL_SIZE = 10
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = 2000  # fail fast without a database
+    METRICS_ENABLED = True
+    METRICS_QUERY_HEADERS = True  # lets tests assert on a view's query count
     # a separate database for tests
     # the test database's connection name is stored in the .env file
     MONGODB_SETTINGS = {
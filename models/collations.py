@@ -0,0 +1,5 @@
+# Describes the collations shared by the models' indexes and queries
+# A query only uses an index with a collation when it specifies the same one.
+
+# Compares strings ignoring case, eg. 'AbacusWarrior' matches 'abacuswarrior'
+CASE_INSENSITIVE = {'locale': 'en', 'strength': 2}
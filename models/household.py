@@ -1,20 +1,27 @@
 # Describes the schema of a `household` document
 from datetime import datetime, UTC
 from mongoengine import Document, ReferenceField, StringField, ListField, \
-                        EmbeddedDocument, EmbeddedDocumentListField, \
-                        BooleanField, DateTimeField, UUIDField
-from uuid import uuid4
+                        DateTimeField, IntField, EmbeddedDocument, \
+                        EmbeddedDocumentField, MapField
+from models.collations import CASE_INSENSITIVE
+from flask import current_app, has_app_context
 from werkzeug.security import check_password_hash
 
 
-class ShoppingListItem(EmbeddedDocument):
-    item_id = UUIDField(binary=False, primary_key=True, default=lambda: str(uuid4()))
-    item_name = StringField(max_length=200, required=True)
-    added_date = DateTimeField(default=datetime.now(UTC))
-    bought_date = DateTimeField(default=None)  # should not be less than added_date
-    is_bought = BooleanField(default=False)
-    added_by_user = ReferenceField('User', required=False)
-    bought_by_user = ReferenceField('User', required=False)
+class ShoppingListSummary(EmbeddedDocument):
+    """Counters describing a household's shopping list.
+
+    Maintained by every change to the list, so that reading them never
+    reads the items. `flask rebuild-shopping-list-summaries` recomputes
+    them from the items.
+    """
+    open_count = IntField(default=0)  # items left to buy
+    bought_count = IntField(default=0)
+    last_added_at = DateTimeField(default=None)
+    updated_at = DateTimeField(default=None)  # when the list last changed
+    contributions = MapField(IntField(), default=dict,
+                    help_text='The amount of items on the list added by each'
+                            + ' user, keyed by the user\'s id.')
 
 
 class Household(Document):
@@ -34,17 +41,44 @@ class Household(Document):
                     help_text='A list of users from `user` collection who have'
                             + ' admin privileges over the household.')
     
-    shopping_list = EmbeddedDocumentListField(ShoppingListItem)
+    shopping_list_summary = EmbeddedDocumentField(ShoppingListSummary,
+                                                  default=ShoppingListSummary)
+    version = IntField(default=0,
+                    help_text='Incremented whenever the household, its members'
+                            + ' or its shopping list change. Used for ETags.')
     created_at = DateTimeField(default=datetime.now(UTC))
     updated_at = DateTimeField(default=datetime.now(UTC))
 
+    meta = {
+        'indexes': [
+            # household names are unique regardless of case, lookups must use
+            # the CASE_INSENSITIVE collation to be served by this index
+            {'fields': ['name'], 'unique': True,
+             'collation': CASE_INSENSITIVE, 'name': 'name_ci_unique'},
+            'members',
+            'admins',
+        ],
+        'index_background': True,
+        # Households that have not been through `flask migrate-shopping-lists`
+        # still hold an embedded `shopping_list`, which should not break loading.
+        'strict': False,
+    }
+
     def check_password(self, password: str):
         """Determines if a password matches the hashed password of a user.
 
         Arg:
             password(str): the password to check.
 
+        The app's password hasher is used when there is one, so that the
+        hash is checked outside of the request's process.
+
         Returns:
             True if the password is valid, otherwise False.
         """
+        hasher = current_app.extensions.get('password_hasher') \
+            if has_app_context() else None
+        if hasher:
+            return hasher.verify(self.password_hash, password)
+
         return check_password_hash(self.password_hash, password)
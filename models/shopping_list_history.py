@@ -0,0 +1,42 @@
+# Describes the schema of a `shopping_list_history` document
+from datetime import datetime, UTC
+from mongoengine import Document, ReferenceField, StringField, \
+                        DateTimeField, UUIDField
+from uuid import uuid4
+
+
+class ArchivedShoppingListItem(Document):
+    """Represents a bought item moved off a shopping list.
+
+    Bought items older than the retention period are moved into this
+    append-only collection by the shopping list compaction, so that the
+    lists themselves stay short. An archived item belongs either to a
+    household or, for a personal shopping list, to a user.
+
+    An item whose `expires_at` is set is deleted by MongoDB's TTL monitor
+    once that date has passed. Without one, it is kept for good.
+    """
+    item_id = UUIDField(binary=False, primary_key=True, default=lambda: str(uuid4()))
+    household = ReferenceField('Household', required=False,
+                    help_text='The household whose shopping list the item was on')
+    user = ReferenceField('User', required=False,
+                    help_text='The user whose personal shopping list the item was on')
+    item_name = StringField(max_length=200, required=True)
+    added_date = DateTimeField(default=None)
+    bought_date = DateTimeField(default=None)
+    added_by_user = ReferenceField('User', required=False)
+    bought_by_user = ReferenceField('User', required=False)
+    archived_at = DateTimeField(default=lambda: datetime.now(UTC))
+    expires_at = DateTimeField(default=None)
+
+    meta = {
+        'collection': 'shopping_list_history',
+        'indexes': [
+            # the history's pagination order, most recently bought first
+            ('household', '-bought_date', '-item_id'),
+            ('user', '-bought_date', '-item_id'),
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0,
+             'name': 'expires_at_ttl'},
+        ],
+        'index_background': True,
+    }
@@ -0,0 +1,35 @@
+# Describes the schema of a `shopping_list_item` document
+from datetime import datetime, UTC
+from mongoengine import Document, ReferenceField, StringField, BooleanField, \
+                        DateTimeField, UUIDField
+from uuid import uuid4
+
+
+class ShoppingListItem(Document):
+    """Represents an item on a household's shopping list.
+
+    Items live in their own collection, keyed by household, instead of being
+    embedded in the `household` document. Adding an item is a single insert
+    and never rewrites the household's other items.
+    """
+    item_id = UUIDField(binary=False, primary_key=True, default=lambda: str(uuid4()))
+    household = ReferenceField('Household', required=True,
+                    help_text='The household whose shopping list the item is on')
+    item_name = StringField(max_length=200, required=True)
+    added_date = DateTimeField(default=lambda: datetime.now(UTC))
+    bought_date = DateTimeField(default=None)  # should not be less than added_date
+    is_bought = BooleanField(default=False)
+    added_by_user = ReferenceField('User', required=False)
+    bought_by_user = ReferenceField('User', required=False)
+
+    meta = {
+        'indexes': [
+            ('household', 'is_bought', 'added_date'),
+            # the shopping list's pagination order
+            ('household', 'added_date', 'item_id'),
+            # the bought items due to be archived, see the compaction
+            {'fields': ['bought_date'], 'name': 'bought_date_bought_only',
+             'partialFilterExpression': {'is_bought': True}},
+        ],
+        'index_background': True,
+    }
@@ -1,40 +1,76 @@
 # Describes the schema of a `user` document
 from datetime import datetime, UTC
+from flask import current_app, has_app_context
 from flask_login import UserMixin
-from mongoengine import Document, ReferenceField, StringField, EmailField, \
+from models.collations import CASE_INSENSITIVE
+from mongoengine import Document, LazyReferenceField, StringField, EmailField, \
                         EmbeddedDocument, EmbeddedDocumentListField, \
-                        BooleanField, DateTimeField
+                        BooleanField, DateTimeField, UUIDField
+from uuid import uuid4
 from werkzeug.security import check_password_hash
 
+# the roles of a user in their household
+MEMBER_ROLE = 'member'
+ADMIN_ROLE = 'admin'
+# the fields left out when loading a user to authenticate a request, as
+# they can grow long and are read by their own endpoints
+DEFERRED_FIELDS = ('personal_shopping_list',)
+
 
 class ShoppingListItem(EmbeddedDocument):
+    item_id = UUIDField(binary=False, default=lambda: str(uuid4()))
     item_name = StringField(max_length=200, required=True)
-    added_date = DateTimeField(default=datetime.now(UTC))
+    added_date = DateTimeField(default=lambda: datetime.now(UTC))
     bought_date = DateTimeField(default=None)  # should not be less than added_date
     is_bought = BooleanField(default=False)
 
 
 class User(UserMixin, Document):
     """Represents a user document in the user collection."""
-    username = StringField(unique=True, max_length=60, min_length=2, required=True)
+    username = StringField(max_length=60, min_length=2, required=True)  # unique, see meta
     email = EmailField(unique=True, required=True)
     password_hash = StringField(max_length=256, min_length=10, required=True)
-    household_id = ReferenceField('Household',
+    household_id = LazyReferenceField('Household',
                     help_text='A Foreign key representing a household\'s id ' +
-                              'from the `household` collection')
+                              'from the `household` collection. Lazy so that ' +
+                              'reading its `id` never loads the household.')
+    household_role = StringField(choices=(MEMBER_ROLE, ADMIN_ROLE),
+                    help_text='The user\'s role in their household, kept with ' +
+                              'the household\'s `members` and `admins` so that ' +
+                              'authorization checks only read the user.')
     personal_shopping_list = EmbeddedDocumentListField(ShoppingListItem)
 
     confirmed_email = BooleanField(default=False)
     created_at = DateTimeField(default=datetime.now(UTC))
     updated_at = DateTimeField(default=datetime.now(UTC))
 
+    meta = {
+        'indexes': [
+            # usernames are unique regardless of case, lookups must use the
+            # CASE_INSENSITIVE collation to be served by this index
+            {'fields': ['username'], 'unique': True,
+             'collation': CASE_INSENSITIVE, 'name': 'username_ci_unique'},
+            # also serves the lookups on `household_id` alone
+            ('household_id', 'household_role'),
+        ],
+        'index_background': True,
+    }
+
     def check_password(self, password: str):
         """Determines if a password matches the hashed password of a user.
 
         Arg:
             password(str): the password to check.
 
+        The app's password hasher is used when there is one, so that the
+        hash is checked outside of the request's process.
+
         Returns:
             True if the password is valid, otherwise False.
         """
+        hasher = current_app.extensions.get('password_hasher') \
+            if has_app_context() else None
+        if hasher:
+            return hasher.verify(self.password_hash, password)
+
         return check_password_hash(self.password_hash, password)
@@ -0,0 +1,122 @@
+# Setup code shared by the benchmarks
+import os
+import pytest
+import warnings
+from app import create_app
+from mongoengine.connection import get_db
+from tests.conftest import patch_mongomock
+from tests.benchmarks.runner import load_baseline, save_baseline
+from tests.benchmarks.seed import PASSWORD, PROFILES, seed_household
+from threading import Thread
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+BENCHMARK_REPORT = pytest.StashKey[dict]()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Reports the latency and queries of every benchmark scenario."""
+    report = config.stash.get(BENCHMARK_REPORT, None)
+    if not report:
+        return
+
+    terminalreporter.section(f'benchmarks ({report["backend"]})')
+    terminalreporter.write_line(f'{"scenario":<40} {"p50 ms":>9} {"p95 ms":>9}'
+                                + f' {"p99 ms":>9} {"req/s":>8} {"queries":>8}')
+    for name, result in sorted(report['results'].items()):
+        terminalreporter.write_line(
+            f'{name:<40} {result["p50_ms"]:>9} {result["p95_ms"]:>9}'
+            + f' {result["p99_ms"]:>9} {result["throughput_rps"]:>8}'
+            + f' {result["max_queries"]:>8}')
+
+
+@pytest.fixture(scope='session')
+def benchmark_report(request):
+    """Collects the results of every benchmark of the run.
+
+    With `--update-benchmark-baseline` they become the new baseline of the
+    database backend benchmarked.
+    """
+    if not request.config.getoption('--run-benchmarks'):
+        pytest.skip('benchmarks only run with --run-benchmarks')
+
+    report = {'results': {}, 'backend': None}
+    request.config.stash[BENCHMARK_REPORT] = report
+    yield report
+
+    if request.config.getoption('--update-benchmark-baseline') and report['backend']:
+        save_baseline(BASELINE_PATH, report['backend'], report['results'])
+
+
+@pytest.fixture(scope='session')
+def benchmark_baseline(benchmark_app, benchmark_report):
+    """The stored results of the database backend being benchmarked."""
+    backend = backend_of(benchmark_app)
+    benchmark_report['backend'] = backend
+    return baseline_of(backend)
+
+
+@pytest.fixture(scope='session')
+def benchmark_app(benchmark_report):
+    """The app, with a household of each benchmarked size in its database."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if os.getenv('TEST_DATABASE', '').startswith('mongomock://'):
+            patch_mongomock(monkeypatch)
+        yield from seeded_app(PROFILES)
+
+
+def backend_of(app) -> str:
+    """The database backend benchmarked, `mongod` or `mongomock`.
+
+    Set `TEST_DATABASE` to a `mongomock://` host to benchmark without mongod.
+    """
+    host = app.config.get('MONGODB_HOST') or ''
+    return 'mongomock' if host.startswith('mongomock://') else 'mongod'
+
+
+def baseline_of(backend: str) -> dict:
+    """The stored results of a database backend.
+
+    Without a mongod baseline, mongod is held to the query counts of the
+    mongomock one, whose counted commands are those pymongo sends, but
+    not to its latency.
+    """
+    baseline = load_baseline(BASELINE_PATH)
+    if backend in baseline or backend == 'mongomock':
+        return baseline.get(backend, {})
+
+    warnings.warn('no mongod benchmark baseline, the queries are compared with'
+                  + ' the mongomock one; record one with'
+                  + ' --update-benchmark-baseline')
+    return {name: {'max_queries': result['max_queries']}
+            for name, result in baseline.get('mongomock', {}).items()}
+
+
+def seeded_app(profiles: dict):
+    flask_app = create_app('test')
+    db = get_db()
+    db.client.drop_database(db.name)
+
+    password_hash = generate_password_hash(
+        PASSWORD, method=flask_app.config.get('PASSWORD_HASH_METHOD'))
+    flask_app.config['BENCHMARK_HOUSEHOLDS'] = {
+        profile: seed_household(f'bench-{profile}', password_hash=password_hash,
+                                seed=index, **profiles[profile])
+        for index, profile in enumerate(PROFILES) if profile in profiles}
+
+    yield flask_app
+
+    db.client.drop_database(db.name)
+
+
+@pytest.fixture(scope='session')
+def benchmark_server(benchmark_app):
+    """Serves the app with a threaded WSGI server on a free local port."""
+    server = make_server('127.0.0.1', 0, benchmark_app, threaded=True)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f'http://127.0.0.1:{server.server_port}'
+
+    server.shutdown()
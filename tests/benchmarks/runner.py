@@ -0,0 +1,145 @@
+"""Drives the API's hot paths and measures their latency.
+
+The same scenarios run through the Flask test client, which measures the
+app alone, and a real WSGI server, which adds the HTTP layer.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.request import build_opener, HTTPCookieProcessor, Request
+import json
+
+
+class FlaskClientSession(object):
+    """A logged-in user of the app, through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, json_data=None):
+        """Sends a request.
+
+        Returns:
+            The response's status code and headers.
+        """
+        response = self.client.open(path, method=method, json=json_data)
+        return response.status_code, response.headers
+
+
+class HTTPSession(object):
+    """A logged-in user of the app, through a real HTTP connection."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method: str, path: str, json_data=None):
+        """Sends a request.
+
+        Returns:
+            The response's status code and headers.
+        """
+        data = json.dumps(json_data).encode() if json_data is not None else None
+        request = Request(self.base_url + path, data=data, method=method,
+                          headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, response.headers
+        except HTTPError as error:
+            return error.code, error.headers
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Provides the nearest-rank percentile of some samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(send, iterations: int, concurrency: int = 1) -> dict:
+    """Sends a scenario's request several times and summarises its latency.
+
+    Arg:
+        send: sends the request of the given iteration, returning the
+            response's status code and headers.
+        iterations: the amount of requests sent.
+        concurrency: the amount of requests sent at the same time.
+
+    Returns:
+        The requests' latency percentiles in milliseconds, their throughput
+        in requests per second and the most MongoDB commands a request ran,
+        as told by the `X-DB-Queries` header.
+
+    Raises:
+        AssertionError: if a request fails.
+    """
+    def timed(iteration):
+        started_at = perf_counter()
+        status, headers = send(iteration)
+        latency = perf_counter() - started_at
+        assert status < 400, f'request {iteration} failed with {status}'
+        return latency, int(headers.get('X-DB-Queries') or 0)
+
+    started_at = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        measures = list(executor.map(timed, range(iterations)))
+    elapsed = perf_counter() - started_at
+
+    latencies = [latency * 1000 for latency, _ in measures]
+    return {
+        'requests': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'throughput_rps': round(iterations / elapsed, 1),
+        'max_queries': max(queries for _, queries in measures),
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float = None) -> list:
+    """Compares benchmark results against a stored baseline.
+
+    A scenario regresses when a request runs more MongoDB commands than the
+    baseline's or, given a `tolerance` (eg. 0.5 for 50%), when its p95
+    latency exceeds the baseline's by more than it. A scenario missing
+    from the baseline fails too, so that a new scenario gets recorded.
+
+    Returns:
+        A description of every regression.
+    """
+    found = []
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if not expected:
+            found.append(f'{name}: not in the baseline, record it with'
+                         + ' --update-benchmark-baseline')
+            continue
+
+        if tolerance is not None and 'p95_ms' in expected \
+                and result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            found.append(f'{name}: p95 of {result["p95_ms"]}ms exceeds the'
+                         + f' baseline {expected["p95_ms"]}ms by more than'
+                         + f' {tolerance:.0%}')
+        if result['max_queries'] > expected['max_queries']:
+            found.append(f'{name}: {result["max_queries"]} MongoDB commands per'
+                         + f' request, the baseline ran {expected["max_queries"]}')
+    return found
+
+
+def load_baseline(path) -> dict:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, backend: str, results: dict):
+    """Stores the results as the baseline of a database backend."""
+    baseline = load_baseline(path)
+    baseline[backend] = dict(sorted(results.items()))
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
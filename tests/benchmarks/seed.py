@@ -0,0 +1,76 @@
+"""Seeds households of realistic sizes for the benchmarks."""
+from bson import ObjectId
+from datetime import datetime, timedelta, UTC
+from models.household import Household
+from models.shopping_list_item import ShoppingListItem
+from models.user import User
+from random import Random
+from uuid import uuid4
+
+# the household sizes benchmarked, from a couple to a large shared house
+PROFILES = {
+    'small': {'members': 2, 'items': 10},
+    'medium': {'members': 10, 'items': 500},
+    'large': {'members': 50, 'items': 10000},
+}
+PASSWORD = 'benchmark-password'
+ITEM_NAMES = ('milk', 'eggs', 'bread', 'rice', 'apples', 'coffee', 'pasta',
+              'onions', 'cheese', 'tomatoes', 'butter', 'yoghurt')
+
+
+def seed_household(name: str, members: int, items: int, password_hash: str,
+                   seed: int = 0) -> dict:
+    """Inserts a household with its members and shopping list.
+
+    The documents are written with raw bulk inserts, which is much faster
+    than saving them one by one. A quarter of the items are bought.
+
+    Arg:
+        name: the household's name, also used for its members' usernames.
+        members: the amount of members, the first one being the admin.
+        items: the amount of shopping list items.
+        password_hash: the hash of `PASSWORD`, shared by every member.
+        seed: makes the generated shopping list reproducible.
+
+    Returns:
+        The household's `id` and `usernames`.
+    """
+    random = Random(seed)
+    now = datetime.now(UTC)
+    household_id = ObjectId()
+    user_ids = [ObjectId() for _ in range(members)]
+    usernames = [f'{name}-member-{index}' for index in range(members)]
+
+    User._get_collection().insert_many([{
+        '_id': user_id, 'username': username,
+        'email': f'{username}@benchmarks.grocery-squad.com',
+        'password_hash': password_hash, 'household_id': household_id,
+        'confirmed_email': True, 'created_at': now, 'updated_at': now,
+    } for user_id, username in zip(user_ids, usernames)])
+
+    Household._get_collection().insert_one({
+        '_id': household_id, 'name': name, 'password_hash': password_hash,
+        'members': user_ids, 'admins': user_ids[:1], 'version': 0,
+        'created_at': now, 'updated_at': now,
+    })
+
+    start = now - timedelta(days=30)
+    documents = []
+    for index in range(items):
+        is_bought = index % 4 == 0
+        added_by = random.choice(user_ids)
+        document = {
+            '_id': str(uuid4()), 'household': household_id,
+            'item_name': f'{random.choice(ITEM_NAMES)} {index}',
+            'added_date': start + timedelta(seconds=index),
+            'is_bought': is_bought, 'added_by_user': added_by,
+        }
+        if is_bought:
+            document.update(bought_date=now, bought_by_user=added_by)
+        documents.append(document)
+
+    for chunk in range(0, len(documents), 1000):
+        ShoppingListItem._get_collection().insert_many(
+            documents[chunk:chunk + 1000])
+
+    return {'id': str(household_id), 'usernames': usernames}
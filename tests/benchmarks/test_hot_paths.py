@@ -0,0 +1,108 @@
+"""Benchmarks of the API's hot paths, run with `pytest --run-benchmarks`.
+
+Their queries are also compared with the baseline in every test run, for
+the small household only.
+"""
+import os
+import pytest
+import warnings
+from tests.benchmarks.conftest import backend_of, baseline_of, seeded_app
+from tests.benchmarks.runner import FlaskClientSession, HTTPSession, \
+    regressions, run_scenario
+from tests.benchmarks.seed import PASSWORD, PROFILES
+from tests.conftest import disconnect_database, patch_mongomock
+
+# concurrent users of the real server, each logged in as another member
+SERVER_CONCURRENCY = 4
+
+
+def new_session(transport: str, app, server_url: str):
+    if transport == 'wsgi_server':
+        return HTTPSession(server_url)
+    return FlaskClientSession(app)
+
+
+def login(session, username: str):
+    status, _ = session.request('POST', '/api/login',
+                                {'username': username, 'password': PASSWORD})
+    assert status == 200, f'{username} could not log in'
+    return session
+
+
+def hot_path_scenarios(transport: str, app, server_url: str, profile: str,
+                       concurrency: int) -> dict:
+    """Provides the requests of each hot path, as logged-in members."""
+    usernames = app.config['BENCHMARK_HOUSEHOLDS'][profile]['usernames']
+    sessions = [login(new_session(transport, app, server_url),
+                      usernames[index % len(usernames)])
+                for index in range(concurrency)]
+
+    def as_member(method, path, json_data=None):
+        return lambda iteration: sessions[iteration % concurrency].request(
+            method, path, json_data)
+
+    return {
+        'login': lambda iteration: new_session(
+            transport, app, server_url).request(
+            'POST', '/api/login', {'username': usernames[iteration % len(usernames)],
+                                   'password': PASSWORD}),
+        'users_me': as_member('GET', '/api/users/me'),
+        'profile': as_member('GET', '/api/households/profile'),
+        'list_items': as_member('GET', '/api/households/shopping_list/items'),
+        'add_item': as_member('POST', '/api/households/shopping_list/items',
+                              {'item_name': 'benchmark item'}),
+    }
+
+
+@pytest.fixture(scope='module')
+def small_household_app(request):
+    """The app, with a small household in its database, outside benchmark runs."""
+    if request.config.getoption('--run-benchmarks'):
+        pytest.skip('the benchmarks compare the queries of every household')
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if os.getenv('TEST_DATABASE', '').startswith('mongomock://'):
+            patch_mongomock(monkeypatch)
+        yield from seeded_app({'small': PROFILES['small']})
+    disconnect_database()
+
+
+def test_hot_path_queries(small_household_app):
+    """Holds the hot paths to the baseline's queries in every test run."""
+    scenarios = hot_path_scenarios('test_client', small_household_app, None,
+                                   'small', concurrency=1)
+    results = {f'test_client/small/{scenario}': run_scenario(send, 3)
+               for scenario, send in scenarios.items()}
+
+    found = regressions(results, baseline_of(backend_of(small_household_app)))
+    assert not found, 'query regressions:\n' + '\n'.join(found)
+
+
+@pytest.mark.parametrize('transport', ['test_client', 'wsgi_server'])
+@pytest.mark.parametrize('profile', list(PROFILES))
+def test_hot_paths(request, transport, profile, benchmark_app,
+                   benchmark_baseline, benchmark_report):
+    server_url = request.getfixturevalue('benchmark_server') \
+        if transport == 'wsgi_server' else None
+    iterations = request.config.getoption('--benchmark-iterations')
+    concurrency = SERVER_CONCURRENCY if transport == 'wsgi_server' else 1
+    scenarios = hot_path_scenarios(transport, benchmark_app, server_url,
+                                   profile, concurrency)
+
+    results = {}
+    for scenario, send in scenarios.items():
+        name = f'{transport}/{profile}/{scenario}'
+        results[name] = run_scenario(send, iterations, concurrency)
+    benchmark_report['results'].update(results)
+
+    if not any(result['max_queries'] for result in results.values()):
+        warnings.warn(f'no MongoDB command was counted for the {profile}'
+                      + f' {transport} benchmarks, their queries are not'
+                      + ' compared with the baseline')
+    if request.config.getoption('--update-benchmark-baseline'):
+        return
+
+    tolerance = request.config.getoption('--benchmark-tolerance') \
+        if request.config.getoption('--benchmark-latency') else None
+    found = regressions(results, benchmark_baseline, tolerance)
+    assert not found, 'performance regressions:\n' + '\n'.join(found)
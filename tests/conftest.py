@@ -1,7 +1,76 @@
 # Setup code shared across multiple test files
+import os
 import pytest
 from app import create_app
-from mongoengine import connect, disconnect
+from app.utils.query_audit import QueryRecorder, audit_commands
+from models.household import Household
+from models.shopping_list_item import ShoppingListItem
+from models.user import User
+from mongoengine import disconnect
+from mongoengine.connection import get_db
+from pymongo import MongoClient, monitoring
+from time import perf_counter
+from types import SimpleNamespace
+import threading
+
+query_recorder = QueryRecorder()
+PASSWORD = 'password123'
+# the MongoDB command each mongomock collection method stands for
+MONGOMOCK_COMMANDS = {
+    'find': 'find', 'find_one': 'find', 'insert_one': 'insert',
+    'insert_many': 'insert', 'update_one': 'update', 'update_many': 'update',
+    'replace_one': 'update', 'delete_one': 'delete', 'delete_many': 'delete',
+    'count_documents': 'aggregate', 'estimated_document_count': 'count',
+    'aggregate': 'aggregate', 'distinct': 'distinct',
+    'find_one_and_update': 'findAndModify', 'find_one_and_delete': 'findAndModify',
+    'find_one_and_replace': 'findAndModify', 'bulk_write': None,
+    'create_indexes': 'createIndexes',
+}
+BULK_WRITE_COMMANDS = {
+    'InsertOne': 'insert', 'UpdateOne': 'update', 'UpdateMany': 'update',
+    'ReplaceOne': 'update', 'DeleteOne': 'delete', 'DeleteMany': 'delete',
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--audit-indexes', action='store_true',
+                     help='Report the queries of the test run whose plan'
+                          + ' scans a whole collection.')
+    parser.addoption('--run-benchmarks', action='store_true',
+                     help='Run the benchmarks of tests/benchmarks.')
+    parser.addoption('--benchmark-iterations', type=int, default=50,
+                     help='The requests sent by each benchmark scenario.')
+    parser.addoption('--benchmark-latency', action='store_true',
+                     help='Also fail the benchmarks slower than the baseline,'
+                          + ' which only holds on the machine that recorded it.')
+    parser.addoption('--benchmark-tolerance', type=float, default=0.5,
+                     help='With --benchmark-latency, how much slower than the'
+                          + ' baseline a benchmark may be, eg. 0.5 for 50%%.')
+    parser.addoption('--update-benchmark-baseline', action='store_true',
+                     help='Store the benchmark results as the new baseline.')
+
+
+def pytest_configure(config):
+    # must be registered before the app connects to the database
+    if config.getoption('--audit-indexes'):
+        monitoring.register(query_recorder)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Explains every query the tests ran and reports collection scans."""
+    if not config.getoption('--audit-indexes'):
+        return
+
+    terminalreporter.section('index audit')
+    with MongoClient(os.getenv('TEST_DATABASE')) as client:
+        findings = audit_commands(client, query_recorder.commands)
+
+    terminalreporter.write_line(f'{len(query_recorder.commands)} distinct'
+                                + f' queries explained, {len(findings)}'
+                                + ' scan a whole collection')
+    for database_name, command, _ in findings:
+        terminalreporter.write_line(f'COLLSCAN {database_name}: {command}')
+
 
 @pytest.fixture(scope='module')
 def test_connections():
@@ -9,14 +78,137 @@ def test_connections():
 
     Flask app and database are setup for testing.
     """
-    flask_app = create_app('test')  # the app's config specific for testing
-    testing_client = flask_app.test_client()  # flask client for tests
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if os.getenv('TEST_DATABASE', '').startswith('mongomock://'):
+            patch_mongomock(monkeypatch)
 
-    test_db_name = flask_app.config.get('MONGODB_SETTINGS').get('db')
-    db = connect(test_db_name, 'test_connection')
-    db.drop_database(test_db_name)
+        flask_app = create_app('test')  # the app's config specific for testing
+        testing_client = flask_app.test_client()  # flask client for tests
 
-    with flask_app.app_context():
+        # the database of the app's connection, `TEST_DATABASE`
+        db = get_db()
+        db.client.drop_database(db.name)
+
+        # no app context is kept pushed: the requests would share it, and
+        # with it `g` and the user Flask-Login loaded into it
         yield testing_client
 
+        disconnect_database()
+
+
+def disconnect_database():
+    """Disconnects MongoEngine, detaching every document from its client.
+
+    `disconnect` only detaches the documents of MongoEngine's registry, in
+    which the `ShoppingListItem` embedded in users shadows the collection's.
+    """
     disconnect()
+    ShoppingListItem._disconnect()
+
+
+def patch_mongomock(monkeypatch):
+    """Fills in the query features the app uses that mongomock lacks.
+
+    Collations are ignored, so usernames are matched case-sensitively, an
+    `$elemMatch` on an array of ObjectIds is matched like on documents, and
+    a `$max` replaces a null, which sorts before any date. The commands
+    pymongo would send are reported to the command listeners, so that the
+    queries of a request are counted, see `report_mongomock_commands`.
+    """
+    import mongomock.collection
+
+    filter_applies = mongomock.collection.filter_applies
+
+    def scalar_elem_match(search_filter, document, *args, **kwargs):
+        if isinstance(search_filter, dict) and search_filter \
+                and all(key.startswith('$') for key in search_filter) \
+                and not isinstance(document, dict):
+            return filter_applies({'value': search_filter}, {'value': document})
+        return filter_applies(search_filter, document, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection, 'filter_applies', scalar_elem_match)
+    monkeypatch.setattr(mongomock.collection.Cursor, 'collation',
+                        lambda cursor, collation=None: cursor)
+    count_documents = mongomock.collection.Collection.count_documents
+    monkeypatch.setattr(mongomock.collection.Collection, 'count_documents',
+                        lambda collection, filter, collation=None, **kwargs:
+                        count_documents(collection, filter, **kwargs))
+
+    def max_updater(document, field_name, value):
+        if isinstance(document, dict):
+            current = document.get(field_name)
+            document[field_name] = value if current is None else max(current, value)
+
+    monkeypatch.setitem(mongomock.collection._updaters, '$max', max_updater)
+    report_mongomock_commands(monkeypatch)
+
+
+def report_mongomock_commands(monkeypatch):
+    """Reports mongomock's collection calls as pymongo's command events.
+
+    Each call is one command, as pymongo sends for a small result, and a
+    bulk write one per run of writes of the same kind. Only the outermost
+    call counts, mongomock calling its own methods. The listeners only get
+    the `succeeded` events, with the command's name and duration.
+    """
+    import mongomock.collection
+
+    depth = threading.local()
+
+    def reporting(method, command_name):
+        def call(collection, *args, **kwargs):
+            if getattr(depth, 'value', 0):
+                return method(collection, *args, **kwargs)
+
+            depth.value = 1
+            started_at = perf_counter()
+            try:
+                return method(collection, *args, **kwargs)
+            finally:
+                depth.value = 0
+                duration_micros = int((perf_counter() - started_at) * 1e6)
+                if command_name:
+                    names = [command_name]
+                else:  # a bulk write, whose requests are the first argument
+                    requests = args[0] if args else kwargs['requests']
+                    kinds = [BULK_WRITE_COMMANDS[type(request).__name__]
+                             for request in requests]
+                    names = [kind for index, kind in enumerate(kinds)
+                             if not index or kind != kinds[index - 1]]
+                for name in names:
+                    event = SimpleNamespace(
+                        command_name=name, duration_micros=duration_micros,
+                        database_name=collection.database.name)
+                    for listener in monitoring._LISTENERS.command_listeners:
+                        listener.succeeded(event)
+        return call
+
+    for name, command_name in MONGOMOCK_COMMANDS.items():
+        method = getattr(mongomock.collection.Collection, name)
+        monkeypatch.setattr(mongomock.collection.Collection, name,
+                            reporting(method, command_name))
+
+
+def sign_up(client, username: str):
+    """Registers a user, logging the client in as them.
+
+    Returns:
+        The user's id.
+    """
+    response = client.post('/api/users', json={
+        'username': username, 'email': f'{username}@example.com',
+        'password': PASSWORD})
+    assert response.status_code == 201, response.get_json()
+    return User.objects.get(username=username).id
+
+
+def create_household(client, name: str):
+    """Creates a household administered by the client's user.
+
+    Returns:
+        The household's id.
+    """
+    response = client.post('/api/households', json={'name': name,
+                                                    'password': PASSWORD})
+    assert response.status_code == 201, response.get_json()
+    return Household.objects.get(name=name).id
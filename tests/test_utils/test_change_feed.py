@@ -0,0 +1,57 @@
+"""Unit tests for the in-memory change feed bus."""
+import pytest
+from app.utils.change_feed import InMemoryChangeFeedBus, SubscriberLimitReached
+
+
+def test_events_reach_only_the_household_subscribers():
+    bus = InMemoryChangeFeedBus()
+    home = bus.subscribe('home')
+    other = bus.subscribe('other')
+
+    bus.publish('home', {'type': 'item_added', 'item': {'item_id': 'a'}})
+
+    assert home.get(timeout=0) == {'type': 'item_added', 'item': {'item_id': 'a'}}
+    assert other.get(timeout=0) is None
+
+
+def test_closed_subscription_is_removed():
+    bus = InMemoryChangeFeedBus()
+    subscription = bus.subscribe('home')
+    assert bus.subscriber_count('home') == 1
+
+    subscription.close()
+    assert bus.subscriber_count('home') == 0
+
+
+def test_slow_subscriber_overflows():
+    bus = InMemoryChangeFeedBus(queue_size=1)
+    subscription = bus.subscribe('home')
+
+    bus.publish('home', {'type': 'item_added'})
+    bus.publish('home', {'type': 'item_removed'})
+
+    assert subscription.overflowed
+    assert bus.subscriber_count() == 0
+
+
+def test_subscribers_are_capped():
+    bus = InMemoryChangeFeedBus(max_subscribers=1)
+    subscription = bus.subscribe('home')
+
+    with pytest.raises(SubscriberLimitReached):
+        bus.subscribe('other')
+
+    subscription.close()
+    bus.subscribe('other')
+
+
+def test_closing_a_user_ends_their_subscriptions():
+    bus = InMemoryChangeFeedBus()
+    removed = bus.subscribe('home', 'removed')
+    other = bus.subscribe('home', 'other')
+
+    bus.close_user('home', 'removed')
+
+    assert removed.closed and not other.closed
+    assert removed.get(timeout=0) is None  # a waiting listener wakes up
+    assert bus.subscriber_count('home') == 1
@@ -0,0 +1,25 @@
+"""Unit tests for the MongoDB connection settings and pool monitoring."""
+from app.utils.database import ConnectionPoolStats, mongo_client_settings
+from types import SimpleNamespace
+
+
+def test_unset_options_use_the_driver_defaults():
+    config = {'MONGODB_MAX_POOL_SIZE': 20, 'MONGODB_COMPRESSORS': None,
+              'MONGODB_READ_PREFERENCE': 'secondaryPreferred'}
+    assert mongo_client_settings(config) == {
+        'maxPoolSize': 20, 'readPreference': 'secondaryPreferred'}
+
+
+def test_pool_events_are_counted_per_server():
+    stats = ConnectionPoolStats()
+    event = SimpleNamespace(address=('localhost', 27017))
+    stats.connection_created(event)
+    stats.connection_checked_out(event)
+    stats.connection_checked_in(event)
+    stats.connection_checked_out(event)
+    stats.connection_check_out_failed(event)
+
+    server = stats.stats()['localhost:27017']
+    assert server['open'] == 1
+    assert server['in_use'] == 1
+    assert server['check_out_failed'] == 1
@@ -0,0 +1,118 @@
+"""Unit tests for the background email delivery queue."""
+from app.utils.email_queue import EmailQueue
+from time import sleep, time
+import pytest
+from flask import Flask
+from flask_mail import Mail, Message
+
+
+def make_queue(**config):
+    app = Flask(__name__)
+    app.config.update(MAIL_SUPPRESS_SEND=True,
+                      MAIL_DEFAULT_SENDER='dummy@grocery_squad.com',
+                      EMAIL_QUEUE_WORKERS=0, EMAIL_QUEUE_MAX_ATTEMPTS=3)
+    app.config.update(config)
+    mail = Mail(app)
+    return app, mail, EmailQueue(app)
+
+
+def test_delivered_email_leaves_the_outbox():
+    app, mail, queue = make_queue()
+    with app.app_context(), mail.record_messages() as outbox:
+        queue.enqueue(Message('Confirm Email', recipients=['inui@seigakutc.co.za'],
+                              body='Please confirm your email'))
+
+    assert [msg.subject for msg in outbox] == ['Confirm Email']
+    assert queue.stats() == {'pending': 0, 'sending': 0, 'dead': 0}
+
+
+def test_failing_email_becomes_a_dead_letter(monkeypatch):
+    app, mail, queue = make_queue()
+    attempts = []
+
+    def fail(message):
+        attempts.append(message)
+        raise ConnectionRefusedError('mail server is down')
+
+    monkeypatch.setattr(app.extensions['mail'], 'send', fail)
+    with app.app_context():
+        email_id = queue.enqueue(Message('Confirm Email',
+                                         recipients=['inui@seigakutc.co.za']))
+
+    assert len(attempts) == 3
+    dead_letters = queue.dead_letters()
+    assert [letter['id'] for letter in dead_letters] == [email_id]
+    assert 'mail server is down' in dead_letters[0]['last_error']
+
+    monkeypatch.undo()
+    assert queue.retry_dead_letter(email_id)
+    assert queue.dead_letters() == []
+
+
+def test_outbox_must_be_set():
+    with pytest.raises(RuntimeError):
+        make_queue(EMAIL_QUEUE_DATABASE=None)
+
+
+def test_shared_outbox_claims_each_email_once(tmp_path, monkeypatch):
+    database = str(tmp_path / 'outbox.sqlite3')
+    app, _, queue = make_queue(EMAIL_QUEUE_DATABASE=database,
+                               EMAIL_QUEUE_WORKERS=1)
+    _, _, other_queue = make_queue(EMAIL_QUEUE_DATABASE=database)
+    monkeypatch.setattr(queue, '_start_workers', lambda: None)  # claimed below
+    with app.app_context():
+        for subject in ('First', 'Second'):
+            queue.enqueue(Message(subject, recipients=['inui@seigakutc.co.za']))
+
+    claimed = [queue._claim(), other_queue._claim(), queue._claim()]
+    assert sorted(row[1] for row in claimed[:2]) == ['First', 'Second']
+    assert claimed[2] is None
+    assert other_queue.stats() == {'pending': 0, 'sending': 2, 'dead': 0}
+
+
+def test_expired_claim_is_claimed_again(monkeypatch):
+    app, _, queue = make_queue(EMAIL_QUEUE_WORKERS=1)
+    monkeypatch.setattr(queue, '_start_workers', lambda: None)
+    with app.app_context():
+        email_id = queue.enqueue(Message('Confirm Email',
+                                         recipients=['inui@seigakutc.co.za']))
+    assert queue._claim()[0] == email_id
+    assert queue._claim() is None
+
+    later = time() + queue.claim_timeout + 1
+    monkeypatch.setattr('app.utils.email_queue.time', lambda: later)
+    assert queue._claim()[0] == email_id
+
+
+class RecordingPool(object):
+    """Stands for the app's SMTP connection pool, failing some subjects."""
+
+    def __init__(self, failing: set):
+        self.failing = failing
+        self.batches = []
+
+    def send_many(self, messages: list) -> list:
+        self.batches.append([message.subject for message in messages])
+        return [(message, ConnectionResetError('connection dropped'))
+                for message in messages if message.subject in self.failing]
+
+
+def test_worker_sends_a_batch_over_one_connection(monkeypatch):
+    app, _, queue = make_queue(EMAIL_QUEUE_WORKERS=1, EMAIL_QUEUE_BACKOFF=60)
+    pool = RecordingPool({'Second'})
+    app.extensions['smtp_pool'] = pool
+    start_workers = queue._start_workers
+    monkeypatch.setattr(queue, '_start_workers', lambda: None)  # started below
+    with app.app_context():
+        for subject in ('First', 'Second', 'Third'):
+            queue.enqueue(Message(subject, recipients=['inui@seigakutc.co.za']))
+
+    start_workers()
+    deadline = time() + 5
+    while not (pool.batches and not queue.stats()['sending']) and time() < deadline:
+        sleep(0.01)
+    queue.shutdown()
+
+    assert pool.batches == [['First', 'Second', 'Third']]
+    # only the failed email is left, for another attempt after its backoff
+    assert queue.stats() == {'pending': 1, 'sending': 0, 'dead': 0}
@@ -0,0 +1,37 @@
+"""Unit tests for the identity cache used by `load_user`."""
+from app.utils.identity_cache import IdentityCache
+
+
+def test_miss_then_hit():
+    cache = IdentityCache(maxsize=2, ttl=60)
+    assert cache.get('a') is None
+    cache.set('a', {'username': 'AbacusWarrior'})
+    assert cache.get('a') == {'username': 'AbacusWarrior'}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = IdentityCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = IdentityCache(maxsize=2, ttl=10)
+    monkeypatch.setattr('app.utils.identity_cache.monotonic', lambda: 100)
+    cache.set('a', 1)
+    monkeypatch.setattr('app.utils.identity_cache.monotonic', lambda: 111)
+    assert cache.get('a') is None
+
+
+def test_invalidate():
+    cache = IdentityCache()
+    cache.set('a', 1)
+    cache.invalidate('a')
+    assert cache.get('a') is None
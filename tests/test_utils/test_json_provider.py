@@ -0,0 +1,55 @@
+"""Unit tests for the orjson backed JSON provider."""
+import pytest
+from app.utils.json_provider import OrjsonProvider
+from bson import ObjectId
+from datetime import datetime, UTC
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from uuid import uuid4
+
+DATA = {'name': 'home', 'created_at': datetime(2024, 8, 1, 12, 30, tzinfo=UTC),
+        'item_id': uuid4(), 'members': ['AbacusWarrior', 'b'], 'empty': {},
+        'nested': {'z': 1, 'a': [True, None, 1.5]}}
+
+
+@pytest.mark.parametrize('debug', [True, False])
+def test_responses_match_flask_default_provider(debug):
+    app = Flask(__name__)
+    app.debug = debug
+    expected = DefaultJSONProvider(app).response(DATA).get_data()
+    assert OrjsonProvider(app).response(DATA).get_data() == expected
+
+
+def test_object_ids_are_encoded_as_strings():
+    object_id = ObjectId()
+    provider = OrjsonProvider(Flask(__name__))
+    assert provider.loads(provider.dumps({'id': object_id})) == {'id': str(object_id)}
+
+
+def test_non_ascii_text_is_raw_utf8():
+    app = Flask(__name__)
+    data = {'name': 'Café 🛒', 'members': ['Łukasz']}
+    expected = DefaultJSONProvider(app).response(data).get_data()
+    body = OrjsonProvider(app).response(data).get_data()
+
+    assert b'\\u00e9' in expected and 'é'.encode() in body
+    assert OrjsonProvider(app).loads(body) == DefaultJSONProvider(app).loads(expected)
+
+
+def test_integers_beyond_64_bits_are_left_to_flask():
+    app = Flask(__name__)
+    data = {'count': 2 ** 64, 'negative': -2 ** 70}
+    provider = OrjsonProvider(app)
+
+    assert provider.loads(provider.dumps(data)) == data
+    assert provider.response(data).get_data() \
+        == DefaultJSONProvider(app).response(data).get_data()
+
+
+@pytest.mark.parametrize('kwargs', [{'indent': 4}, {'indent': 0},
+                                    {'separators': (',', ':')},
+                                    {'indent': 2, 'ensure_ascii': False}])
+def test_arguments_orjson_lacks_are_left_to_flask(kwargs):
+    app = Flask(__name__)
+    expected = DefaultJSONProvider(app).dumps(DATA, **kwargs)
+    assert OrjsonProvider(app).dumps(DATA, **kwargs) == expected
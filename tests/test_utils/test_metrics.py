@@ -0,0 +1,49 @@
+"""Unit tests for the request latency and query metrics."""
+from app.utils.metrics import Histogram, Metrics
+from flask import Flask
+from types import SimpleNamespace
+
+
+def make_app(threshold: int = 2):
+    app = Flask(__name__)
+    app.config.update(METRICS_N_PLUS_ONE_THRESHOLD=threshold,
+                      METRICS_QUERY_HEADERS=True)
+    metrics = Metrics(app)
+
+    @app.get('/items/<int:queries>')
+    def items(queries):
+        # stands in for the commands pymongo reports while the view runs
+        for _ in range(queries):
+            metrics.query_monitor.succeeded(SimpleNamespace(duration_micros=1500))
+        return 'ok'
+
+    return app, metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency', 'Latency.', (0.1, 1))
+    histogram.observe(0.05, endpoint='a')
+    histogram.observe(0.5, endpoint='a')
+    histogram.observe(5, endpoint='a')
+    lines = histogram.render()
+    assert 'latency_bucket{endpoint="a",le="0.1"} 1' in lines
+    assert 'latency_bucket{endpoint="a",le="1"} 2' in lines
+    assert 'latency_bucket{endpoint="a",le="+Inf"} 3' in lines
+    assert 'latency_count{endpoint="a"} 3' in lines
+
+
+def test_query_headers_report_the_request_queries():
+    app, _ = make_app()
+    response = app.test_client().get('/items/2')
+    assert response.headers['X-DB-Queries'] == '2'
+    assert response.headers['Server-Timing'].startswith('db;dur=3.0;')
+
+
+def test_requests_above_the_threshold_are_flagged():
+    app, metrics = make_app(threshold=2)
+    client = app.test_client()
+    client.get('/items/2')
+    assert metrics.n_plus_one.value(endpoint='items') == 0
+    client.get('/items/3')
+    assert metrics.n_plus_one.value(endpoint='items') == 1
+    assert 'http_request_n_plus_one_total{endpoint="items"} 1' in metrics.render()
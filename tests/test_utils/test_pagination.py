@@ -0,0 +1,23 @@
+"""Unit tests for the cursor pagination helpers."""
+from datetime import datetime
+from app.utils.pagination import decode_cursor, encode_cursor, get_page_size
+
+
+def test_cursor_round_trip():
+    added_date = datetime(2024, 9, 1, 12, 30, 15, 123000)
+    cursor = encode_cursor(added_date, 'f6b1c2a0-4d3e-4f5a-9b8c-7d6e5f4a3b2c')
+    assert decode_cursor(cursor) == (added_date,
+                                     'f6b1c2a0-4d3e-4f5a-9b8c-7d6e5f4a3b2c')
+
+
+def test_invalid_cursor():
+    assert decode_cursor('not-a-cursor') is None
+    assert decode_cursor('') is None
+
+
+def test_page_size():
+    assert get_page_size(None, 50, 200) == 50
+    assert get_page_size('10', 50, 200) == 10
+    assert get_page_size('1000', 50, 200) == 200
+    assert get_page_size('0', 50, 200) is None
+    assert get_page_size('ten', 50, 200) is None
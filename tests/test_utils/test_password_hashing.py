@@ -0,0 +1,43 @@
+"""Unit tests for the password hashing process pool."""
+import pytest
+from app.utils.password_hashing import START_METHOD, PasswordHasher
+from time import sleep
+
+
+def test_hashes_in_processes_not_forked_from_the_server():
+    hasher = PasswordHasher()
+    hasher.method, hasher.workers = 'pbkdf2:sha256:1000', 1
+    try:
+        assert hasher.verify(hasher.hash('dataTennis'), 'dataTennis')
+        assert hasher._executor._mp_context.get_start_method() == START_METHOD
+        assert START_METHOD != 'fork'
+    finally:
+        hasher.shutdown()
+
+
+def test_busy_pool_times_out():
+    hasher = PasswordHasher()
+    hasher.workers, hasher.timeout = 1, 0.01
+    try:
+        with pytest.raises(TimeoutError):
+            hasher._run(sleep, 1)
+    finally:
+        hasher.shutdown()
+
+
+def test_timed_out_hashing_is_cancelled():
+    hasher = PasswordHasher()
+    hasher.workers, hasher.timeout = 1, 0.01
+    executor = hasher._get_executor()
+    submit, futures = executor.submit, []
+    executor.submit = lambda *args: futures.append(submit(*args)) or futures[-1]
+    try:
+        # the worker runs the first, and the pool already queues the next
+        # ones in the worker's call queue, where they cannot be cancelled
+        for _ in range(5):
+            with pytest.raises(TimeoutError):
+                hasher._run(sleep, 1)
+
+        assert futures[-1].cancelled()  # never to run once the worker is free
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,185 @@
+"""Unit tests for the server-side session backends and interface."""
+from app.utils.session_store import InMemorySessionBackend, \
+    RedisSessionBackend, ServerSideSessionInterface
+from flask import Flask
+from time import monotonic
+
+
+class FakeRedis(object):
+    """The subset of a Redis client used by `RedisSessionBackend`."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.ttls = {}  # key -> seconds it has left, without a clock
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None, keepttl=False, xx=False):
+        if xx and key not in self.values:
+            return None
+        self.values[key] = value.encode()
+        if ex is not None:
+            self.ttls[key] = ex
+        elif not keepttl:
+            self.ttls.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+            self.ttls.pop(key, None)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(m.encode() for m in members)
+
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(m.encode() for m in members)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    def expire(self, key, ttl):
+        if key not in self.values and key not in self.sets:
+            return False
+        self.ttls[key] = ttl
+        return True
+
+    def ttl(self, key):
+        if key not in self.values and key not in self.sets:
+            return -2
+        return self.ttls.get(key, -1)
+
+
+def test_the_least_recently_used_session_is_evicted():
+    backend = InMemorySessionBackend(maxsize=2)
+    backend.save('a', '{}', 'u1', 60)
+    backend.save('b', '{}', 'u1', 60)
+    backend.load('a')
+    backend.save('c', '{}', 'u2', 60)
+
+    assert backend.load('b') is None
+    assert sorted(backend.sessions_of('u1')) == ['a']
+
+
+def test_expired_sessions_are_not_loaded():
+    backend = InMemorySessionBackend()
+    backend.save('a', '{}', 'u1', 0)
+    assert backend.load('a') is None
+
+
+def test_redis_backend_revokes_and_updates_a_users_sessions():
+    backend = RedisSessionBackend(FakeRedis())
+    backend.save('a', '{"n": 1}', 'u1', 60)
+    backend.save('b', '{"n": 2}', 'u1', 60)
+    backend.replace('b', '{"n": 3}')
+    backend.replace('missing', '{}')
+
+    assert backend.load('b') == '{"n": 3}'
+    assert backend.load('missing') is None
+
+    backend.delete('a', 'u1')
+    assert backend.sessions_of('u1') == ['b']
+
+
+def test_the_cookie_only_holds_a_signed_session_id():
+    app = Flask(__name__)
+    app.secret_key = 'secret'
+    interface = ServerSideSessionInterface(InMemorySessionBackend(), 60)
+    app.session_interface = interface
+
+    @app.route('/')
+    def index():
+        from flask import session
+        session['principal'] = {'user_id': 'u1'}
+        return ''
+
+    response = app.test_client().get('/')
+    cookie = response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+
+    sid = interface.read_cookie(app, cookie)
+    assert 'principal' not in cookie
+    assert interface.load(sid) == {'principal': {'user_id': 'u1'}}
+    sid, signature = cookie.rsplit('.', 1)
+    forged = ('B' if signature[0] == 'A' else 'A') + signature[1:]
+    assert interface.read_cookie(app, f'{sid}.{forged}') is None
+
+
+def test_the_users_sessions_are_indexed():
+    backend = InMemorySessionBackend()
+    backend.save('a', '{}', 'u1', 60)
+    backend.save('b', '{}', 'u1', 0)  # already expired
+    backend.save('c', '{}', 'u2', 60)
+    backend.save('c', '{}', 'u1', 60)  # logged in as another user
+
+    assert sorted(backend.sessions_of('u1')) == ['a', 'c']
+    assert backend.sessions_of('u2') == []
+
+    backend.delete('a')
+    assert backend.sessions_of('u1') == ['c']
+
+
+def test_touch_extends_a_session():
+    backend = InMemorySessionBackend()
+    backend.save('a', '{}', 'u1', 0)
+    backend.touch('a', 'u1', 60)
+    assert backend.load('a') is None  # too late, it already expired
+
+    backend.save('b', '{}', 'u1', 1)
+    backend.touch('b', 'u1', 60)
+    assert backend._sessions['b'][0] > monotonic() + 30
+
+
+def test_redis_touch_never_shortens_the_users_set():
+    client = FakeRedis()
+    backend = RedisSessionBackend(client)
+    backend.save('remembered', '{}', 'u1', 3600)
+    backend.save('a', '{}', 'u1', 60)
+    assert client.ttl('session:user:u1') == 3600
+
+    client.ttls['session:a'] = 10
+    backend.touch('a', 'u1', 60)
+    assert client.ttl('session:a') == 60
+    assert client.ttl('session:user:u1') == 3600
+
+    backend.touch('missing', 'u2', 60)
+    assert client.ttl('session:user:u2') == -2
+
+
+def test_an_unchanged_session_is_refreshed_at_most_once_per_interval():
+    app = Flask(__name__)
+    app.secret_key = 'secret'
+    app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+    touched = []
+
+    class Backend(InMemorySessionBackend):
+        def touch(self, sid, user_id, ttl):
+            touched.append((sid, user_id, ttl))
+            super().touch(sid, user_id, ttl)
+
+    interface = ServerSideSessionInterface(Backend(), 60, refresh_interval=300)
+    app.session_interface = interface
+
+    @app.route('/login')
+    def login():
+        from flask import session
+        session['_user_id'] = 'u1'
+        return ''
+
+    @app.route('/')
+    def index():
+        from flask import session
+        return session.get('_user_id', '')
+
+    client = app.test_client()
+    client.get('/login')
+    client.get('/')
+    assert touched == []  # just saved by the login
+
+    sid, = interface._refreshed
+    interface._refreshed[sid] -= 301
+    client.get('/')
+    client.get('/')
+    assert touched == [(sid, 'u1', 60)]
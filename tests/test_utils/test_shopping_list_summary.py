@@ -0,0 +1,28 @@
+"""Unit tests for the shopping list summary's incremental updates."""
+from app.utils.shopping_list_summary import SummaryChange, summary_change
+from bson import ObjectId
+from datetime import datetime, UTC
+
+
+def test_changes_become_a_single_raw_update():
+    user_id = ObjectId()
+    added_date = datetime(2024, 5, 1, tzinfo=UTC)
+    change = SummaryChange()
+    change.added({'added_by_user': user_id, 'added_date': added_date})
+    change.added({'added_by_user': user_id, 'added_date': added_date})
+    change.bought()
+    change.removed({'added_by_user': user_id, 'is_bought': True})
+
+    update = change.update()
+    assert update['$inc'] == {
+        'shopping_list_summary.open_count': 1,
+        f'shopping_list_summary.contributions.{user_id}': 1,
+    }
+    assert update['$max'] == {'shopping_list_summary.last_added_at': added_date}
+    assert 'shopping_list_summary.updated_at' in update['$set']
+
+
+def test_changes_cancelling_out_increment_nothing():
+    update = summary_change(bought=True, unbought=True)
+    assert '$inc' not in update
+    assert '$max' not in update
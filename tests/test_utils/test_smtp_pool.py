@@ -0,0 +1,138 @@
+"""Unit tests for the pool of SMTP connections, against a local stub server."""
+from app.utils.smtp_pool import SMTPConnectionPool
+from flask import Flask
+from flask_mail import Mail, Message
+import pytest
+import socketserver
+import threading
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for `smtplib`, recording what it receives."""
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.append(self.connection)
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            command = line.decode().strip().split(' ', 1)[0].upper()
+            server.commands.append(command)
+            if command == 'EHLO':
+                self.reply('250-stub', '250 8BITMIME')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                data = []
+                for line in iter(self.rfile.readline, b'.\r\n'):
+                    data.append(line)
+                server.messages.append(b''.join(data))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:  # HELO, MAIL, RCPT, NOOP, RSET
+                self.reply('250 ok')
+
+    def reply(self, *lines):
+        self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = []
+        self.commands = []
+        self.messages = []
+
+    def drop_connections(self):
+        """Closes every connection from the server's side."""
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            connection.shutdown(2)
+
+
+@pytest.fixture
+def server():
+    server = StubSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(server):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1],
+                      MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_SUPPRESS_SEND=False, TESTING=False,
+                      MAIL_DEFAULT_SENDER='dummy@grocery_squad.com',
+                      MAIL_POOL_SIZE=1, MAIL_POOL_MAX_IDLE=60)
+    Mail(app)
+    return app
+
+
+def message(subject: str) -> Message:
+    return Message(subject, recipients=['inui@seigakutc.co.za'], body=subject)
+
+
+def test_connection_is_reused(app, server):
+    pool = SMTPConnectionPool(app)
+    with app.app_context():
+        pool.send(message('first'))
+        pool.send(message('second'))
+
+    assert len(server.messages) == 2
+    assert server.commands.count('EHLO') == 1  # a single session
+    assert 'NOOP' in server.commands  # checked alive before its reuse
+    pool.close_all()
+
+
+def test_idle_connection_expires(app, server, monkeypatch):
+    pool = SMTPConnectionPool(app)
+    with app.app_context():
+        pool.send(message('first'))
+        monkeypatch.setattr(pool, 'max_idle', 0)
+        pool.send(message('second'))
+
+    assert len(server.messages) == 2
+    assert server.commands.count('EHLO') == 2
+    assert server.commands.count('QUIT') == 1  # the expired one was closed
+    pool.close_all()
+
+
+def test_dropped_connection_is_replaced(app, server):
+    pool = SMTPConnectionPool(app)
+    with app.app_context():
+        pool.send(message('first'))
+        server.drop_connections()
+        pool.send(message('second'))
+
+    assert len(server.messages) == 2
+    assert server.commands.count('EHLO') == 2
+    pool.close_all()
+
+
+def test_connection_dropped_while_sending_is_reconnected(app, server,
+                                                         monkeypatch):
+    pool = SMTPConnectionPool(app)
+    with app.app_context():
+        pool.send(message('first'))
+        server.drop_connections()
+        # the connection seems alive when lent out, then fails to send
+        monkeypatch.setattr(pool, 'max_idle', float('inf'))
+        monkeypatch.setattr('smtplib.SMTP.noop', lambda smtp: (250, b'ok'))
+        pool.send(message('second'))
+
+    assert len(server.messages) == 2
+    assert server.commands.count('EHLO') == 2
+    pool.close_all()
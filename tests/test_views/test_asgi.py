@@ -0,0 +1,132 @@
+"""Integration testing for the ASGI app's async read endpoints."""
+import asyncio
+import pytest
+from app.asgi import AsyncReadApp
+from mongoengine.connection import get_connection
+from tests.conftest import PASSWORD, create_household, sign_up
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+PATHS = ['/api/users/me', '/api/households/profile',
+         '/api/households/shopping_list/items']
+
+
+@pytest.fixture(scope='module')
+def asgi_app(test_connections):
+    sign_up(test_connections, 'asynchronous')
+    create_household(test_connections, 'async-home')
+    test_connections.post('/api/households/shopping_list/items',
+                          json={'item_name': 'milk'})
+
+    app = AsyncReadApp(test_connections.application)
+    app.client = mongomock_motor.AsyncMongoMockClient(
+        mock_mongo_client=get_connection())
+    return app
+
+
+def client_headers(client) -> list:
+    """The headers the test client sends, which its session is bound to."""
+    cookies = '; '.join(f'{cookie.key}={cookie.value}'
+                        for cookie in client._cookies.values())
+    return [(b'cookie', cookies.encode()),
+            (b'user-agent', client.environ_base['HTTP_USER_AGENT'].encode())]
+
+
+def call(app, path: str, headers=(), query_string: bytes = b'') -> tuple:
+    """Sends a GET request through the ASGI app, returning its status and body."""
+    scope = {'type': 'http', 'method': 'GET', 'path': path,
+             'query_string': query_string,
+             'headers': list(headers), 'http_version': '1.1', 'scheme': 'http',
+             'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+             'root_path': ''}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages[0]['status'], b''.join(message.get('body', b'')
+                                           for message in messages[1:])
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_reads_match_the_flask_app(test_connections, asgi_app, path,
+                                   monkeypatch):
+    monkeypatch.setattr(asgi_app, 'wsgi_app', None)  # not left to Flask
+    status, body = call(asgi_app, path, client_headers(test_connections))
+
+    assert status == 200
+    assert body == test_connections.get(path).data
+
+
+def test_async_reads_are_measured(test_connections, asgi_app):
+    latency = test_connections.application.extensions['metrics'].request_latency
+    before = latency.render()
+
+    call(asgi_app, '/api/users/me', client_headers(test_connections))
+
+    measured = [line for line in latency.render() if line not in before]
+    assert any('endpoint="users.get_specific_user",method="GET",status="200"' in line
+               for line in measured)
+
+
+def test_unauthenticated_requests_are_left_to_flask(test_connections, asgi_app):
+    status, _ = call(asgi_app, '/api/users/me')
+
+    anonymous = test_connections.application.test_client()
+    assert status == anonymous.get('/api/users/me').status_code
+
+
+def test_session_protection_is_left_to_flask(test_connections, asgi_app,
+                                             monkeypatch):
+    monkeypatch.setattr(test_connections.application.login_manager,
+                        'session_protection', 'strong')
+    client = test_connections.application.test_client()
+    sign_up(client, 'stolen-session')
+    authenticated = []
+    authenticate = asgi_app.authenticate
+    monkeypatch.setattr(asgi_app, 'authenticate',
+                        lambda scope: authenticated.append(authenticate(scope)))
+
+    # the session is used from another browser than it was logged in from
+    status, _ = call(asgi_app, '/api/users/me',
+                     [client_headers(client)[0], (b'user-agent', b'elsewhere')])
+
+    assert authenticated == [None]
+    # Flask dropped the session, then logged the user back in from the
+    # remember cookie
+    assert status == 200
+
+
+def test_async_reads_extend_the_session(test_connections, asgi_app,
+                                        monkeypatch):
+    # a session that is not permanent, logged in without "remember me"
+    client = test_connections.application.test_client()
+    assert client.post('/api/login', json={'username': 'asynchronous',
+                                           'password': PASSWORD}).status_code == 200
+    interface = test_connections.application.session_interface
+    monkeypatch.setattr(interface, 'refresh_interval', 0)
+    touched = []
+    touch = interface.backend.touch
+    monkeypatch.setattr(interface.backend, 'touch', lambda sid, user_id, ttl:
+                        touched.append(sid) or touch(sid, user_id, ttl))
+
+    status, _ = call(asgi_app, '/api/users/me', client_headers(client))
+
+    assert status == 200
+    with client.session_transaction() as session:
+        assert touched == [session.sid]
+
+
+def test_repeated_query_parameters_keep_the_first_value(test_connections,
+                                                        asgi_app, monkeypatch):
+    monkeypatch.setattr(asgi_app, 'wsgi_app', None)  # not left to Flask
+    path = '/api/households/shopping_list/items'
+    status, body = call(asgi_app, path, client_headers(test_connections),
+                        b'limit=1&limit=nope')
+
+    assert status == 200
+    assert body == test_connections.get(path + '?limit=1&limit=nope').data
@@ -1,5 +1,8 @@
 """Integration testing for the auth view."""
 import flask.testing
+import pytest
+from app.extensions import password_hasher
+from tests.conftest import PASSWORD, sign_up
 
 
 # TestLogin:
@@ -102,4 +105,36 @@ curl localhost:5000/login -H "Content-Type: application/json" -XPOST -d '{ "user
 {
   "message": "User registered successfully"
 }
-"""
\ No newline at end of file
+"""
+
+
+def test_busy_password_hashing(test_connections, monkeypatch):
+    sign_up(test_connections.application.test_client(), 'HurriedWarrior')
+
+    def busy(*args):
+        raise TimeoutError()
+
+    monkeypatch.setattr(password_hasher, 'verify', busy)
+    response = test_connections.post('/api/login', json={
+        'username': 'HurriedWarrior', 'password': PASSWORD})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+@pytest.mark.parametrize('path, data', [
+    ('/api/users', {'username': 'HastyWarrior', 'email': 'hasty@example.com',
+                    'password': PASSWORD}),
+    ('/api/households', {'name': 'hasty-home', 'password': PASSWORD}),
+])
+def test_busy_password_hashing_elsewhere(test_connections, monkeypatch,
+                                         path, data):
+    client = test_connections.application.test_client()
+    sign_up(client, f'Hurried{len(path)}')
+
+    def busy(*args):
+        raise TimeoutError()
+
+    monkeypatch.setattr(password_hasher, 'hash', busy)
+    response = client.post(path, json=data)
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
@@ -0,0 +1,200 @@
+"""Integration testing for the household memberships and their middleware."""
+import json
+import pytest
+from app.extensions import identity_cache
+from models.household import Household
+from models.user import ADMIN_ROLE, MEMBER_ROLE, User
+from tests.conftest import PASSWORD, create_household, sign_up
+from threading import Event, Thread
+
+PROFILE = '/api/households/profile'
+EVENTS = '/api/households/shopping_list/events'
+
+
+@pytest.fixture(scope='module')
+def admin(test_connections):
+    sign_up(test_connections, 'founder')
+    return test_connections
+
+
+@pytest.fixture(scope='module')
+def household(admin):
+    return create_household(admin, 'membership-home')
+
+
+@pytest.fixture
+def member(test_connections, household):
+    """A new user, logged in with their own client, who joined the household."""
+    client = test_connections.application.test_client()
+    user_id = sign_up(client, f'member-{User.objects.count()}')
+    response = client.post('/api/households/join', json={
+        'id': str(household), 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return user_id, client
+
+
+def unmigrate(user_id):
+    """Drops a user's role, as before `flask migrate-household-roles`."""
+    User.objects(id=user_id).update_one(unset__household_role=True)
+    identity_cache.invalidate(user_id)
+
+
+def listed(household_id, field: str) -> list:
+    """Reads the ids of a household's `members` or `admins`."""
+    return Household._get_collection().find_one({'_id': household_id})[field]
+
+
+def rename(client, name: str):
+    return client.patch('/api/households/profile/name', json={'name': name})
+
+
+def test_join(member, household):
+    user_id, client = member
+
+    user = User.objects.get(id=user_id)
+    assert user.household_id.id == household
+    assert user.household_role == MEMBER_ROLE
+    assert user_id in listed(household, 'members')
+    assert client.get(PROFILE).status_code == 200
+
+
+def test_remove(admin, member, household):
+    user_id, client = member
+
+    assert admin.delete(f'/api/households/members/{user_id}').status_code == 204
+    assert User.objects.get(id=user_id).household_id is None
+    assert user_id not in listed(household, 'members')
+    assert client.get(PROFILE).status_code == 400
+
+    response = admin.delete(f'/api/households/members/{user_id}')
+    assert response.status_code == 400
+
+
+def test_promote(admin, member, household):
+    user_id, client = member
+    assert rename(client, 'renamed-home').status_code == 403
+
+    assert admin.patch(f'/api/households/admins/{user_id}').status_code == 200
+    assert User.objects.get(id=user_id).household_role == ADMIN_ROLE
+    assert user_id in listed(household, 'admins')
+    assert rename(client, 'membership-home').status_code == 201
+
+    assert admin.patch(f'/api/households/admins/{user_id}').status_code == 401
+    assert admin.delete(f'/api/households/members/{user_id}').status_code == 401
+
+
+def test_admin_without_a_role_is_neither_removed_nor_promoted(admin, member,
+                                                              household):
+    user_id, _ = member
+    admin.patch(f'/api/households/admins/{user_id}')
+    unmigrate(user_id)
+
+    assert admin.delete(f'/api/households/members/{user_id}').status_code == 401
+    assert admin.patch(f'/api/households/admins/{user_id}').status_code == 401
+    assert User.objects.get(id=user_id).household_id.id == household
+    assert user_id in listed(household, 'admins')
+
+
+def test_member_without_a_role_is_promoted(admin, member):
+    user_id, _ = member
+    unmigrate(user_id)
+
+    assert admin.patch(f'/api/households/admins/{user_id}').status_code == 200
+    assert User.objects.get(id=user_id).household_role == ADMIN_ROLE
+
+
+def test_member_without_a_role_is_removed(admin, member, household):
+    user_id, _ = member
+    unmigrate(user_id)
+
+    assert admin.delete(f'/api/households/members/{user_id}').status_code == 204
+    assert User.objects.get(id=user_id).household_id is None
+    assert user_id not in listed(household, 'members')
+
+
+def test_event_stream_sends_item_changes(admin, member):
+    _, client = member
+    chunks, listening = [], Event()
+
+    def listen():
+        # streamed from its own thread, which keeps the request's context
+        response = client.get(EVENTS, buffered=False)
+        stream = response.iter_encoded()
+        chunks.append(next(stream))
+        listening.set()
+        chunks.append(next(stream))
+        response.close()
+
+    listener = Thread(target=listen)
+    listener.start()
+    assert listening.wait(timeout=5)
+
+    response = admin.post('/api/households/shopping_list/items',
+                          json={'item_name': 'streamed milk'})
+    assert response.status_code == 201
+    listener.join(timeout=5)
+    assert not listener.is_alive()
+
+    event, data = chunks[1].decode().strip().split('\n')
+    assert event == 'event: item_added'
+    assert json.loads(data.removeprefix('data: '))['item_name'] == 'streamed milk'
+
+
+def test_removal_ends_the_member_event_stream(admin, member):
+    user_id, client = member
+    chunks, listening = [], Event()
+
+    def listen():
+        # streamed from its own thread, which keeps the request's context
+        response = client.get(EVENTS, buffered=False)
+        stream = response.iter_encoded()
+        chunks.append(next(stream))
+        listening.set()
+        chunks.extend(stream)
+        response.close()
+
+    listener = Thread(target=listen)
+    listener.start()
+    assert listening.wait(timeout=5)
+
+    assert admin.delete(f'/api/households/members/{user_id}').status_code == 204
+    listener.join(timeout=5)
+    assert not listener.is_alive()  # ended at once, not after a heartbeat
+    assert len(chunks) == 1 and chunks[0].startswith(b'retry:')
+
+
+def test_event_streams_are_capped(test_connections, member, monkeypatch):
+    _, client = member
+    change_feed = test_connections.application.extensions['change_feed']
+    listening = change_feed.subscribe('another-household')
+    monkeypatch.setattr(change_feed.bus, 'max_subscribers',
+                        change_feed.bus.subscriber_count())
+
+    response = client.get(EVENTS)
+    listening.close()
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_middleware_trusts_the_role(member, household):
+    user_id, client = member
+    # the role, not the household's lists, decides
+    Household.objects(id=household).update_one(add_to_set__admins=user_id)
+
+    assert client.get(PROFILE).status_code == 200
+    assert rename(client, 'renamed-home').status_code == 403
+
+
+def test_middleware_falls_back_on_the_household(admin, member, household):
+    user_id, client = member
+    unmigrate(user_id)
+    assert client.get(PROFILE).status_code == 200
+    assert rename(client, 'renamed-home').status_code == 403
+
+    Household.objects(id=household).update_one(pull__members=user_id)
+    assert client.get(PROFILE).status_code == 400
+
+    founder = User.objects.get(username='founder').id
+    unmigrate(founder)
+    assert rename(admin, 'renamed-home').status_code == 201
+    assert rename(admin, 'membership-home').status_code == 201
@@ -0,0 +1,96 @@
+"""Integration testing for the metrics views and the queries of the requests."""
+import pytest
+from app import create_app
+from app.extensions import identity_cache
+from config import TestingConfig
+from tests.conftest import PASSWORD, create_household, sign_up
+
+
+@pytest.fixture
+def remote(test_connections, monkeypatch):
+    """Metrics requested from an address that is not allowed."""
+    monkeypatch.setitem(test_connections.application.config,
+                        'METRICS_ALLOWED_IPS', ('10.0.0.1',))
+    monkeypatch.setitem(test_connections.application.config,
+                        'METRICS_TOKEN', 'scraper-token')
+    return test_connections
+
+
+@pytest.fixture(scope='module')
+def member(test_connections):
+    """A household's member, logged in from a client of their own.
+
+    Returns:
+        The (client, login response).
+    """
+    sign_up(test_connections, 'counted')
+    create_household(test_connections, 'counted-home')
+    client = test_connections.application.test_client()
+    response = client.post('/api/login', json={'username': 'counted',
+                                               'password': PASSWORD})
+    assert response.status_code == 200
+    # the first request loads the member, then kept by the identity cache
+    client.get('/api/users/me')
+    return client, response
+
+
+def queries(response) -> int:
+    """The MongoDB commands the request ran, as told by its headers."""
+    return int(response.headers['X-DB-Queries'])
+
+
+def test_allowed_address(test_connections):
+    assert test_connections.get('/api/metrics').status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/api/metrics', '/api/metrics/mongo-pool'])
+def test_other_address_is_rejected(remote, path):
+    assert remote.get(path).status_code == 403
+    assert remote.get(path, headers={
+        'Authorization': 'Bearer guessed-token'}).status_code == 403
+
+
+def test_other_address_with_the_token(remote):
+    assert remote.get('/api/metrics', headers={
+        'Authorization': 'Bearer scraper-token'}).status_code == 200
+
+
+def test_identity_cache_counters(test_connections):
+    identity_cache.clear()
+    sign_up(test_connections, 'metered')
+    test_connections.get('/api/users/me')
+    test_connections.get('/api/users/me')
+
+    text = test_connections.get('/api/metrics').get_data(as_text=True)
+    stats = identity_cache.stats()
+    assert stats['hits'] and stats['misses']
+    assert f'identity_cache_hits_total {stats["hits"]}' in text.splitlines()
+    assert f'identity_cache_misses_total {stats["misses"]}' in text.splitlines()
+
+
+def test_login_queries(member):
+    _, response = member
+    assert queries(response) == 1
+
+
+def test_household_profile_queries(member):
+    client, _ = member
+    assert queries(client.get('/api/households/profile')) == 3
+
+
+def test_shopping_list_queries(member):
+    client, _ = member
+    assert queries(client.get('/api/households/shopping_list/items')) == 2
+
+    response = client.post('/api/households/shopping_list/items',
+                           json={'item_name': 'milk'})
+    assert response.status_code == 201
+    assert queries(response) == 3
+    assert queries(client.get('/api/households/shopping_list/items')) == 2
+
+
+# last, as it replaces the app's database connection
+def test_metrics_are_only_served_when_enabled(test_connections, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'METRICS_ENABLED', False)
+    client = create_app('test').test_client()
+    assert client.get('/api/metrics').status_code == 404
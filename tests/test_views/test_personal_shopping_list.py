@@ -0,0 +1,88 @@
+"""Integration testing for the personal shopping list's in-place updates."""
+import pytest
+from app.extensions import identity_cache
+from models.user import User
+from tests.conftest import sign_up
+from uuid import uuid4
+
+ITEMS = '/api/users/me/shopping_list/items'
+
+
+@pytest.fixture(scope='module')
+def user_id(test_connections):
+    return sign_up(test_connections, 'shopper')
+
+
+def stored_items(user_id) -> list:
+    return User._get_collection().find_one({'_id': user_id})['personal_shopping_list']
+
+
+def add(client, name: str) -> dict:
+    response = client.post(ITEMS, json={'item_name': name})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['item']
+
+
+def test_items_are_pushed_up_to_the_limit(test_connections, user_id, monkeypatch):
+    monkeypatch.setitem(test_connections.application.config,
+                        'PERSONAL_SHOPPING_LIST_MAX_ITEMS', 3)
+    for name in ('milk', 'bread', 'eggs'):
+        add(test_connections, name)
+
+    response = test_connections.post(ITEMS, json={'item_name': 'jam'})
+    assert response.status_code == 400
+    assert [item['item_name'] for item in stored_items(user_id)] \
+        == ['milk', 'bread', 'eggs']
+
+
+def test_item_is_updated_in_place(test_connections, user_id):
+    milk, bread = stored_items(user_id)[:2]
+
+    response = test_connections.patch(f'{ITEMS}/{milk["item_id"]}',
+                                      json={'is_bought': True})
+    assert response.status_code == 200
+
+    items = stored_items(user_id)
+    assert items[0]['is_bought'] and items[0]['bought_date']
+    assert items[0]['item_name'] == 'milk'
+    assert items[1] == bread  # the other items are left as they were
+
+    response = test_connections.patch(f'{ITEMS}/{milk["item_id"]}',
+                                      json={'is_bought': False})
+    assert response.status_code == 200
+    assert not stored_items(user_id)[0]['is_bought']
+    assert stored_items(user_id)[0]['bought_date'] is None
+
+    bought = test_connections.get(f'{ITEMS}?is_bought=false').get_json()['items']
+    assert len(bought) == 3
+
+
+def test_item_is_pulled(test_connections, user_id):
+    bread = stored_items(user_id)[1]
+
+    response = test_connections.delete(f'{ITEMS}/{bread["item_id"]}')
+    assert response.status_code == 200
+    assert [item['item_name'] for item in stored_items(user_id)] == ['milk', 'eggs']
+
+
+@pytest.mark.parametrize('method', ['patch', 'delete'])
+def test_unknown_item(test_connections, user_id, method):
+    response = getattr(test_connections, method)(f'{ITEMS}/{uuid4()}',
+                                                 json={'is_bought': True})
+    assert response.status_code == 404
+    assert len(stored_items(user_id)) == 2
+
+
+def test_logged_in_user_is_loaded_without_the_list(test_connections, user_id):
+    identity_cache.clear()
+    assert test_connections.get('/api/users/me').status_code == 200
+
+    cached = identity_cache.get(user_id)
+    assert cached is not None
+    assert 'personal_shopping_list' not in cached
+
+    # saving the loaded user leaves the list alone
+    response = test_connections.patch('/api/users/me/username',
+                                      json={'username': 'thrifty-shopper'})
+    assert response.status_code < 300, response.get_json()
+    assert len(stored_items(user_id)) == 2
@@ -0,0 +1,190 @@
+"""Integration testing for the household shopping list's batches."""
+import pytest
+from app.extensions import change_feed
+from app.utils.shopping_list_batch import ShoppingListBatch
+from app.utils.shopping_list_summary import compute_summary
+from datetime import datetime, UTC
+from models.household import Household
+from models.shopping_list_item import ShoppingListItem
+from pymongo.errors import BulkWriteError
+from tests.conftest import create_household, sign_up
+from time import sleep
+from uuid import uuid4
+
+BATCH = '/api/households/shopping_list/items/batch'
+
+
+@pytest.fixture(scope='module')
+def household(test_connections):
+    sign_up(test_connections, 'batcher')
+    return create_household(test_connections, 'batch-home')
+
+
+def add_items(client, *names) -> list:
+    response = client.post(BATCH, json={'operations': [
+        {'op': 'add', 'item_name': name} for name in names]})
+    assert response.status_code == 200, response.get_json()
+    return [result['item_id'] for result in response.get_json()['results']]
+
+
+def stored_summary(household_id) -> dict:
+    summary = Household._get_collection().find_one(
+        {'_id': household_id})['shopping_list_summary']
+    return {field: summary.get(field, 0)
+            for field in ('open_count', 'bought_count')}
+
+
+def computed_summary(household_id) -> dict:
+    summary = compute_summary(household_id)
+    return {field: summary[field] for field in ('open_count', 'bought_count')}
+
+
+def test_conflicting_remove_is_not_counted_twice(test_connections, household,
+                                                 monkeypatch):
+    item_id, = add_items(test_connections, 'milk')
+    read_items = ShoppingListBatch._current_items
+
+    def read_then_removed_by_another_request(batch):
+        items = read_items(batch)
+        test_connections.delete(f'/api/households/shopping_list/items/{item_id}')
+        return items
+
+    monkeypatch.setattr(ShoppingListBatch, '_current_items',
+                        read_then_removed_by_another_request)
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'remove', 'item_id': item_id}]})
+
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['status'] == 'conflict'
+    assert stored_summary(household) == computed_summary(household)
+
+
+def test_conflicting_mark_is_not_counted_twice(test_connections, household,
+                                               monkeypatch):
+    item_id, other_id = add_items(test_connections, 'bread', 'jam')
+    read_items = ShoppingListBatch._current_items
+
+    def read_then_bought_by_another_request(batch):
+        items = read_items(batch)
+        sleep(0.002)  # not in the batch's millisecond
+        test_connections.patch(
+            f'/api/households/shopping_list/items/{item_id}/bought',
+            json={'is_bought': True})
+        return items
+
+    monkeypatch.setattr(ShoppingListBatch, '_current_items',
+                        read_then_bought_by_another_request)
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'mark_bought', 'item_id': item_id},
+        {'op': 'mark_bought', 'item_id': other_id}]})
+
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['conflict', 'ok']
+    assert stored_summary(household) == computed_summary(household)
+
+
+def test_mark_in_the_same_millisecond_is_recounted(test_connections, household,
+                                                   monkeypatch):
+    item_id, other_id = add_items(test_connections, 'tea', 'rice')
+    now = datetime.now(UTC)
+    read_items = ShoppingListBatch._current_items
+
+    class Frozen(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    def read_then_bought_by_another_request(batch):
+        items = read_items(batch)
+        with monkeypatch.context() as frozen:
+            frozen.setattr('app.views.household_shopping_list.datetime', Frozen)
+            test_connections.patch(
+                f'/api/households/shopping_list/items/{item_id}/bought',
+                json={'is_bought': True})
+        return items
+
+    monkeypatch.setattr('app.utils.shopping_list_batch.datetime', Frozen)
+    monkeypatch.setattr(ShoppingListBatch, '_current_items',
+                        read_then_bought_by_another_request)
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'mark_bought', 'item_id': item_id},
+        {'op': 'mark_bought', 'item_id': other_id}]})
+
+    # the item is bought by the user either way, and the summary recounted
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert stored_summary(household) == computed_summary(household)
+
+
+def test_removes_raced_by_another_request_are_applied(test_connections,
+                                                      household, monkeypatch):
+    item_id, other_id = add_items(test_connections, 'salt', 'pepper')
+    read_items = ShoppingListBatch._current_items
+    published = []
+
+    def read_then_removed_by_another_request(batch):
+        items = read_items(batch)
+        test_connections.delete(f'/api/households/shopping_list/items/{item_id}')
+        return items
+
+    monkeypatch.setattr(ShoppingListBatch, '_current_items',
+                        read_then_removed_by_another_request)
+    monkeypatch.setattr(change_feed, 'publish',
+                        lambda household_id, event: published.append(event))
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'remove', 'item_id': item_id},
+        {'op': 'remove', 'item_id': other_id}]})
+
+    # which one this batch deleted is unknown, but both items are gone
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    # after the event of the other request's removal
+    assert [event['item']['item_id'] for event in published[1:]] \
+        == [item_id, other_id]
+    assert stored_summary(household) == computed_summary(household)
+
+
+def test_write_concern_error_keeps_the_writes(test_connections, household,
+                                              monkeypatch):
+    item_id, = add_items(test_connections, 'oats')
+    collection = ShoppingListItem._get_collection()
+    bulk_write = collection.bulk_write
+
+    def unacknowledged_by_the_replicas(requests, **kwargs):
+        result = bulk_write(requests, **kwargs)
+        raise BulkWriteError({
+            'writeErrors': [], 'writeConcernErrors': [{'errmsg': 'timed out'}],
+            'nInserted': result.inserted_count, 'nModified': result.modified_count,
+            'nRemoved': result.deleted_count, 'nUpserted': 0, 'upserted': []})
+
+    monkeypatch.setattr(collection, 'bulk_write', unacknowledged_by_the_replicas)
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'mark_bought', 'item_id': item_id}]})
+
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['status'] == 'ok'
+    assert stored_summary(household) == computed_summary(household)
+
+
+def test_failed_write_keeps_the_earlier_ones(test_connections, household,
+                                             monkeypatch):
+    taken_id, = add_items(test_connections, 'eggs')
+    version = Household.objects.get(id=household).version
+
+    # the batch's second item gets the id of an existing one
+    ids = iter([uuid4(), taken_id])
+    monkeypatch.setattr('models.shopping_list_item.uuid4', lambda: next(ids))
+    response = test_connections.post(BATCH, json={'operations': [
+        {'op': 'add', 'item_name': 'flour'},
+        {'op': 'add', 'item_name': 'sugar'},
+        {'op': 'mark_bought', 'item_id': taken_id}]})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [result['status'] for result in data['results']] \
+        == ['ok', 'error', 'error']
+    assert data['applied'] == 1
+    assert ShoppingListItem.objects(item_name='flour').count() == 1
+    assert not ShoppingListItem.objects.get(item_id=taken_id).is_bought
+    assert Household.objects.get(id=household).version == version + 1
+    assert stored_summary(household) == computed_summary(household)
@@ -0,0 +1,143 @@
+"""Integration testing for the archival of bought shopping list items."""
+import pytest
+from app.utils.shopping_list_summary import compute_summary
+from datetime import datetime, timedelta
+from models.household import Household
+from models.shopping_list_history import ArchivedShoppingListItem
+from models.shopping_list_item import ShoppingListItem
+from models.user import User
+from tests.conftest import create_household, sign_up
+
+ITEMS = '/api/households/shopping_list/items'
+HISTORY = '/api/households/shopping_list/history'
+LONG_AGO = datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope='module')
+def user_id(test_connections):
+    return sign_up(test_connections, 'archivist')
+
+
+@pytest.fixture(scope='module')
+def household(test_connections, user_id):
+    return create_household(test_connections, 'history-home')
+
+
+@pytest.fixture
+def compactor(test_connections):
+    return test_connections.application.extensions['shopping_list_compactor']
+
+
+def bought_long_ago(client, household_id, name: str, days: int):
+    """Adds an item, bought a number of days after `LONG_AGO`."""
+    assert client.post(ITEMS, json={'item_name': name}).status_code == 201
+    item = ShoppingListItem.objects.get(household=household_id, item_name=name)
+    assert client.patch(f'{ITEMS}/{item.item_id}/bought').status_code == 200
+    ShoppingListItem.objects(item_id=item.item_id).update_one(
+        set__bought_date=LONG_AGO + timedelta(days=days))
+
+
+def test_compact_archives_old_bought_items(test_connections, household,
+                                           compactor):
+    for days, name in enumerate(('milk', 'bread', 'eggs', 'jam', 'tea')):
+        bought_long_ago(test_connections, household, name, days)
+    test_connections.post(ITEMS, json={'item_name': 'flour'})  # not bought
+    version = Household.objects.get(id=household).version
+
+    assert compactor.compact() == {'household': 5, 'personal': 0}
+
+    assert [item.item_name for item in ShoppingListItem.objects(
+        household=household)] == ['flour']
+    assert ArchivedShoppingListItem.objects(household=household).count() == 5
+    assert Household.objects.get(id=household).version > version
+
+    summary = test_connections.get('/api/households/shopping_list/summary') \
+        .get_json()
+    computed = compute_summary(household)
+    assert (summary['open_count'], summary['bought_count']) \
+        == (computed['open_count'], computed['bought_count']) == (1, 0)
+
+    assert compactor.compact() == {'household': 0, 'personal': 0}
+
+
+def test_history_pages(test_connections):
+    response = test_connections.get(f'{HISTORY}?limit=2')
+    assert response.status_code == 200
+    pages = [response.get_json()]
+    while pages[-1]['next_cursor']:
+        response = test_connections.get(
+            f'{HISTORY}?limit=2&cursor={pages[-1]["next_cursor"]}')
+        assert response.status_code == 200
+        pages.append(response.get_json())
+
+    assert [len(page['items']) for page in pages] == [2, 2, 1]
+    assert [item['item_name'] for page in pages for item in page['items']] \
+        == ['tea', 'jam', 'eggs', 'bread', 'milk']
+
+    assert test_connections.get(f'{HISTORY}?cursor=nonsense').status_code == 400
+
+
+def test_interrupted_personal_compaction_is_not_archived_twice(user_id,
+                                                               compactor):
+    # an item added before personal items had an `item_id`
+    item = {'item_name': 'soap', 'added_date': LONG_AGO, 'is_bought': True,
+            'bought_date': LONG_AGO + timedelta(days=1)}
+    users = User._get_collection()
+
+    users.update_one({'_id': user_id}, {'$push': {'personal_shopping_list': item}})
+    assert compactor.compact()['personal'] == 1
+
+    # as if the list was not pulled, the compaction being interrupted
+    users.update_one({'_id': user_id}, {'$push': {'personal_shopping_list': item}})
+    compactor.compact()
+
+    assert ArchivedShoppingListItem.objects(user=user_id).count() == 1
+    assert users.find_one({'_id': user_id})['personal_shopping_list'] == []
+
+
+@pytest.fixture
+def unbought_while_archived(compactor, monkeypatch):
+    """Unbuys items right after the compaction archived them, as another
+    request could before they are removed from their list."""
+    archive = compactor._archive
+    unbuy = []
+
+    def archive_then_unbuy(documents):
+        archive(documents)
+        for unbuy_item in unbuy:
+            unbuy_item()
+
+    monkeypatch.setattr(compactor, '_archive', archive_then_unbuy)
+    return unbuy
+
+
+def test_items_unbought_while_archived_leave_the_history(
+        test_connections, household, compactor, unbought_while_archived):
+    bought_long_ago(test_connections, household, 'cheese', 10)
+    unbought_while_archived.append(lambda: ShoppingListItem.objects(
+        household=household, item_name='cheese').update_one(set__is_bought=False))
+
+    compactor.compact()
+
+    assert ShoppingListItem.objects(household=household,
+                                    item_name='cheese').count() == 1
+    assert ArchivedShoppingListItem.objects(item_name='cheese').count() == 0
+
+
+def test_personal_items_unbought_while_archived_leave_the_history(
+        user_id, compactor, unbought_while_archived):
+    users = User._get_collection()
+    for name in ('soup', 'salt'):
+        users.update_one({'_id': user_id}, {'$push': {'personal_shopping_list': {
+            'item_id': f'{name}-id', 'item_name': name, 'added_date': LONG_AGO,
+            'is_bought': True, 'bought_date': LONG_AGO + timedelta(days=1)}}})
+    unbought_while_archived.append(lambda: users.update_one(
+        {'_id': user_id, 'personal_shopping_list.item_id': 'soup-id'},
+        {'$set': {'personal_shopping_list.$.is_bought': False}}))
+
+    assert compactor.compact()['personal'] == 1
+
+    assert [item['item_name'] for item in users.find_one(
+        {'_id': user_id})['personal_shopping_list']] == ['soup']
+    assert [item.item_name for item in ArchivedShoppingListItem.objects(
+        item_name__in=['soup', 'salt'])] == ['salt']
@@ -0,0 +1,67 @@
+"""Integration testing for the household shopping list summary's upkeep."""
+import pytest
+from app.utils.serialization import serialize_shopping_list_summary
+from app.utils.shopping_list_summary import compute_summary
+from models.shopping_list_item import ShoppingListItem
+from tests.conftest import create_household, sign_up
+
+ITEMS = '/api/households/shopping_list/items'
+SUMMARY = '/api/households/shopping_list/summary'
+
+
+@pytest.fixture(scope='module')
+def household(test_connections):
+    sign_up(test_connections, 'summarist')
+    return create_household(test_connections, 'summary-home')
+
+
+def assert_summary_is_current(client, household_id):
+    """Compares the served summary with one counted from the items."""
+    response = client.get(SUMMARY)
+    assert response.status_code == 200
+
+    served = response.get_json()
+    computed = serialize_shopping_list_summary(compute_summary(household_id))
+    for field in ('open_count', 'bought_count', 'contributions'):
+        assert served[field] == computed[field], field
+
+
+def test_every_change_updates_the_summary(test_connections, household):
+    client = test_connections
+    assert_summary_is_current(client, household)
+
+    item_ids = []
+    for name in ('milk', 'bread', 'eggs'):
+        response = client.post(ITEMS, json={'item_name': name})
+        assert response.status_code == 201
+        item_ids.append(ShoppingListItem.objects.get(
+            household=household, item_name=name).item_id)
+        assert_summary_is_current(client, household)
+
+    response = client.patch(f'{ITEMS}/{item_ids[0]}/bought')
+    assert response.status_code == 200
+    assert_summary_is_current(client, household)
+
+    for item_id in item_ids[:2]:  # a bought item, then an open one
+        response = client.delete(f'{ITEMS}/{item_id}')
+        assert response.status_code == 200
+        assert_summary_is_current(client, household)
+
+    response = client.post(f'{ITEMS}/batch', json={'operations': [
+        {'op': 'add', 'item_name': 'jam'},
+        {'op': 'mark_bought', 'item_id': item_ids[2]},
+        {'op': 'unmark_bought', 'item_id': item_ids[2]},
+        {'op': 'mark_bought', 'item_id': item_ids[2]},
+    ]})
+    assert response.get_json()['applied'] == 4
+    assert_summary_is_current(client, household)
+
+    response = client.post(f'{ITEMS}/batch', json={'operations': [
+        {'op': 'remove', 'item_id': item_ids[2]},
+        {'op': 'add', 'item_name': 'tea'},
+    ]})
+    assert response.get_json()['applied'] == 2
+    assert_summary_is_current(client, household)
+
+    served = client.get(SUMMARY).get_json()
+    assert (served['open_count'], served['bought_count']) == (2, 0)
@@ -1,5 +1,7 @@
 """Integration testing for the users view."""
 import flask.testing
+from app.extensions import password_hasher
+from tests.conftest import PASSWORD, sign_up
 
 
 # TestRegistration:
@@ -59,9 +61,19 @@ curl localhost:5000/users -H "Content-Type: application/json" -XPOST -d '{ "user
 """
 
 
-def test_unique_username(test_connections):
+def test_unique_username(test_connections, monkeypatch):
     """Ensures that the provided username will be unique in the database."""
-    pass
+    sign_up(test_connections, 'BurningSushiMan')
+    hashed = []
+    monkeypatch.setattr(password_hasher, 'hash', hashed.append)
+
+    for password in ('dataTennis', 'data'):  # also with a weak password
+        response = test_connections.post('/api/users', json={
+            'username': 'BurningSushiMan', 'email': 'taka@seigakutc.co.za',
+            'password': password})
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'The username is already taken'}
+    assert hashed == []  # refused before hashing the password
 """
 curl localhost:5000/users -H "Content-Type: application/json" -XPOST -d '{ "username": "BurningSushiMan", "email": "taka@seigakutc.co.za", "password": "dataTennis" }'
 {
@@ -72,7 +84,12 @@ curl localhost:5000/users -H "Content-Type: application/json" -XPOST -d '{ "user
 
 def test_unique_email(test_connections):
     """Ensures that the provided email will be unique in the database."""
-    pass
+    sign_up(test_connections, 'InuiSadaharu')
+    response = test_connections.post('/api/users', json={
+        'username': 'ProudHorio', 'email': 'InuiSadaharu@example.com',
+        'password': 'dataTennis'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'The email is already taken'}
 """
 curl localhost:5000/users -H "Content-Type: application/json" -XPOST -d '{ "username": "ProudHorio", "email": "inui@seigakutc.co.za", "password": "dataTennis" }'
 {
@@ -87,4 +104,19 @@ curl localhost:5000/users -H "Content-Type: application/json" -XPOST -d '{ "user
 {
   "message": "User registered successfully"
 }
-"""
\ No newline at end of file
+"""
+
+
+def test_rename_updates_the_sessions(test_connections):
+    """Ensures that every session of a renamed user holds the new username."""
+    client = test_connections.application.test_client()
+    sign_up(client, 'KaidohKaoru')
+    elsewhere = test_connections.application.test_client()
+    elsewhere.post('/api/login', json={'username': 'KaidohKaoru',
+                                       'password': PASSWORD})
+
+    response = client.patch('/api/users/me/username', json={'username': 'Mamushi'})
+    assert response.status_code == 201
+    for session_client in (client, elsewhere):
+        with session_client.session_transaction() as session:
+            assert session['principal']['username'] == 'Mamushi'